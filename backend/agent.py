@@ -0,0 +1,234 @@
+from __future__ import annotations
+
+import copy
+import os
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime, timezone
+from threading import Event, Lock
+from typing import Any, Callable
+
+from .rate_limit import TokenBucketLimiter
+from .storage import LocalStore
+
+StepHandler = Callable[[dict[str, Any], dict[str, Any]], Any]
+# Maps a step's merged parameters to (tokens per second, burst) for its cluster.
+RateLimits = Callable[[dict[str, Any]], tuple[float, int]]
+
+TERMINAL_STATUSES = {"succeeded", "failed", "cancelled"}
+
+
+class JobCancelled(Exception):
+    pass
+
+
+def _now() -> str:
+    return datetime.now(timezone.utc).isoformat()
+
+
+def _alive(pid: Any) -> bool:
+    if not isinstance(pid, int) or pid == os.getpid():
+        return False
+    try:
+        os.kill(pid, 0)
+    except ProcessLookupError:
+        return False
+    except PermissionError:
+        return True
+    return True
+
+
+def _cluster_of(job: dict[str, Any]) -> str:
+    return job.get("payload", {}).get("cluster_id", "")
+
+
+class AgentRunner:
+    def __init__(
+        self,
+        store: LocalStore,
+        handlers: dict[str, StepHandler],
+        limiter: TokenBucketLimiter | None = None,
+        rate_limited_steps: set[str] | None = None,
+        max_workers: int = 2,
+        per_cluster: int = 1,
+        rate_limits: RateLimits | None = None,
+    ) -> None:
+        self.store = store
+        self.handlers = handlers
+        self.limiter = limiter
+        self.rate_limited_steps = rate_limited_steps or set()
+        self.rate_limits = rate_limits
+        self.per_cluster = per_cluster
+        self._pool = ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix="agent-job")
+        self._lock = Lock()
+        self._persist_lock = Lock()
+        self._jobs: dict[str, dict[str, Any]] = {}
+        self._cancel: dict[str, Event] = {}
+        # Jobs only reach the pool once their cluster has a free slot, so a
+        # busy cluster queues here instead of tying up pool workers.
+        self._running: dict[str, int] = {}
+        self._waiting: dict[str, deque[str]] = {}
+        self._fail_orphans()
+
+    def _fail_orphans(self) -> None:
+        # Jobs whose runner process is gone will never finish; say so.
+        for name, _ in self.store.scan("context", "job-"):
+            job = self.store.load_json("context", name, decrypt=False)
+            if job is None or job.get("status") not in {"queued", "running"} or _alive(job.get("runner_pid")):
+                continue
+            for step_status in job.get("steps_status", []):
+                if step_status["status"] == "running":
+                    step_status["status"] = "failed"
+            job.update(status="failed", finished_at=_now(), error="interrupted by a service restart")
+            self.store.save_json("context", name, job, encrypt=False)
+
+    def submit(self, job: dict[str, Any]) -> dict[str, Any]:
+        job = copy.deepcopy(job)
+        job.setdefault("status", "queued")
+        job["runner_pid"] = os.getpid()
+        job["steps_status"] = [
+            {"index": idx, "type": step.get("type"), "status": "pending"} for idx, step in enumerate(job["steps"])
+        ]
+        self.store.save_json("context", job["id"], job, encrypt=False)
+        cluster_id = _cluster_of(job)
+        with self._lock:
+            self._jobs[job["id"]] = job
+            self._cancel[job["id"]] = Event()
+            start = self._running.get(cluster_id, 0) < self.per_cluster
+            if start:
+                self._running[cluster_id] = self._running.get(cluster_id, 0) + 1
+            else:
+                self._waiting.setdefault(cluster_id, deque()).append(job["id"])
+        if start:
+            self._pool.submit(self._run, job["id"])
+        return self.get(job["id"]) or job
+
+    def get(self, job_id: str) -> dict[str, Any] | None:
+        with self._lock:
+            job = self._jobs.get(job_id)
+            if job is not None:
+                return copy.deepcopy(job)
+        return self.store.load_json("context", job_id, decrypt=False)
+
+    def cancel(self, job_id: str) -> dict[str, Any] | None:
+        with self._lock:
+            event = self._cancel.get(job_id)
+            job = self._jobs.get(job_id)
+            if event is None or job is None:
+                return None
+            event.set()
+            queued = job["status"] == "queued"
+            waiting = self._waiting.get(_cluster_of(job))
+            parked = waiting is not None and job_id in waiting
+            if parked:
+                waiting.remove(job_id)
+        if queued:
+            self._mark_cancelled(job)
+        if parked:
+            self._forget(job_id)
+        return self.get(job_id)
+
+    def shutdown(self) -> None:
+        with self._lock:
+            events = list(self._cancel.values())
+        for event in events:
+            event.set()
+        self._pool.shutdown(wait=False, cancel_futures=True)
+
+    def _update(self, job: dict[str, Any], step: int | None = None, **changes: Any) -> None:
+        # Write the new state before publishing it in memory, so a poller that
+        # sees a terminal status can rely on the file already holding it.
+        with self._persist_lock:
+            with self._lock:
+                snapshot = copy.deepcopy(job)
+            target = snapshot if step is None else snapshot["steps_status"][step]
+            target.update(changes)
+            self.store.save_json("context", snapshot["id"], snapshot, encrypt=False)
+            with self._lock:
+                target = job if step is None else job["steps_status"][step]
+                target.update(changes)
+
+    def _mark_cancelled(self, job: dict[str, Any]) -> None:
+        with self._lock:
+            steps_status = copy.deepcopy(job["steps_status"])
+        for step_status in steps_status:
+            if step_status["status"] in {"pending", "running"}:
+                step_status["status"] = "cancelled"
+        self._update(job, status="cancelled", finished_at=_now(), steps_status=steps_status)
+
+    def _forget(self, job_id: str) -> None:
+        # Finished jobs are served from disk; only live ones stay in memory.
+        with self._lock:
+            self._jobs.pop(job_id, None)
+            self._cancel.pop(job_id, None)
+
+    def _next_job(self, cluster_id: str) -> None:
+        # Hands the finished job's slot to the next job queued for its cluster.
+        with self._lock:
+            waiting = self._waiting.get(cluster_id)
+            if waiting:
+                next_id = waiting.popleft()
+                if not waiting:
+                    del self._waiting[cluster_id]
+            else:
+                next_id = None
+                self._running[cluster_id] -= 1
+                if not self._running[cluster_id]:
+                    del self._running[cluster_id]
+        if next_id is not None:
+            self._pool.submit(self._run, next_id)
+
+    def _wait_for_token(self, cluster_id: str, params: dict[str, Any], cancelled: Event) -> None:
+        if self.limiter is None:
+            return
+        rate, burst = self.rate_limits(params) if self.rate_limits is not None else (None, None)
+        # Queue behind earlier reservations instead of polling for a free token.
+        delay = self.limiter.reserve(cluster_id, rate_per_sec=rate, burst=burst)
+        while delay is None:
+            if cancelled.wait(1.0):
+                raise JobCancelled()
+            delay = self.limiter.reserve(cluster_id, rate_per_sec=rate, burst=burst)
+        if delay > 0 and cancelled.wait(delay):
+            # Give the unused reservation back so later waiters move up.
+            self.limiter.refund(cluster_id)
+            raise JobCancelled()
+
+    def _run(self, job_id: str) -> None:
+        with self._lock:
+            job = self._jobs[job_id]
+            cancelled = self._cancel[job_id]
+        cluster_id = _cluster_of(job)
+        if cancelled.is_set():
+            self._forget(job_id)
+            self._next_job(cluster_id)
+            return
+        try:
+            self._update(job, status="running", started_at=_now())
+            context: dict[str, Any] = {"payload": job.get("payload", {}), "results": []}
+            for idx, step in enumerate(job["steps"]):
+                if cancelled.is_set():
+                    raise JobCancelled()
+                self._update(job, current_step=idx)
+                self._update(job, idx, status="running", started_at=_now())
+                try:
+                    handler = self.handlers.get(step.get("type", ""))
+                    if handler is None:
+                        raise ValueError(f"unsupported step type: {step.get('type')}")
+                    if step.get("type") in self.rate_limited_steps:
+                        params = {**job.get("payload", {}), **step}
+                        self._wait_for_token(step.get("cluster_id") or cluster_id, params, cancelled)
+                    result = handler(step, context)
+                except JobCancelled:
+                    raise
+                except Exception as exc:
+                    self._update(job, idx, status="failed", finished_at=_now(), error=str(exc))
+                    self._update(job, status="failed", finished_at=_now(), error=str(exc))
+                    return
+                context["results"].append(result)
+                self._update(job, idx, status="succeeded", finished_at=_now(), result=result)
+            self._update(job, status="succeeded", finished_at=_now())
+        except JobCancelled:
+            self._mark_cancelled(job)
+        finally:
+            self._forget(job_id)
+            self._next_job(cluster_id)
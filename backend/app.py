@@ -1,44 +1,107 @@
-from datetime import datetime
+import json
+import re
+from collections import OrderedDict
+from contextlib import asynccontextmanager
+from datetime import datetime, timezone
 from pathlib import Path
-from typing import Any
+from threading import Lock
+from typing import Any, Iterator, Literal
 
 import httpx
-from fastapi import Body, FastAPI, HTTPException
+from fastapi import Body, FastAPI, HTTPException, Query
+from fastapi.responses import JSONResponse, StreamingResponse
 from fastapi.staticfiles import StaticFiles
 
+from .agent import AgentRunner
+from .chunk_cache import ChunkCache
 from .cluster_config import ConfigValidationError, load_cluster_config
 from .config import load_settings
-from .loki_adapter import LokiAdapter, build_logql
+from .context_journal import ContextJournal
+from .catalog import RecordCatalog
+from .http_client import HttpClientPool, proxy_for
+from .ids import new_id, unique_suffix
+from .log_templates import TemplateCluster, TemplateMiner, mine_templates
+from .loki_adapter import LogLine, LokiAdapter, build_logql, build_metric_logql, metric_step
 from .metadata import MetadataResolver
-from .code_search import search_code
+from .pagination import PageCursor, next_cursor, query_fingerprint
+from .code_search import index_code, search_code
+from .correlate import correlate_lines
+from .query_engine import QueryEngine
 from .models import (
+    AggregateRequest,
+    AggregateResponse,
+    AggregateSeries,
+    CodeIndexRequest,
+    CodeIndexResponse,
     CodeSearchRequest,
     CodeSearchResponse,
+    ContextPatchRequest,
+    CorrelateRequest,
+    CorrelateResponse,
     ExportRequest,
     ExportResponse,
     LogLineModel,
+    LogSelection,
+    LogTemplateModel,
     QueryRequest,
     QueryResponse,
     AgentRunRequest,
     SkillCreateRequest,
     SkillExtractRequest,
+    SkillMatchRequest,
 )
-from .rate_limit import TokenBucketLimiter
+from .rate_limit import SqliteTokenBucketLimiter, TokenBucketLimiter
 from .redaction import Redactor
+from .repo_cache import RepoCache, RepoWarming
+from .secret_cache import SecretCache, SecretVersion
+from .single_flight import SingleFlight
 from .skills import SkillManager
 from .storage import LocalStore, StorageError
 
 settings = load_settings()
-store = LocalStore(settings.data_dir)
-limiter = TokenBucketLimiter(rate_per_sec=1 / settings.min_interval_seconds, burst=1)
-resolver = MetadataResolver(store)
+store = LocalStore(settings.data_dir, backend=settings.storage_backend)
+if settings.rate_limit_backend == "sqlite":
+    # Shared by every worker process on this host.
+    limiter: TokenBucketLimiter = SqliteTokenBucketLimiter(
+        settings.data_dir / "ratelimit.sqlite", rate_per_sec=1 / settings.min_interval_seconds, burst=1
+    )
+else:
+    limiter = TokenBucketLimiter(rate_per_sec=1 / settings.min_interval_seconds, burst=1)
+http_clients = HttpClientPool(
+    max_connections=settings.query_concurrency * 2,
+    max_keepalive_connections=settings.query_concurrency,
+)
+secret_cache = SecretCache(store, ttl_seconds=settings.secret_ttl_seconds)
+resolver = MetadataResolver(store, clients=http_clients, secrets=secret_cache)
+chunk_cache = ChunkCache(settings.data_dir / "cache" / "loki", max_bytes=settings.cache_max_bytes)
+repo_cache = RepoCache(
+    settings.data_dir / "cache" / "repos",
+    max_bytes=settings.repo_cache_max_bytes,
+    refresh_seconds=settings.repo_refresh_seconds,
+)
 skill_manager = SkillManager(store)
+context_journal = ContextJournal(store)
+query_flights: SingleFlight[QueryResponse] = SingleFlight()
+stream_flights: SingleFlight[list[LogLine]] = SingleFlight()
+job_catalog = RecordCatalog(store, "context", prefix="job-", keys=lambda job: [job.get("status", "")])
 schema_path = Path(__file__).resolve().parents[1] / "config/schema/cluster_config.schema.json"
 frontend_dir = Path(__file__).resolve().parents[1] / "frontend"
 redaction_path = settings.redaction_path or (settings.data_dir / "redaction.json")
 redactor = Redactor.from_file(redaction_path)
+MAX_ADAPTERS = 32
+_adapters: OrderedDict[tuple[str, str | None], tuple[SecretVersion | None, LokiAdapter]] = OrderedDict()
+_adapters_lock = Lock()
+
+
+@asynccontextmanager
+async def lifespan(_: FastAPI):
+    yield
+    agent_runner.shutdown()
+    repo_cache.shutdown()
+    http_clients.close()
+
 
-app = FastAPI(title="LogService", version="0.1.0")
+app = FastAPI(title="LogService", version="0.1.0", lifespan=lifespan)
 
 
 @app.get("/health")
@@ -64,34 +127,67 @@ def _load_config(config_path: str | None) -> dict[str, Any]:
 
 def _build_loki_adapter(cluster_config: dict[str, Any]) -> LokiAdapter:
     loki_cfg = cluster_config.get("loki", {})
-    headers = dict(loki_cfg.get("headers", {}))
+    base_url = loki_cfg.get("base_url", "")
+    proxy = proxy_for(base_url, cluster_config)
     auth = loki_cfg.get("auth", {})
-    if auth.get("type") == "token":
-        ref = auth.get("token_ref")
-        if ref:
-            try:
-                payload = store.load_json("auth", ref, decrypt=True) or {}
-            except StorageError as exc:
-                raise HTTPException(status_code=401, detail=str(exc)) from exc
-            token = payload.get("token")
-            header = payload.get("header", "Authorization")
-            scheme = payload.get("scheme", "Bearer")
-            if token:
-                headers[header] = f"{scheme} {token}"
+    ref = auth.get("token_ref") if auth.get("type") == "token" else None
+    # Adapters are immutable, so one per (config, proxy, token version) is
+    # shared across requests; the token version covers the master key too.
+    key = (json.dumps(loki_cfg, sort_keys=True, default=str), proxy)
+    token_sig = secret_cache.signature(ref) if ref else None
+    with _adapters_lock:
+        cached = _adapters.get(key)
+        if cached is not None and cached[0] == token_sig and not cached[1].client.is_closed:
+            _adapters.move_to_end(key)
+            return cached[1]
+
+    headers = dict(loki_cfg.get("headers", {}))
+    if ref:
+        try:
+            payload = secret_cache.get(ref) or {}
+        except StorageError as exc:
+            raise HTTPException(status_code=401, detail=str(exc)) from exc
+        token = payload.get("token")
+        header = payload.get("header", "Authorization")
+        scheme = payload.get("scheme", "Bearer")
+        if token:
+            headers[header] = f"{scheme} {token}"
 
     direction = loki_cfg.get("query_params", {}).get("direction", "backward")
-    return LokiAdapter(
-        base_url=loki_cfg.get("base_url", ""),
+    adapter = LokiAdapter(
+        base_url=base_url,
         tenant_header=loki_cfg.get("tenant_header"),
         tenant=loki_cfg.get("tenant"),
         headers=headers,
         direction=direction,
+        client=http_clients.get(base_url, proxy),
+        cache=chunk_cache if settings.cache_max_bytes > 0 else None,
     )
+    with _adapters_lock:
+        _adapters[key] = (token_sig, adapter)
+        _adapters.move_to_end(key)
+        while len(_adapters) > MAX_ADAPTERS:
+            _adapters.popitem(last=False)
+    return adapter
 
 
-@app.post("/api/query", response_model=QueryResponse)
-def query_logs(payload: QueryRequest) -> QueryResponse:
-    allowed, retry_after = limiter.allow(payload.cluster_id)
+def _rate_limits(cluster_config: dict[str, Any]) -> tuple[float, int]:
+    block = cluster_config.get("rate_limit", {})
+    interval = block.get("min_interval_seconds") or settings.min_interval_seconds
+    return 1 / interval, block.get("burst", 1)
+
+
+def _agent_rate_limits(params: dict[str, Any]) -> tuple[float, int]:
+    try:
+        return _rate_limits(_load_config(params.get("cluster_config_path")))
+    except HTTPException:
+        # The step itself reports the config error.
+        return 1 / settings.min_interval_seconds, 1
+
+
+def _check_rate_limit(payload: LogSelection) -> None:
+    rate, burst = _rate_limits(_load_config(payload.cluster_config_path))
+    allowed, retry_after = limiter.allow(payload.cluster_id, rate, burst)
     if not allowed:
         raise HTTPException(
             status_code=429,
@@ -99,6 +195,8 @@ def query_logs(payload: QueryRequest) -> QueryResponse:
             headers={"Retry-After": str(int(retry_after) + 1)},
         )
 
+
+def _query_target(payload: LogSelection) -> tuple[dict[str, Any], dict[str, str], list[str]]:
     cluster_config = _load_config(payload.cluster_config_path)
     cluster_config = resolver.resolve(cluster_config)
 
@@ -106,76 +204,421 @@ def query_logs(payload: QueryRequest) -> QueryResponse:
         raise HTTPException(status_code=400, detail="loki.base_url is required")
 
     labels_cfg = cluster_config.get("labels", {})
-    component_label = labels_cfg.get("component")
-    cluster_label = labels_cfg.get("cluster")
-    if not component_label or not cluster_label:
+    if not labels_cfg.get("component") or not labels_cfg.get("cluster"):
         raise HTTPException(status_code=400, detail="labels.cluster and labels.component are required")
 
     components = payload.components or cluster_config.get("components", [])
     if not components:
         raise HTTPException(status_code=400, detail="components is required")
+    return cluster_config, labels_cfg, components
+
+
+def _selection_logql(
+    payload: LogSelection,
+    labels_cfg: dict[str, str],
+    components: str | list[str],
+    line_format: str | None = None,
+) -> str:
+    labels: dict[str, str | list[str]] = {labels_cfg["cluster"]: payload.cluster_id, labels_cfg["component"]: components}
+    if payload.pods:
+        if not labels_cfg.get("pod"):
+            raise ValueError("labels.pod is required to filter by pod")
+        labels[labels_cfg["pod"]] = payload.pods
+    return build_logql(
+        labels,
+        payload.keywords,
+        exclude=payload.exclude_keywords,
+        regex=payload.regex,
+        levels=payload.levels,
+        parser=payload.parser,
+        label_filters=payload.label_filters,
+        line_format=line_format,
+    )
+
+
+def _prepare_query(payload: QueryRequest) -> tuple[QueryEngine, list[str], PageCursor | None]:
+    cluster_config, labels_cfg, components = _query_target(payload)
+    max_lines = cluster_config.get("rate_limit", {}).get("max_lines")
+    if max_lines:
+        payload.max_lines = min(payload.max_lines, max_lines)
+    cursor = None
+    if payload.cursor:
+        try:
+            cursor = PageCursor.decode(payload.cursor)
+        except ValueError as exc:
+            raise HTTPException(status_code=400, detail=str(exc)) from exc
+    adapter = _build_loki_adapter(cluster_config)
+    engine = QueryEngine(
+        adapter,
+        max_workers=settings.query_concurrency,
+        adaptive=payload.adaptive_windows,
+        probe=payload.adaptive_probe,
+    )
+    try:
+        queries = [
+            _selection_logql(payload, labels_cfg, component, line_format=payload.line_format)
+            for component in components
+        ]
+    except ValueError as exc:
+        raise HTTPException(status_code=400, detail=str(exc)) from exc
+    if cursor is not None and cursor.fingerprint != query_fingerprint(queries):
+        raise HTTPException(status_code=400, detail="cursor does not match this query")
+    return engine, queries, cursor
+
+
+def _redacted(batch: list[LogLine]) -> list[LogLine]:
+    if not settings.redact_enabled:
+        return batch
+    texts = redactor.redact_lines([item.line for item in batch])
+    return [LogLine(ts=item.ts, line=text, labels=item.labels) for item, text in zip(batch, texts)]
+
+
+def _to_models(batch: list[LogLine]) -> list[LogLineModel]:
+    return [LogLineModel(ts=item.ts, line=item.line, labels=item.labels) for item in _redacted(batch)]
+
+
+def _scan_limit(payload: QueryRequest) -> int:
+    # With dedup the line cap applies to distinct templates, so read further.
+    return max(settings.dedup_scan_lines, payload.max_lines) if payload.dedup else payload.max_lines
+
+
+def _template_models(clusters: list[TemplateCluster]) -> list[LogTemplateModel]:
+    return [
+        LogTemplateModel(
+            template=cluster.template,
+            count=cluster.count,
+            first_ts=cluster.first.ts,
+            last_ts=cluster.last.ts,
+            sample=LogLineModel(ts=cluster.sample.ts, line=cluster.sample.line, labels=cluster.sample.labels),
+        )
+        for cluster in clusters
+    ]
+
+
+def _page_range(
+    engine: QueryEngine,
+    cursor: PageCursor | None,
+    payload: QueryRequest,
+) -> tuple[datetime, datetime, int]:
+    start, end = payload.time_range.start, payload.time_range.end
+    fetch_limit = _scan_limit(payload)
+    if cursor is not None:
+        start, end = cursor.narrow(start, end, engine.adapter.direction)
+        # Lines on the boundary timestamp come back once more and are dropped.
+        fetch_limit += cursor.seen_count
+    return start, end, fetch_limit
+
+
+def _page_token(
+    page: list[LogLine],
+    more: bool,
+    queries: list[str],
+    cursor: PageCursor | None,
+) -> str | None:
+    if not (more and page):
+        return None
+    return next_cursor(page, query_fingerprint(queries), cursor).encode()
+
+
+def _fetch_page(
+    engine: QueryEngine,
+    queries: list[str],
+    cursor: PageCursor | None,
+    payload: QueryRequest,
+) -> tuple[list[LogLine], str | None]:
+    start, end, fetch_limit = _page_range(engine, cursor, payload)
+    batch = engine.query(queries, start=start, end=end, limit=fetch_limit, window_seconds=payload.window_seconds)
+    more = len(batch) >= fetch_limit
+    if cursor is not None:
+        batch = [item for item in batch if cursor.admits(item, engine.adapter.direction)]
+    page = batch[: _scan_limit(payload)]
+    return page, _page_token(page, more, queries, cursor)
+
+
+def _run_query(
+    engine: QueryEngine,
+    queries: list[str],
+    cursor: PageCursor | None,
+    payload: QueryRequest,
+) -> QueryResponse:
+    batch, token = _fetch_page(engine, queries, cursor, payload)
+    if not payload.dedup:
+        lines = _to_models(batch)
+        return QueryResponse(lines=lines, truncated=token is not None, next_cursor=token)
+
+    # Redact before mining so masked secrets collapse into the template.
+    clusters = mine_templates(_redacted(batch))
+    templates = _template_models(clusters[: payload.max_lines])
+    return QueryResponse(
+        lines=[template.sample for template in templates],
+        truncated=len(clusters) > payload.max_lines or token is not None,
+        templates=templates,
+        next_cursor=token,
+    )
+
 
+def _flight_key(engine: QueryEngine, queries: list[str], payload: QueryRequest) -> str:
+    def moment(value: datetime) -> str:
+        return (value.astimezone(timezone.utc) if value.tzinfo else value).isoformat()
+
+    # Everything that shapes the response; components are already in `queries`.
+    return json.dumps(
+        [
+            engine.adapter.base_url,
+            engine.adapter.tenant,
+            payload.cluster_id,
+            queries,
+            moment(payload.time_range.start),
+            moment(payload.time_range.end),
+            payload.max_lines,
+            payload.window_seconds,
+            payload.adaptive_windows,
+            payload.adaptive_probe,
+            payload.dedup,
+            payload.cursor,
+        ],
+        separators=(",", ":"),
+    )
+
+
+@app.post("/api/query", response_model=QueryResponse)
+def query_logs(payload: QueryRequest) -> QueryResponse:
+    engine, queries, cursor = _prepare_query(payload)
+
+    def execute() -> QueryResponse:
+        # Charged once per flight: callers that join share this token.
+        _check_rate_limit(payload)
+        try:
+            return _run_query(engine, queries, cursor, payload)
+        except httpx.HTTPError as exc:
+            raise HTTPException(status_code=502, detail=str(exc)) from exc
+
+    response, _ = query_flights.do(_flight_key(engine, queries, payload), execute)
+    return response
+
+
+@app.post("/api/query/aggregate", response_model=AggregateResponse)
+def aggregate_logs(payload: AggregateRequest) -> AggregateResponse:
+    _check_rate_limit(payload)
+    cluster_config, labels_cfg, components = _query_target(payload)
+    missing = [name for name in payload.group_by if not labels_cfg.get(name)]
+    if missing:
+        raise HTTPException(status_code=400, detail=f"labels.{missing[0]} is required to group by it")
+
+    start, end = payload.time_range.start, payload.time_range.end
+    step = payload.step_seconds or metric_step(start, end)
+    # One metric query over all components instead of one line query each.
+    try:
+        logql = build_metric_logql(
+            _selection_logql(payload, labels_cfg, components),
+            step,
+            by=[labels_cfg[name] for name in payload.group_by],
+        )
+    except ValueError as exc:
+        raise HTTPException(status_code=400, detail=str(exc)) from exc
     adapter = _build_loki_adapter(cluster_config)
-    lines: list[LogLineModel] = []
     try:
-        for component in components:
-            labels = {cluster_label: payload.cluster_id, component_label: component}
-            logql = build_logql(labels, payload.keywords)
-            batch = adapter.query_with_slicing(
-                logql=logql,
-                start=payload.time_range.start,
-                end=payload.time_range.end,
-                limit=payload.max_lines - len(lines),
-                window_seconds=payload.window_seconds,
-            )
-            lines.extend(LogLineModel(ts=item.ts, line=item.line, labels=item.labels) for item in batch)
-            if len(lines) >= payload.max_lines:
-                break
+        series = adapter.query_series(logql, start, end, step)
     except httpx.HTTPError as exc:
         raise HTTPException(status_code=502, detail=str(exc)) from exc
 
-    if settings.redact_enabled:
-        lines = [
-            LogLineModel(ts=item.ts, line=redactor.redact_text(item.line), labels=item.labels)
-            for item in lines
-        ]
+    models = [
+        AggregateSeries(labels=item["labels"], points=item["points"], total=sum(count for _, count in item["points"]))
+        for item in series
+    ]
+    models.sort(key=lambda item: item.total, reverse=True)
+    return AggregateResponse(step_seconds=step, series=models)
+
+
+def _stream_frame(kind: str, data: dict[str, Any], fmt: str) -> str:
+    body = json.dumps(data, ensure_ascii=False)
+    if fmt == "sse":
+        return f"event: {kind}\ndata: {body}\n\n"
+    return json.dumps({"type": kind, **data}, ensure_ascii=False) + "\n"
+
+
+@app.post("/api/query/stream")
+def query_logs_stream(
+    payload: QueryRequest,
+    format: Literal["ndjson", "sse"] = "ndjson",
+) -> StreamingResponse:
+    engine, queries, cursor = _prepare_query(payload)
+    start, end, fetch_limit = _page_range(engine, cursor, payload)
+
+    def fetch() -> Iterator[list[LogLine]]:
+        # Charged once per flight, like `/api/query`.
+        _check_rate_limit(payload)
+        return engine.iter_windows(
+            queries,
+            start=start,
+            end=end,
+            limit=fetch_limit,
+            window_seconds=payload.window_seconds,
+        )
 
-    return QueryResponse(lines=lines, truncated=len(lines) >= payload.max_lines)
+    # Identical streams share one upstream fetch; joiners replay its windows.
+    batches, _ = stream_flights.stream(_flight_key(engine, queries, payload), fetch)
+
+    def frames() -> Iterator[str]:
+        scan_limit = _scan_limit(payload)
+        fetched = 0
+        page: list[LogLine] = []
+        miner = TemplateMiner()
+        try:
+            for batch in batches:
+                fetched += len(batch)
+                if cursor is not None:
+                    batch = [item for item in batch if cursor.admits(item, engine.adapter.direction)]
+                batch = batch[: scan_limit - len(page)]
+                page.extend(batch)
+                if payload.dedup:
+                    # Templates are only final once every window is mined.
+                    for item in _redacted(batch):
+                        miner.add(item)
+                    continue
+                if batch:
+                    lines = _to_models(batch)
+                    yield _stream_frame("lines", {"lines": [line.model_dump() for line in lines]}, format)
+        except httpx.HTTPError as exc:
+            yield _stream_frame("error", {"status": 502, "detail": str(exc)}, format)
+            return
+        except HTTPException as exc:
+            # The flight this stream joined was refused, e.g. rate limited.
+            yield _stream_frame("error", {"status": exc.status_code, "detail": exc.detail}, format)
+            return
+        token = _page_token(page, fetched >= fetch_limit, queries, cursor)
+        count = len(page)
+        truncated = token is not None
+        if payload.dedup:
+            templates = _template_models(miner.clusters[: payload.max_lines])
+            yield _stream_frame("templates", {"templates": [t.model_dump() for t in templates]}, format)
+            count = len(templates)
+            truncated = truncated or len(miner.clusters) > payload.max_lines
+        yield _stream_frame("summary", {"count": count, "truncated": truncated, "next_cursor": token}, format)
+
+    media_type = "text/event-stream" if format == "sse" else "application/x-ndjson"
+    return StreamingResponse(frames(), media_type=media_type)
+
+
+def _step_detail(exc: HTTPException) -> str:
+    return exc.detail if isinstance(exc.detail, str) else json.dumps(exc.detail)
+
+
+def _latest_lines(context: dict[str, Any]) -> list[LogLineModel]:
+    for result in reversed(context["results"]):
+        if isinstance(result, dict) and "lines" in result:
+            return [LogLineModel(**line) for line in result["lines"]]
+    return []
+
+
+def _agent_query_step(step: dict[str, Any], context: dict[str, Any]) -> dict[str, Any]:
+    params = {k: v for k, v in {**context["payload"], **step}.items() if k in QueryRequest.model_fields}
+    request = QueryRequest(**params)
+    try:
+        engine, queries, cursor = _prepare_query(request)
+    except HTTPException as exc:
+        raise RuntimeError(_step_detail(exc)) from exc
+    return _run_query(engine, queries, cursor, request).model_dump()
+
+
+def _agent_filter_step(step: dict[str, Any], context: dict[str, Any]) -> dict[str, Any]:
+    lines = _latest_lines(context)
+    keywords = [k for k in step.get("keywords", []) if k]
+    pattern = re.compile(step["pattern"]) if step.get("pattern") else None
+    kept = [
+        line
+        for line in lines
+        if all(k in line.line for k in keywords) and (pattern is None or pattern.search(line.line))
+    ]
+    return {"lines": [line.model_dump() for line in kept], "truncated": False}
+
+
+def _agent_code_search_step(step: dict[str, Any], context: dict[str, Any]) -> dict[str, Any]:
+    path = step.get("path") or context["payload"].get("code_path")
+    if not path:
+        raise ValueError("code_search step requires path")
+    keywords = step.get("keywords") or context["payload"].get("keywords", [])
+    hits = search_code(
+        path,
+        keywords,
+        int(step.get("max_hits", 50)),
+        cache_root=settings.data_dir / "cache",
+        exclude_globs=settings.code_exclude_globs,
+        timeout_seconds=settings.code_search_timeout_seconds,
+        repos=repo_cache,
+        wait_seconds=None,
+    )
+    return {"hits": hits}
+
+
+def _agent_export_step(step: dict[str, Any], context: dict[str, Any]) -> dict[str, Any]:
+    fmt = step.get("format", "text")
+    if fmt not in {"text", "json", "markdown"}:
+        raise ValueError(f"unsupported export format: {fmt}")
+    return {"path": str(_write_export(_latest_lines(context), fmt))}
+
+
+agent_runner = AgentRunner(
+    store,
+    handlers={
+        "query": _agent_query_step,
+        "filter": _agent_filter_step,
+        "code_search": _agent_code_search_step,
+        "export": _agent_export_step,
+    },
+    limiter=limiter,
+    rate_limited_steps={"query"},
+    rate_limits=_agent_rate_limits,
+    max_workers=settings.agent_workers,
+    per_cluster=settings.agent_per_cluster,
+)
 
 
-@app.post("/api/export", response_model=ExportResponse)
-def export_logs(payload: ExportRequest) -> ExportResponse:
+@app.get("/api/cache/stats")
+def cache_stats() -> dict[str, int]:
+    return chunk_cache.stats()
+
+
+def _write_export(lines: list[LogLineModel], fmt: str) -> Path:
     export_dir = settings.data_dir / "exports"
     export_dir.mkdir(parents=True, exist_ok=True)
-    timestamp = datetime.utcnow().strftime("%Y%m%d%H%M%S")
-    path = export_dir / f"logservice_export_{timestamp}.{payload.format}"
+    path = export_dir / f"logservice_export_{unique_suffix()}.{fmt}"
 
-    export_lines = payload.lines
+    export_lines = lines
     if settings.redact_enabled:
+        texts = redactor.redact_lines(line.line for line in lines)
         export_lines = [
-            LogLineModel(ts=line.ts, line=redactor.redact_text(line.line), labels=line.labels)
-            for line in payload.lines
+            line if text is line.line else line.model_copy(update={"line": text})
+            for line, text in zip(lines, texts)
         ]
 
-    if payload.format == "json":
+    if fmt == "json":
         content = [line.model_dump() for line in export_lines]
         path.write_text(
-            __import__("json").dumps(content, ensure_ascii=False, indent=2),
+            json.dumps(content, ensure_ascii=False, indent=2),
             encoding="utf-8",
         )
-    elif payload.format == "markdown":
-        body = "\n".join(f\"{line.ts} {line.line}\" for line in export_lines)
-        path.write_text(f\"```\\n{body}\\n```\\n\", encoding=\"utf-8\")
+    elif fmt == "markdown":
+        body = "\n".join(f"{line.ts} {line.line}" for line in export_lines)
+        path.write_text(f"```\n{body}\n```\n", encoding="utf-8")
     else:
-        body = "\n".join(f\"{line.ts} {line.line}\" for line in export_lines)
-        path.write_text(body, encoding=\"utf-8\")
+        body = "\n".join(f"{line.ts} {line.line}" for line in export_lines)
+        path.write_text(body, encoding="utf-8")
+    return path
+
 
-    return ExportResponse(path=str(path))
+@app.post("/api/export", response_model=ExportResponse)
+def export_logs(payload: ExportRequest) -> ExportResponse:
+    return ExportResponse(path=str(_write_export(payload.lines, payload.format)))
 
 
 @app.get("/api/context/{session_id}")
-def load_context(session_id: str) -> dict[str, Any]:
-    data = store.load_json("context", session_id, decrypt=False)
+def load_context(
+    session_id: str,
+    fields: list[str] | None = Query(default=None),
+    tail: int | None = Query(default=None, ge=1),
+) -> dict[str, Any]:
+    data = context_journal.load(session_id, fields=fields, tail=tail)
     if data is None:
         raise HTTPException(status_code=404, detail="context not found")
     return data
@@ -183,13 +626,39 @@ def load_context(session_id: str) -> dict[str, Any]:
 
 @app.post("/api/context/{session_id}")
 def save_context(session_id: str, payload: dict[str, Any] = Body(...)) -> dict[str, Any]:
-    store.save_json("context", session_id, payload, encrypt=False)
-    return {"status": "ok"}
+    seq = context_journal.replace(session_id, payload)
+    return {"status": "ok", "seq": seq}
+
+
+@app.patch("/api/context/{session_id}")
+def patch_context(session_id: str, payload: ContextPatchRequest) -> dict[str, Any]:
+    try:
+        seq = context_journal.append(session_id, [op.model_dump() for op in payload.ops])
+    except ValueError as exc:
+        raise HTTPException(status_code=400, detail=str(exc)) from exc
+    return {"status": "ok", "seq": seq}
 
 
 @app.get("/api/skills")
-def list_skills() -> list[dict[str, Any]]:
-    return skill_manager.list()
+def list_skills(
+    offset: int = Query(default=0, ge=0),
+    limit: int | None = Query(default=None, ge=1, le=1000),
+    trigger: str | None = None,
+) -> list[dict[str, Any]]:
+    return skill_manager.list(offset=offset, limit=limit, trigger=trigger)
+
+
+@app.post("/api/skills/match")
+def match_skills(payload: SkillMatchRequest) -> list[dict[str, Any]]:
+    return skill_manager.match(payload.keywords, payload.limit)
+
+
+@app.get("/api/skills/{skill_id}")
+def get_skill(skill_id: str) -> dict[str, Any]:
+    skill = skill_manager.get(skill_id)
+    if not skill:
+        raise HTTPException(status_code=404, detail="skill not found")
+    return skill
 
 
 @app.post("/api/skills")
@@ -204,7 +673,7 @@ def extract_skill(payload: SkillExtractRequest) -> dict[str, Any]:
 
 @app.post("/api/agent/run")
 def run_agent(payload: AgentRunRequest) -> dict[str, Any]:
-    job_id = f"job-{datetime.utcnow().strftime('%Y%m%d%H%M%S')}"
+    job_id = new_id("job")
     job = {
         "id": job_id,
         "status": "queued",
@@ -213,13 +682,29 @@ def run_agent(payload: AgentRunRequest) -> dict[str, Any]:
         "steps": payload.steps,
         "payload": payload.payload,
     }
-    store.save_json("context", job_id, job, encrypt=False)
-    return job
+    return agent_runner.submit(job)
+
+
+@app.get("/api/agent")
+def list_agent_jobs(
+    offset: int = Query(default=0, ge=0),
+    limit: int = Query(default=50, ge=1, le=1000),
+    status: str | None = None,
+) -> list[dict[str, Any]]:
+    return job_catalog.list(offset=offset, limit=limit, key=status)
 
 
 @app.get("/api/agent/{job_id}")
 def get_agent_job(job_id: str) -> dict[str, Any]:
-    job = store.load_json("context", job_id, decrypt=False)
+    job = agent_runner.get(job_id)
+    if not job:
+        raise HTTPException(status_code=404, detail="job not found")
+    return job
+
+
+@app.post("/api/agent/{job_id}/cancel")
+def cancel_agent_job(job_id: str) -> dict[str, Any]:
+    job = agent_runner.cancel(job_id) or agent_runner.get(job_id)
     if not job:
         raise HTTPException(status_code=404, detail="job not found")
     return job
@@ -233,9 +718,53 @@ def code_search_endpoint(payload: CodeSearchRequest) -> CodeSearchResponse:
             payload.keywords,
             payload.max_hits,
             cache_root=settings.data_dir / "cache",
+            exclude_globs=settings.code_exclude_globs,
+            timeout_seconds=settings.code_search_timeout_seconds,
+            repos=repo_cache,
         )
+    except RepoWarming as exc:
+        return JSONResponse(status_code=202, content=exc.status)
     except FileNotFoundError as exc:
         raise HTTPException(status_code=404, detail=str(exc)) from exc
     except RuntimeError as exc:
         raise HTTPException(status_code=400, detail=str(exc)) from exc
     return CodeSearchResponse(hits=hits)
+
+
+@app.post("/api/code/index", response_model=CodeIndexResponse)
+def code_index_endpoint(payload: CodeIndexRequest) -> CodeIndexResponse:
+    try:
+        stats = index_code(
+            payload.path,
+            cache_root=settings.data_dir / "cache",
+            repos=repo_cache,
+            exclude_globs=settings.code_exclude_globs,
+        )
+    except RepoWarming as exc:
+        return JSONResponse(status_code=202, content=exc.status)
+    except FileNotFoundError as exc:
+        raise HTTPException(status_code=404, detail=str(exc)) from exc
+    except RuntimeError as exc:
+        raise HTTPException(status_code=400, detail=str(exc)) from exc
+    return CodeIndexResponse(**stats)
+
+
+@app.post("/api/code/correlate", response_model=CorrelateResponse)
+def code_correlate_endpoint(payload: CorrelateRequest) -> CorrelateResponse:
+    try:
+        results = correlate_lines(
+            payload.path,
+            [line.line for line in payload.lines],
+            payload.max_hits_per_line,
+            cache_root=settings.data_dir / "cache",
+            exclude_globs=settings.code_exclude_globs,
+            timeout_seconds=settings.code_search_timeout_seconds,
+            repos=repo_cache,
+        )
+    except RepoWarming as exc:
+        return JSONResponse(status_code=202, content=exc.status)
+    except FileNotFoundError as exc:
+        raise HTTPException(status_code=404, detail=str(exc)) from exc
+    except RuntimeError as exc:
+        raise HTTPException(status_code=400, detail=str(exc)) from exc
+    return CorrelateResponse(results=results)
@@ -0,0 +1,133 @@
+from __future__ import annotations
+
+import copy
+from dataclasses import dataclass, field
+from threading import Lock
+from typing import Any, Callable, Iterable
+
+from .storage import LocalStore
+
+KeyFunc = Callable[[dict[str, Any]], Iterable[str]]
+
+
+@dataclass
+class CatalogEntry:
+    signature: tuple[int, int]
+    record: dict[str, Any]
+    keys: set[str] = field(default_factory=set)
+
+
+class RecordCatalog:
+    def __init__(
+        self,
+        store: LocalStore,
+        category: str,
+        prefix: str = "",
+        keys: KeyFunc | None = None,
+        sort_field: str = "created_at",
+    ) -> None:
+        self.store = store
+        self.category = category
+        self.prefix = prefix
+        self.keys = keys
+        self.sort_field = sort_field
+        self._lock = Lock()
+        self._entries: dict[str, CatalogEntry] = {}
+        self._by_key: dict[str, set[str]] = {}
+        self._order: list[str] | None = None
+        self.version = 0
+
+    def _index(self, name: str, entry: CatalogEntry | None) -> None:
+        old = self._entries.pop(name, None)
+        if old is not None:
+            for key in old.keys:
+                names = self._by_key.get(key)
+                if names is not None:
+                    names.discard(name)
+                    if not names:
+                        del self._by_key[key]
+        if entry is not None:
+            if self.keys is not None:
+                entry.keys = {key.lower() for key in self.keys(entry.record) if key}
+            for key in entry.keys:
+                self._by_key.setdefault(key, set()).add(name)
+            self._entries[name] = entry
+        self._order = None
+        self.version += 1
+
+    def refresh(self) -> None:
+        # Only signatures on the common path; records are re-parsed when
+        # their signature changes.
+        seen: set[str] = set()
+        with self._lock:
+            for name, signature in self.store.scan(self.category, self.prefix):
+                seen.add(name)
+                current = self._entries.get(name)
+                if current is not None and current.signature == signature:
+                    continue
+                try:
+                    record = self.store.load_json(self.category, name, decrypt=False)
+                except (OSError, ValueError):
+                    # Most likely caught mid-write; keep the previous version.
+                    continue
+                if record is None:
+                    seen.discard(name)
+                    continue
+                self._index(name, CatalogEntry(signature=signature, record=record))
+            for name in set(self._entries) - seen:
+                self._index(name, None)
+
+    def put(self, name: str, record: dict[str, Any]) -> dict[str, Any]:
+        signature = self.store.save_json(self.category, name, record, encrypt=False)
+        with self._lock:
+            self._index(name, CatalogEntry(signature=signature, record=copy.deepcopy(record)))
+        return record
+
+    def get(self, name: str) -> dict[str, Any] | None:
+        if not name.startswith(self.prefix):
+            return None
+        with self._lock:
+            signature = self.store.stat(self.category, name)
+            if signature is None:
+                self._index(name, None)
+                return None
+            entry = self._entries.get(name)
+            if entry is None or entry.signature != signature:
+                try:
+                    record = self.store.load_json(self.category, name, decrypt=False)
+                except (OSError, ValueError):
+                    return copy.deepcopy(entry.record) if entry else None
+                if record is None:
+                    self._index(name, None)
+                    return None
+                entry = CatalogEntry(signature=signature, record=record)
+                self._index(name, entry)
+            return copy.deepcopy(entry.record)
+
+    def _sorted_names(self) -> list[str]:
+        if self._order is None:
+            self._order = sorted(
+                self._entries,
+                key=lambda name: (str(self._entries[name].record.get(self.sort_field, "")), name),
+                reverse=True,
+            )
+        return self._order
+
+    def list(self, offset: int = 0, limit: int | None = None, key: str | None = None) -> list[dict[str, Any]]:
+        self.refresh()
+        with self._lock:
+            names = self._sorted_names()
+            if key is not None:
+                matches = self._by_key.get(key.lower(), set())
+                names = [name for name in names if name in matches]
+            end = None if limit is None else offset + limit
+            return [copy.deepcopy(self._entries[name].record) for name in names[offset:end]]
+
+    def records(self) -> tuple[int, dict[str, dict[str, Any]]]:
+        with self._lock:
+            return self.version, {name: copy.deepcopy(entry.record) for name, entry in self._entries.items()}
+
+    def count(self) -> int:
+        self.refresh()
+        with self._lock:
+            return len(self._entries)
@@ -0,0 +1,128 @@
+from __future__ import annotations
+
+import hashlib
+import json
+import os
+import time
+from collections import OrderedDict
+from pathlib import Path
+from threading import Lock, get_ident
+from typing import Any
+
+# Bumped whenever the stored line order changes; older chunks are ignored.
+CHUNK_FORMAT = 2
+
+
+def _ts(item: list[Any]) -> int:
+    try:
+        return int(item[0])
+    except (TypeError, ValueError):
+        return 0
+
+
+class ChunkCache:
+    def __init__(self, root: Path, max_bytes: int = 256 * 1024 * 1024, settle_seconds: int = 120) -> None:
+        self.root = root
+        self.max_bytes = max_bytes
+        self.settle_seconds = settle_seconds
+        self.hits = 0
+        self.misses = 0
+        self._lock = Lock()
+        self._entries: OrderedDict[str, int] | None = None
+        self._total_bytes = 0
+
+    def _load_index(self) -> OrderedDict[str, int]:
+        if self._entries is None:
+            self.root.mkdir(parents=True, exist_ok=True)
+            found: list[tuple[float, str, int]] = []
+            for path in self.root.glob("*.json"):
+                try:
+                    stat = path.stat()
+                except FileNotFoundError:
+                    continue
+                found.append((stat.st_mtime, path.stem, stat.st_size))
+            found.sort()
+            self._entries = OrderedDict((name, size) for _, name, size in found)
+            self._total_bytes = sum(self._entries.values())
+        return self._entries
+
+    @staticmethod
+    def key(*parts: Any) -> str:
+        raw = json.dumps([CHUNK_FORMAT, *parts], ensure_ascii=False, separators=(",", ":"))
+        return hashlib.sha256(raw.encode("utf-8")).hexdigest()
+
+    def is_closed(self, end_nanos: int) -> bool:
+        return end_nanos <= time.time_ns() - self.settle_seconds * 1_000_000_000
+
+    def get(self, key: str, limit: int, direction: str = "backward") -> list[list[Any]] | None:
+        path = self.root / f"{key}.json"
+        with self._lock:
+            entries = self._load_index()
+            if key not in entries:
+                self.misses += 1
+                return None
+        try:
+            payload = json.loads(path.read_bytes())
+        except (FileNotFoundError, ValueError):
+            with self._lock:
+                self._forget(key)
+                self.misses += 1
+            return None
+
+        lines = payload.get("lines", [])
+        stored = payload.get("limit", 0)
+        # A chunk fetched with a different limit only answers when Loki had
+        # nothing more to give for that window.
+        complete = len(lines) < stored
+        if payload.get("v") != CHUNK_FORMAT or (stored != limit and not complete):
+            with self._lock:
+                self.misses += 1
+            return None
+        if len(lines) > limit:
+            lines = sorted(lines, key=_ts, reverse=direction == "backward")
+
+        with self._lock:
+            self.hits += 1
+            if key in entries:
+                entries.move_to_end(key)
+        try:
+            os.utime(path)
+        except FileNotFoundError:
+            pass
+        return lines[:limit]
+
+    def put(self, key: str, limit: int, lines: list[list[Any]]) -> None:
+        data = json.dumps({"v": CHUNK_FORMAT, "limit": limit, "lines": lines}, ensure_ascii=False, separators=(",", ":")).encode("utf-8")
+        if len(data) > self.max_bytes:
+            return
+        with self._lock:
+            entries = self._load_index()
+        path = self.root / f"{key}.json"
+        tmp_path = path.with_suffix(f".{os.getpid()}-{get_ident()}.tmp")
+        tmp_path.write_bytes(data)
+        os.replace(tmp_path, path)
+        with self._lock:
+            self._forget(key)
+            entries[key] = len(data)
+            self._total_bytes += len(data)
+            while self._total_bytes > self.max_bytes and entries:
+                victim, _ = next(iter(entries.items()))
+                self._forget(victim)
+                (self.root / f"{victim}.json").unlink(missing_ok=True)
+
+    def _forget(self, key: str) -> None:
+        entries = self._load_index()
+        size = entries.pop(key, None)
+        if size is not None:
+            self._total_bytes -= size
+
+    def stats(self) -> dict[str, int]:
+        with self._lock:
+            entries = self._load_index()
+            return {
+                "hits": self.hits,
+                "misses": self.misses,
+                "entries": len(entries),
+                "bytes": self._total_bytes,
+                "max_bytes": self.max_bytes,
+            }
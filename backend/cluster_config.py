@@ -1,5 +1,7 @@
+import copy
 import json
 from pathlib import Path
+from threading import Lock
 from typing import Any
 
 from jsonschema import Draft7Validator
@@ -11,25 +13,67 @@ class ConfigValidationError(ValueError):
         self.errors = errors
 
 
-def load_cluster_config(config_path: Path, schema_path: Path) -> dict[str, Any]:
-    if not config_path.exists():
-        raise FileNotFoundError(f"Config not found: {config_path}")
-    if not schema_path.exists():
-        raise FileNotFoundError(f"Schema not found: {schema_path}")
+FileSignature = tuple[int, int]
+
+_cache_lock = Lock()
+_validators: dict[Path, tuple[FileSignature, Draft7Validator]] = {}
+_configs: dict[tuple[Path, Path], tuple[FileSignature, FileSignature, dict[str, Any] | None, list[str]]] = {}
+
+
+def _signature(path: Path, label: str) -> FileSignature:
+    try:
+        stat = path.stat()
+    except FileNotFoundError as exc:
+        raise FileNotFoundError(f"{label} not found: {path}") from exc
+    return stat.st_mtime_ns, stat.st_size
+
+
+def _validator(schema_path: Path, signature: FileSignature) -> Draft7Validator:
+    with _cache_lock:
+        cached = _validators.get(schema_path)
+    if cached and cached[0] == signature:
+        return cached[1]
 
-    with config_path.open("r", encoding="utf-8") as f:
-        data = json.load(f)
     with schema_path.open("r", encoding="utf-8") as f:
         schema = json.load(f)
-
     validator = Draft7Validator(schema)
+    with _cache_lock:
+        _validators[schema_path] = (signature, validator)
+    return validator
+
+
+def _validate(data: Any, validator: Draft7Validator) -> list[str]:
     errors = sorted(validator.iter_errors(data), key=lambda e: e.path)
+    messages = []
+    for err in errors:
+        path = "/".join(str(p) for p in err.path)
+        loc = f"{path}: " if path else ""
+        messages.append(f"{loc}{err.message}")
+    return messages
+
+
+def clear_config_cache() -> None:
+    with _cache_lock:
+        _validators.clear()
+        _configs.clear()
+
+
+def load_cluster_config(config_path: Path, schema_path: Path) -> dict[str, Any]:
+    config_sig = _signature(config_path, "Config")
+    schema_sig = _signature(schema_path, "Schema")
+    key = (config_path, schema_path)
+
+    with _cache_lock:
+        cached = _configs.get(key)
+    if cached is None or cached[0] != config_sig or cached[1] != schema_sig:
+        with config_path.open("r", encoding="utf-8") as f:
+            data = json.load(f)
+        errors = _validate(data, _validator(schema_path, schema_sig))
+        cached = (config_sig, schema_sig, None if errors else data, errors)
+        with _cache_lock:
+            _configs[key] = cached
+
+    _, _, data, errors = cached
     if errors:
-        messages = []
-        for err in errors:
-            path = "/".join(str(p) for p in err.path)
-            loc = f"{path}: " if path else ""
-            messages.append(f"{loc}{err.message}")
-        raise ConfigValidationError(messages)
-
-    return data
+        raise ConfigValidationError(list(errors))
+    return copy.deepcopy(data)
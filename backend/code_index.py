@@ -0,0 +1,208 @@
+from __future__ import annotations
+
+import hashlib
+import os
+import sqlite3
+from contextlib import closing
+from fnmatch import fnmatch
+from pathlib import Path
+from typing import Iterator, Sequence
+
+# Matched against both the entry name and its path relative to the search
+# root, so bare names prune a directory at any depth.
+DEFAULT_EXCLUDE_GLOBS = (
+    ".git",
+    ".hg",
+    ".svn",
+    "node_modules",
+    "vendor",
+    "target",
+    "__pycache__",
+    ".venv",
+    "venv",
+    "*.min.js",
+    "*.map",
+)
+MAX_FILE_BYTES = 2 * 1024 * 1024
+BINARY_PROBE = 8192
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS meta (key TEXT PRIMARY KEY, value TEXT NOT NULL);
+CREATE TABLE IF NOT EXISTS files (
+    id INTEGER PRIMARY KEY,
+    path TEXT NOT NULL UNIQUE,
+    mtime_ns INTEGER NOT NULL,
+    size INTEGER NOT NULL,
+    text INTEGER NOT NULL
+);
+CREATE TABLE IF NOT EXISTS postings (
+    trigram BLOB NOT NULL,
+    file_id INTEGER NOT NULL,
+    PRIMARY KEY (trigram, file_id)
+) WITHOUT ROWID;
+CREATE INDEX IF NOT EXISTS postings_file ON postings (file_id);
+"""
+
+
+def _trigrams(data: bytes) -> set[bytes]:
+    return {data[i : i + 3] for i in range(len(data) - 2)}
+
+
+def is_binary(data: bytes) -> bool:
+    return b"\0" in data[:BINARY_PROBE]
+
+
+def _excluded(rel_path: str, name: str, exclude_globs: Sequence[str]) -> bool:
+    return any(fnmatch(name, glob) or fnmatch(rel_path, glob) for glob in exclude_globs)
+
+
+def walk_files(path: Path, exclude_globs: Sequence[str]) -> Iterator[tuple[str, os.stat_result]]:
+    # Lazy, pruned walk with the same exclusions rg gets through --glob.
+    if path.is_file():
+        yield str(path), path.stat()
+        return
+    for dirpath, dirnames, filenames in os.walk(path):
+        rel_dir = os.path.relpath(dirpath, path)
+        dirnames[:] = sorted(
+            d for d in dirnames if not _excluded(os.path.normpath(os.path.join(rel_dir, d)), d, exclude_globs)
+        )
+        for filename in sorted(filenames):
+            if _excluded(os.path.normpath(os.path.join(rel_dir, filename)), filename, exclude_globs):
+                continue
+            file_path = os.path.join(dirpath, filename)
+            try:
+                stat = os.stat(file_path)
+            except OSError:
+                continue
+            if stat.st_size <= MAX_FILE_BYTES:
+                yield file_path, stat
+
+
+class CodeIndex:
+    def __init__(self, root: Path, index_path: Path, exclude_globs: Sequence[str] | None = None) -> None:
+        self.root = root
+        self.index_path = index_path
+        self.exclude_globs = DEFAULT_EXCLUDE_GLOBS if exclude_globs is None else exclude_globs
+
+    @classmethod
+    def for_path(
+        cls,
+        root: Path,
+        cache_root: Path,
+        exclude_globs: Sequence[str] | None = None,
+        key: Path | None = None,
+    ) -> "CodeIndex":
+        # `key` names the index when `root` moves, e.g. a repo checkout per HEAD.
+        digest = hashlib.sha256(str((key or root).resolve()).encode("utf-8")).hexdigest()[:24]
+        return cls(root, cache_root / "code_index" / f"{digest}.sqlite", exclude_globs)
+
+    def _relative(self, path: str) -> str:
+        return os.path.relpath(path, self.root)
+
+    def _absolute(self, path: str) -> str:
+        # Indexes written before paths were stored relative hold absolute ones.
+        return str(self.root) if path == "." else os.path.join(self.root, path)
+
+    def exists(self) -> bool:
+        return self.index_path.exists()
+
+    def _connect(self) -> sqlite3.Connection:
+        self.index_path.parent.mkdir(parents=True, exist_ok=True)
+        conn = sqlite3.connect(self.index_path, timeout=30)
+        conn.execute("PRAGMA journal_mode=WAL")
+        conn.execute("PRAGMA synchronous=NORMAL")
+        conn.executescript(_SCHEMA)
+        return conn
+
+    def update(self, git_head: str | None = None) -> dict[str, int]:
+        stats = {"files": 0, "indexed": 0, "removed": 0}
+        with closing(self._connect()) as conn, conn:
+            row = conn.execute("SELECT value FROM meta WHERE key = 'git_head'").fetchone()
+            excludes = conn.execute("SELECT value FROM meta WHERE key = 'exclude_globs'").fetchone()
+            globs = "\n".join(self.exclude_globs)
+            # A new exclusion list changes the file set even at the same HEAD.
+            if git_head and row and row[0] == git_head and excludes and excludes[0] == globs:
+                stats["files"] = conn.execute("SELECT COUNT(*) FROM files").fetchone()[0]
+                return stats
+
+            known = {path: (file_id, mtime, size) for file_id, path, mtime, size in conn.execute(
+                "SELECT id, path, mtime_ns, size FROM files"
+            )}
+            seen: set[str] = set()
+            for file_path, stat in walk_files(self.root, self.exclude_globs):
+                path = self._relative(file_path)
+                seen.add(path)
+                current = known.get(path)
+                if current and current[1] == stat.st_mtime_ns and current[2] == stat.st_size:
+                    continue
+                try:
+                    data = Path(file_path).read_bytes()
+                except OSError:
+                    continue
+                text = not is_binary(data)
+                if current:
+                    conn.execute("DELETE FROM postings WHERE file_id = ?", (current[0],))
+                    conn.execute(
+                        "UPDATE files SET mtime_ns = ?, size = ?, text = ? WHERE id = ?",
+                        (stat.st_mtime_ns, stat.st_size, text, current[0]),
+                    )
+                    file_id = current[0]
+                else:
+                    file_id = conn.execute(
+                        "INSERT INTO files (path, mtime_ns, size, text) VALUES (?, ?, ?, ?)",
+                        (path, stat.st_mtime_ns, stat.st_size, text),
+                    ).lastrowid
+                # Binary files stay in `files` so they are not re-read on
+                # every update, but they get no postings and never match.
+                if text:
+                    conn.executemany(
+                        "INSERT OR IGNORE INTO postings (trigram, file_id) VALUES (?, ?)",
+                        ((gram, file_id) for gram in _trigrams(data.lower())),
+                    )
+                stats["indexed"] += 1
+
+            for path in set(known) - seen:
+                conn.execute("DELETE FROM postings WHERE file_id = ?", (known[path][0],))
+                conn.execute("DELETE FROM files WHERE id = ?", (known[path][0],))
+                stats["removed"] += 1
+
+            if git_head:
+                conn.execute("INSERT OR REPLACE INTO meta (key, value) VALUES ('git_head', ?)", (git_head,))
+            conn.execute("INSERT OR REPLACE INTO meta (key, value) VALUES ('exclude_globs', ?)", (globs,))
+            stats["files"] = len(seen)
+        return stats
+
+    def candidates(self, keywords: list[str]) -> list[str]:
+        with closing(self._connect()) as conn:
+            found: set[str] = set()
+            for keyword in keywords:
+                grams = sorted(_trigrams(keyword.encode("utf-8").lower()))
+                if not grams:
+                    # Too short to filter on; every text file is a candidate.
+                    rows = conn.execute("SELECT path FROM files WHERE text = 1")
+                else:
+                    placeholders = ",".join("?" for _ in grams)
+                    rows = conn.execute(
+                        f"SELECT f.path FROM postings p JOIN files f ON f.id = p.file_id "
+                        f"WHERE p.trigram IN ({placeholders}) GROUP BY p.file_id HAVING COUNT(*) = ?",
+                        (*grams, len(grams)),
+                    )
+                found.update(self._absolute(path) for (path,) in rows)
+            return sorted(found)
+
+    def search(self, keywords: list[str], max_hits: int) -> list[dict[str, str | int]]:
+        keywords = [k for k in keywords if k]
+        hits: list[dict[str, str | int]] = []
+        if not keywords:
+            return hits
+        for path in self.candidates(keywords):
+            try:
+                with open(path, "r", encoding="utf-8", errors="ignore") as f:
+                    for idx, line in enumerate(f, start=1):
+                        if any(k in line for k in keywords):
+                            hits.append({"file": path, "line": idx, "text": line.rstrip("\r\n")})
+                            if len(hits) >= max_hits:
+                                return hits
+            except OSError:
+                continue
+        return hits
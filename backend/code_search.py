@@ -1,31 +1,35 @@
 from __future__ import annotations
 
+import json
 import os
 import re
 import shutil
+import sqlite3
 import subprocess
-from dataclasses import dataclass
+import tempfile
+import threading
+import time
+from contextlib import closing
 from pathlib import Path
-from typing import Iterable
+from typing import Iterable, Iterator, Sequence
 from urllib.parse import urlparse
 
+from .code_index import BINARY_PROBE, DEFAULT_EXCLUDE_GLOBS, MAX_FILE_BYTES, CodeIndex, is_binary, walk_files
+from .repo_cache import GithubRepoRef, RepoCache, RepoWarming
+from .skill_match import TriggerMatcher
 
-@dataclass(frozen=True)
-class GithubRepoRef:
-    owner: str
-    repo: str
-    branch: str | None
-    subpath: str | None
+SEARCH_TIMEOUT_SECONDS = 30.0
+INDEX_REFRESH_SECONDS = 60.0
+
+_refresh_lock = threading.Lock()
+_refreshed_at: dict[Path, float] = {}
+_refreshing: set[Path] = set()
 
 
 def _rg_available() -> bool:
     return shutil.which("rg") is not None
 
 
-def _git_available() -> bool:
-    return shutil.which("git") is not None
-
-
 def _build_pattern(keywords: Iterable[str]) -> str:
     escaped = [re.escape(k) for k in keywords if k]
     return "|".join(escaped)
@@ -57,91 +61,278 @@ def _parse_github_url(value: str) -> GithubRepoRef:
     return GithubRepoRef(owner=owner, repo=repo, branch=branch, subpath=subpath)
 
 
-def _safe_repo_dir_name(ref: GithubRepoRef) -> str:
-    return re.sub(r"[^a-zA-Z0-9_.-]", "-", f"{ref.owner}_{ref.repo}")
-
-
-def _materialize_github_repo(ref: GithubRepoRef, cache_root: Path) -> Path:
-    if not _git_available():
-        raise RuntimeError("git is required for GitHub code search")
-
-    repo_root = cache_root / "repos"
-    repo_root.mkdir(parents=True, exist_ok=True)
-    repo_dir = repo_root / _safe_repo_dir_name(ref)
+def _resolve_target(
+    path: str | Path,
+    cache_root: Path | None,
+    repos: RepoCache | None = None,
+    wait_seconds: float | None = 0,
+) -> tuple[Path, str | None, Path | None]:
+    # Returns (search root, git HEAD, stable index key for repo checkouts).
+    path_value = str(path)
+    if not _is_github_url(path_value):
+        return Path(path_value), None, None
 
-    if repo_dir.exists():
-        if not (repo_dir / ".git").exists():
-            raise RuntimeError(f"cache path is not a git repo: {repo_dir}")
-        return repo_dir
+    ref = _parse_github_url(path_value)
+    if repos is None:
+        cache_root = cache_root or Path(os.path.expanduser("~/.logservice/cache"))
+        repo_dir, git_head = RepoCache(cache_root / "repos").materialize(ref)
+    else:
+        status = repos.ensure(ref) if wait_seconds == 0 else repos.wait(ref, wait_seconds)
+        if status["state"] == "failed":
+            raise RuntimeError(status["error"] or "git fetch failed")
+        if status["state"] != "ready":
+            raise RepoWarming(status)
+        repo_dir, git_head = Path(status["path"]), status["head"]
+    target = repo_dir / ref.subpath if ref.subpath else repo_dir
+    # Cached worktrees are never edited in place, so HEAD pins their content.
+    # Each HEAD has its own checkout; the branch directory above it is stable.
+    key = repo_dir.parent / ref.subpath if ref.subpath else repo_dir.parent
+    return target, git_head, key
+
+
+def _refresh_later(index: CodeIndex, git_head: str | None) -> None:
+    # Searches only probe the index; it catches up with the tree on a
+    # background thread, at most once per INDEX_REFRESH_SECONDS.
+    now = time.monotonic()
+    with _refresh_lock:
+        last = _refreshed_at.get(index.index_path)
+        if index.index_path in _refreshing or (last is not None and now - last < INDEX_REFRESH_SECONDS):
+            return
+        _refreshing.add(index.index_path)
+        _refreshed_at[index.index_path] = now
+
+    def run() -> None:
+        try:
+            index.update(git_head=git_head)
+        except (OSError, sqlite3.Error):
+            pass
+        finally:
+            with _refresh_lock:
+                _refreshing.discard(index.index_path)
 
-    clone_url = f"https://github.com/{ref.owner}/{ref.repo}.git"
-    cmd = ["git", "clone", "--depth", "1"]
-    if ref.branch:
-        cmd += ["--branch", ref.branch]
-    cmd += [clone_url, str(repo_dir)]
-    result = subprocess.run(cmd, capture_output=True, text=True, check=False)
-    if result.returncode != 0:
-        raise RuntimeError(result.stderr.strip() or "git clone failed")
-    return repo_dir
+    threading.Thread(target=run, name="code-index-refresh", daemon=True).start()
 
 
-def _search_local(path: Path, keywords: list[str], max_hits: int) -> list[dict[str, str | int]]:
+def index_code(
+    path: str | Path,
+    cache_root: Path,
+    repos: RepoCache | None = None,
+    wait_seconds: float | None = 0,
+    exclude_globs: Sequence[str] | None = None,
+) -> dict[str, int]:
+    target, git_head, key = _resolve_target(path, cache_root, repos, wait_seconds)
+    if not target.exists():
+        raise FileNotFoundError(f"code path not found: {target}")
+    return CodeIndex.for_path(target, cache_root, exclude_globs, key).update(git_head=git_head)
+
+
+def _walk_files(path: Path, exclude_globs: Sequence[str]) -> Iterator[str]:
+    return (file_path for file_path, _ in walk_files(path, exclude_globs))
+
+
+def _iter_text_lines(file_path: str | Path) -> Iterator[tuple[int, str]]:
+    try:
+        with open(file_path, "rb") as f:
+            if is_binary(f.read(BINARY_PROBE)):
+                return
+            f.seek(0)
+            for idx, raw in enumerate(f, start=1):
+                yield idx, raw.decode("utf-8", errors="ignore").rstrip("\r\n")
+    except OSError:
+        return
+
+
+def _iter_rg_matches(
+    args: list[str],
+    exclude_globs: Sequence[str],
+    timeout_seconds: float,
+) -> Iterator[tuple[str, int, str]]:
+    cmd = ["rg", "--json", "--max-filesize", str(MAX_FILE_BYTES)]
+    for glob in exclude_globs:
+        cmd += ["--glob", f"!{glob}"]
+    cmd += args
+    proc = subprocess.Popen(cmd, stdout=subprocess.PIPE, stderr=subprocess.DEVNULL)
+    # Killing the process ends the stdout iteration below, so a timeout just
+    # truncates the results instead of blocking the request.
+    timer = threading.Timer(timeout_seconds, proc.kill)
+    timer.daemon = True
+    timer.start()
+    try:
+        assert proc.stdout is not None
+        for raw in proc.stdout:
+            try:
+                event = json.loads(raw)
+            except ValueError:
+                continue
+            if event.get("type") != "match":
+                continue
+            data = event["data"]
+            # Non-UTF-8 paths and lines come back base64-encoded under "bytes".
+            file_path = data["path"].get("text")
+            text = data["lines"].get("text")
+            if file_path is None or text is None:
+                continue
+            yield file_path, int(data["line_number"]), text.rstrip("\r\n")
+    finally:
+        timer.cancel()
+        if proc.poll() is None:
+            proc.kill()
+        if proc.stdout is not None:
+            proc.stdout.close()
+        proc.wait()
+
+
+def _search_local(
+    path: Path,
+    keywords: list[str],
+    max_hits: int,
+    exclude_globs: Sequence[str] = DEFAULT_EXCLUDE_GLOBS,
+    timeout_seconds: float = SEARCH_TIMEOUT_SECONDS,
+) -> list[dict[str, str | int]]:
     if not path.exists():
         raise FileNotFoundError(f"code path not found: {path}")
 
-    pattern = _build_pattern(keywords)
     hits: list[dict[str, str | int]] = []
+    if max_hits <= 0:
+        return hits
 
     if _rg_available():
-        cmd = [
-            "rg",
-            "-n",
-            "--no-heading",
-            "--max-count",
-            str(max_hits),
-            pattern,
-            str(path),
-        ]
-        result = subprocess.run(cmd, capture_output=True, text=True, check=False)
-        if result.stdout:
-            for line in result.stdout.splitlines():
-                parts = line.split(":", 2)
-                if len(parts) == 3:
-                    file_path, line_no, text = parts
-                    hits.append({"file": file_path, "line": int(line_no), "text": text})
-        return hits[:max_hits]
-
-    for file_path in path.rglob("*"):
-        if file_path.is_dir():
-            continue
-        try:
-            content = file_path.read_text(encoding="utf-8", errors="ignore").splitlines()
-        except OSError:
-            continue
-        for idx, line in enumerate(content, start=1):
+        args = ["-e", _build_pattern(keywords), str(path)]
+        with closing(_iter_rg_matches(args, exclude_globs, timeout_seconds)) as matches:
+            for file_path, line_no, text in matches:
+                hits.append({"file": file_path, "line": line_no, "text": text})
+                if len(hits) >= max_hits:
+                    break
+        return hits
+
+    deadline = time.monotonic() + timeout_seconds
+    for file_path in _walk_files(path, exclude_globs):
+        if time.monotonic() > deadline:
+            break
+        for idx, line in _iter_text_lines(file_path):
             if any(k in line for k in keywords):
-                hits.append({"file": str(file_path), "line": idx, "text": line})
+                hits.append({"file": file_path, "line": idx, "text": line})
                 if len(hits) >= max_hits:
                     return hits
 
     return hits
 
 
+def _literal_matcher(literals: list[str]) -> TriggerMatcher:
+    matcher = TriggerMatcher()
+    for literal in literals:
+        matcher.add(literal, [literal])
+    return matcher
+
+
+def _collect(
+    found: dict[str, list[dict[str, str | int]]],
+    matcher: TriggerMatcher,
+    file_path: str,
+    line_no: int,
+    text: str,
+    max_hits: int,
+) -> int:
+    # The matcher is case-insensitive; confirm each literal exactly.
+    added = 0
+    for literal in matcher.match(text):
+        if literal in text and len(found[literal]) < max_hits:
+            found[literal].append({"file": file_path, "line": line_no, "text": text})
+            added += 1
+    return added
+
+
+def _scan_files(
+    files: Iterable[str | Path],
+    literals: list[str],
+    max_hits: int,
+    timeout_seconds: float = SEARCH_TIMEOUT_SECONDS,
+) -> dict[str, list[dict[str, str | int]]]:
+    matcher = _literal_matcher(literals)
+    found: dict[str, list[dict[str, str | int]]] = {literal: [] for literal in literals}
+    remaining = max_hits * len(literals)
+    deadline = time.monotonic() + timeout_seconds
+    for file_path in files:
+        if remaining <= 0 or time.monotonic() > deadline:
+            break
+        for idx, line in _iter_text_lines(file_path):
+            remaining -= _collect(found, matcher, str(file_path), idx, line, max_hits)
+            if remaining <= 0:
+                break
+    return found
+
+
+def _rg_literals(
+    path: Path,
+    literals: list[str],
+    max_hits: int,
+    exclude_globs: Sequence[str] = DEFAULT_EXCLUDE_GLOBS,
+    timeout_seconds: float = SEARCH_TIMEOUT_SECONDS,
+) -> dict[str, list[dict[str, str | int]]]:
+    matcher = _literal_matcher(literals)
+    found: dict[str, list[dict[str, str | int]]] = {literal: [] for literal in literals}
+    remaining = max_hits * len(literals)
+    with tempfile.NamedTemporaryFile("w", encoding="utf-8", suffix=".patterns", delete=False) as f:
+        f.write("\n".join(literals) + "\n")
+        pattern_file = f.name
+    try:
+        args = ["-F", "-f", pattern_file, str(path)]
+        with closing(_iter_rg_matches(args, exclude_globs, timeout_seconds)) as matches:
+            for file_path, line_no, text in matches:
+                remaining -= _collect(found, matcher, file_path, line_no, text, max_hits)
+                if remaining <= 0:
+                    break
+    finally:
+        os.unlink(pattern_file)
+    return found
+
+
+def search_literals(
+    path: str | Path,
+    literals: list[str],
+    max_hits: int,
+    cache_root: Path | None = None,
+    exclude_globs: Sequence[str] | None = None,
+    timeout_seconds: float = SEARCH_TIMEOUT_SECONDS,
+    repos: RepoCache | None = None,
+    wait_seconds: float | None = 0,
+) -> dict[str, list[dict[str, str | int]]]:
+    literals = sorted({literal for literal in literals if literal})
+    if not literals:
+        return {}
+
+    target, git_head, key = _resolve_target(path, cache_root, repos, wait_seconds)
+    if not target.exists():
+        raise FileNotFoundError(f"code path not found: {target}")
+    if cache_root is not None:
+        index = CodeIndex.for_path(target, cache_root, exclude_globs, key)
+        if index.exists():
+            _refresh_later(index, git_head)
+            return _scan_files(index.candidates(literals), literals, max_hits, timeout_seconds)
+    exclude_globs = DEFAULT_EXCLUDE_GLOBS if exclude_globs is None else exclude_globs
+    if _rg_available():
+        return _rg_literals(target, literals, max_hits, exclude_globs, timeout_seconds)
+    return _scan_files(_walk_files(target, exclude_globs), literals, max_hits, timeout_seconds)
+
+
 def search_code(
     path: str | Path,
     keywords: list[str],
     max_hits: int,
     cache_root: Path | None = None,
+    exclude_globs: Sequence[str] | None = None,
+    timeout_seconds: float = SEARCH_TIMEOUT_SECONDS,
+    repos: RepoCache | None = None,
+    wait_seconds: float | None = 0,
 ) -> list[dict[str, str | int]]:
     if not keywords:
         return []
 
-    path_value = str(path)
-    if _is_github_url(path_value):
-        ref = _parse_github_url(path_value)
-        cache_root = cache_root or Path(os.path.expanduser("~/.logservice/cache"))
-        repo_dir = _materialize_github_repo(ref, cache_root)
-        target = repo_dir / ref.subpath if ref.subpath else repo_dir
-        return _search_local(target, keywords, max_hits)
-
-    return _search_local(Path(path_value), keywords, max_hits)
+    target, git_head, key = _resolve_target(path, cache_root, repos, wait_seconds)
+    if cache_root is not None and target.exists():
+        index = CodeIndex.for_path(target, cache_root, exclude_globs, key)
+        if index.exists():
+            _refresh_later(index, git_head)
+            return index.search(keywords, max_hits)
+    exclude_globs = DEFAULT_EXCLUDE_GLOBS if exclude_globs is None else exclude_globs
+    return _search_local(target, keywords, max_hits, exclude_globs, timeout_seconds)
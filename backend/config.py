@@ -1,5 +1,7 @@
 import os
 from pathlib import Path
+from typing import Literal
+
 from pydantic import BaseModel, Field
 
 
@@ -7,18 +9,42 @@ class Settings(BaseModel):
     env: str = Field(default="local")
     config_path: Path | None = None
     data_dir: Path = Field(default_factory=lambda: Path.home() / ".logservice")
+    storage_backend: Literal["files", "sqlite"] = Field(default="sqlite")
     max_lines: int = Field(default=100)
     min_interval_seconds: int = Field(default=10)
+    rate_limit_backend: Literal["memory", "sqlite"] = Field(default="sqlite")
     redact_enabled: bool = Field(default=True)
     redaction_path: Path | None = None
+    query_concurrency: int = Field(default=4, ge=1)
+    cache_max_bytes: int = Field(default=256 * 1024 * 1024, ge=0)
+    agent_workers: int = Field(default=2, ge=1)
+    agent_per_cluster: int = Field(default=1, ge=1)
+    code_exclude_globs: list[str] | None = None
+    code_search_timeout_seconds: float = Field(default=30.0, gt=0)
+    repo_cache_max_bytes: int = Field(default=2 * 1024 * 1024 * 1024, ge=0)
+    repo_refresh_seconds: int = Field(default=600, ge=0)
+    dedup_scan_lines: int = Field(default=2000, ge=1)
+    secret_ttl_seconds: float = Field(default=300.0, ge=0)
 
 
 def load_settings() -> Settings:
     env = os.getenv("LOGSERVICE_ENV", "local")
     config_path = os.getenv("LOGSERVICE_CONFIG")
     data_dir = os.getenv("LOGSERVICE_DATA_DIR")
+    storage_backend = os.getenv("LOGSERVICE_STORAGE")
+    rate_limit_backend = os.getenv("LOGSERVICE_RATE_LIMIT_BACKEND")
     redact_enabled = os.getenv("LOGSERVICE_REDACT", "true").lower() in {"1", "true", "yes"}
     redaction_path = os.getenv("LOGSERVICE_REDACTION_PATH")
+    query_concurrency = os.getenv("LOGSERVICE_QUERY_CONCURRENCY")
+    cache_max_bytes = os.getenv("LOGSERVICE_CACHE_MAX_BYTES")
+    agent_workers = os.getenv("LOGSERVICE_AGENT_WORKERS")
+    agent_per_cluster = os.getenv("LOGSERVICE_AGENT_PER_CLUSTER")
+    code_exclude_globs = os.getenv("LOGSERVICE_CODE_EXCLUDE")
+    code_search_timeout = os.getenv("LOGSERVICE_CODE_SEARCH_TIMEOUT")
+    repo_cache_max_bytes = os.getenv("LOGSERVICE_REPO_CACHE_MAX_BYTES")
+    repo_refresh_seconds = os.getenv("LOGSERVICE_REPO_REFRESH_SECONDS")
+    dedup_scan_lines = os.getenv("LOGSERVICE_DEDUP_SCAN_LINES")
+    secret_ttl = os.getenv("LOGSERVICE_SECRET_TTL")
     values = {
         "env": env,
         "config_path": Path(config_path) if config_path else None,
@@ -26,6 +52,30 @@ def load_settings() -> Settings:
     }
     if data_dir:
         values["data_dir"] = Path(data_dir)
+    if storage_backend:
+        values["storage_backend"] = storage_backend.strip().lower()
+    if rate_limit_backend:
+        values["rate_limit_backend"] = rate_limit_backend.strip().lower()
     if redaction_path:
         values["redaction_path"] = Path(redaction_path)
+    if query_concurrency:
+        values["query_concurrency"] = int(query_concurrency)
+    if cache_max_bytes:
+        values["cache_max_bytes"] = int(cache_max_bytes)
+    if agent_workers:
+        values["agent_workers"] = int(agent_workers)
+    if agent_per_cluster:
+        values["agent_per_cluster"] = int(agent_per_cluster)
+    if code_exclude_globs is not None:
+        values["code_exclude_globs"] = [glob.strip() for glob in code_exclude_globs.split(",") if glob.strip()]
+    if code_search_timeout:
+        values["code_search_timeout_seconds"] = float(code_search_timeout)
+    if repo_cache_max_bytes:
+        values["repo_cache_max_bytes"] = int(repo_cache_max_bytes)
+    if repo_refresh_seconds:
+        values["repo_refresh_seconds"] = int(repo_refresh_seconds)
+    if dedup_scan_lines:
+        values["dedup_scan_lines"] = int(dedup_scan_lines)
+    if secret_ttl:
+        values["secret_ttl_seconds"] = float(secret_ttl)
     return Settings(**values)
@@ -0,0 +1,271 @@
+from __future__ import annotations
+
+import base64
+import json
+import re
+import zlib
+from threading import Lock
+from typing import Any
+
+from .storage import LocalStore, StorageError
+
+CATEGORY = "journal"
+LEGACY_CATEGORY = "context"
+
+# Record names, all under `<session_id>~`: one `d<seq>` per delta, `seg-<first>-<last>`
+# for a compressed run of deltas and `snap-<seq>` for the compacted document.
+_RECORD = re.compile(r"(?:d(?P<seq>\d+)|seg-(?P<first>\d+)-(?P<last>\d+)|snap-(?P<snap>\d+))")
+
+OPS = ("set", "append", "extend", "remove")
+
+
+def _pack(value: Any) -> str:
+    raw = json.dumps(value, ensure_ascii=False, separators=(",", ":")).encode("utf-8")
+    return base64.b64encode(zlib.compress(raw, 6)).decode("ascii")
+
+
+def _unpack(data: str) -> Any:
+    return json.loads(zlib.decompress(base64.b64decode(data)).decode("utf-8"))
+
+
+def validate_op(op: dict[str, Any]) -> dict[str, Any]:
+    if op.get("op") not in OPS:
+        raise ValueError(f"unknown context op: {op.get('op')!r}")
+    path = op.get("path")
+    if not isinstance(path, list) or not path or not isinstance(path[0], str):
+        raise ValueError("context op path must be a non-empty list starting with a key")
+    if any(isinstance(part, bool) or not isinstance(part, (str, int)) for part in path):
+        raise ValueError("context op path items must be keys or list indexes")
+    if op["op"] == "extend" and not isinstance(op.get("value"), list):
+        raise ValueError("extend needs a list value")
+    return {"op": op["op"], "path": list(path), "value": op.get("value")}
+
+
+def apply_op(doc: dict[str, Any], op: dict[str, Any]) -> None:
+    # Ops whose path runs through a value of the wrong shape are skipped, so
+    # one stale delta never makes a session unreadable.
+    *parents, last = op["path"]
+    node: Any = doc
+    for part in parents:
+        if isinstance(node, dict):
+            if part not in node and op["op"] != "remove":
+                node[part] = {}
+            node = node.get(part)
+        elif isinstance(node, list) and isinstance(part, int) and -len(node) <= part < len(node):
+            node = node[part]
+        else:
+            return
+    kind = op["op"]
+    if isinstance(node, list):
+        if not isinstance(last, int) or not -len(node) <= last < len(node):
+            return
+        if kind == "set":
+            node[last] = op["value"]
+        elif kind == "remove":
+            del node[last]
+        elif isinstance(node[last], list):
+            _add(node[last], kind, op["value"])
+        return
+    if not isinstance(node, dict):
+        return
+    if kind == "set":
+        node[last] = op["value"]
+    elif kind == "remove":
+        node.pop(last, None)
+    else:
+        target = node.setdefault(last, [])
+        if isinstance(target, list):
+            _add(target, kind, op["value"])
+
+
+def _add(target: list[Any], kind: str, value: Any) -> None:
+    if kind == "append":
+        target.append(value)
+    else:
+        target.extend(value)
+
+
+# One record per delta, folded into compressed segments every `segment_size`
+# sequence numbers; a full load replaying `compact_segments` segments writes a
+# snapshot. Numbers are assigned in the same storage step that writes the
+# record, so no reader ever sees a number before its record.
+class ContextJournal:
+    def __init__(self, store: LocalStore, segment_size: int = 64, compact_segments: int = 8) -> None:
+        self.store = store
+        self.segment_size = segment_size
+        self.compact_segments = compact_segments
+        self._lock = Lock()
+        self._session_locks: dict[str, Lock] = {}
+        self._seeded: set[str] = set()
+
+    def _session_lock(self, session_id: str) -> Lock:
+        with self._lock:
+            lock = self._session_locks.get(session_id)
+            if lock is None:
+                lock = Lock()
+                self._session_locks[session_id] = lock
+            return lock
+
+    def _records(self, session_id: str) -> tuple[list[int], list[tuple[int, int]], list[int]]:
+        prefix = f"{session_id}~"
+        snapshots: list[int] = []
+        segments: list[tuple[int, int]] = []
+        deltas: list[int] = []
+        for name, _ in self.store.scan(CATEGORY, prefix):
+            match = _RECORD.fullmatch(name[len(prefix):])
+            if match is None:
+                continue
+            if match["snap"]:
+                snapshots.append(int(match["snap"]))
+            elif match["seq"]:
+                deltas.append(int(match["seq"]))
+            else:
+                segments.append((int(match["first"]), int(match["last"])))
+        return sorted(snapshots), sorted(segments), sorted(deltas)
+
+    def _floor(self, session_id: str) -> int:
+        if session_id in self._seeded:
+            return 0
+        # Journals written before the counter existed continue above their records.
+        snapshots, segments, deltas = self._records(session_id)
+        self._seeded.add(session_id)
+        return max([0, *snapshots, *(end for _, end in segments), *deltas])
+
+    def append(self, session_id: str, ops: list[dict[str, Any]]) -> int:
+        ops = [validate_op(op) for op in ops]
+        with self._session_lock(session_id):
+            first = self.store.save_sequenced(
+                CATEGORY, session_id, lambda seq: f"{session_id}~d{seq:012d}", ops, self._floor(session_id)
+            )
+            last = first + len(ops) - 1
+            if last // self.segment_size != (first - 1) // self.segment_size:
+                self._fold_deltas(session_id)
+            return last
+
+    def replace(self, session_id: str, doc: dict[str, Any]) -> int:
+        with self._session_lock(session_id):
+            seq = self.store.save_sequenced(
+                CATEGORY, session_id, lambda seq: f"{session_id}~snap-{seq:012d}", [{"data": _pack(doc)}],
+                self._floor(session_id),
+            )
+            self._drop_covered(session_id, seq)
+            return seq
+
+    def _fold_deltas(self, session_id: str) -> None:
+        snapshots, segments, deltas = self._records(session_id)
+        watermark = max([0, *snapshots, *(last for _, last in segments)])
+        entries = []
+        for seq in deltas:
+            if seq <= watermark:
+                continue
+            op = self.store.load_json(CATEGORY, f"{session_id}~d{seq:012d}", decrypt=False)
+            if op is None:
+                # Folded by another worker meanwhile.
+                break
+            entries.append((seq, op))
+        if not entries:
+            return
+        first, last = entries[0][0], entries[-1][0]
+        segment = {"keys": sorted({op["path"][0] for _, op in entries}), "data": _pack(entries)}
+        self.store.save_json(CATEGORY, f"{session_id}~seg-{first:012d}-{last:012d}", segment, encrypt=False)
+        for seq, _ in entries:
+            self.store.delete(CATEGORY, f"{session_id}~d{seq:012d}")
+
+    def _write_snapshot(self, session_id: str, seq: int, doc: dict[str, Any]) -> None:
+        # Snapshots never overwrite each other; each writer only deletes what
+        # its own snapshot covers, so concurrent compactions cannot lose data.
+        self.store.save_json(CATEGORY, f"{session_id}~snap-{seq:012d}", {"data": _pack(doc)}, encrypt=False)
+        self._drop_covered(session_id, seq)
+
+    def _drop_covered(self, session_id: str, seq: int) -> None:
+        snapshots, segments, deltas = self._records(session_id)
+        for snap in snapshots:
+            if snap < seq:
+                self.store.delete(CATEGORY, f"{session_id}~snap-{snap:012d}")
+        for first, last in segments:
+            if last <= seq:
+                self.store.delete(CATEGORY, f"{session_id}~seg-{first:012d}-{last:012d}")
+        for delta in deltas:
+            if delta <= seq:
+                self.store.delete(CATEGORY, f"{session_id}~d{delta:012d}")
+
+    def _load_base(self, session_id: str, snapshots: list[int]) -> tuple[int, dict[str, Any]] | None:
+        if snapshots:
+            snapshot = self.store.load_json(CATEGORY, f"{session_id}~snap-{snapshots[-1]:012d}", decrypt=False)
+            if snapshot is None:
+                raise LookupError("snapshot replaced while loading")
+            return snapshots[-1], _unpack(snapshot["data"])
+        # Sessions saved before the journal existed.
+        legacy = self.store.load_json(LEGACY_CATEGORY, session_id, decrypt=False)
+        return (0, legacy) if legacy is not None else None
+
+    def _rebuild(self, session_id: str, wanted: set[str] | None) -> tuple[dict[str, Any], int | None, int] | None:
+        # Returns (doc, seq a snapshot of doc may claim or None, segments replayed).
+        for _ in range(3):
+            snapshots, segments, deltas = self._records(session_id)
+            try:
+                base = self._load_base(session_id, snapshots)
+                break
+            except LookupError:
+                continue
+        else:
+            raise StorageError("context journal is being compacted; retry")
+        if base is None and not segments and not deltas:
+            return None
+        seq, doc = base if base is not None else (0, {})
+        if wanted is not None:
+            doc = {key: value for key, value in doc.items() if key in wanted}
+        replayed = 0
+        # Records can vanish mid-read when another worker folds them; such a
+        # read is still usable but must not be written back as a snapshot.
+        complete = True
+        for first, last in segments:
+            if last <= seq:
+                continue
+            segment = self.store.load_json(CATEGORY, f"{session_id}~seg-{first:012d}-{last:012d}", decrypt=False)
+            if segment is None:
+                complete = False
+                continue
+            if wanted is None or not wanted.isdisjoint(segment["keys"]):
+                replayed += 1
+                for op_seq, op in _unpack(segment["data"]):
+                    if op_seq > seq:
+                        _replay(doc, op, wanted)
+            seq = last
+        for delta in [delta for delta in deltas if delta > seq]:
+            op = self.store.load_json(CATEGORY, f"{session_id}~d{delta:012d}", decrypt=False)
+            if op is None:
+                complete = False
+                continue
+            _replay(doc, op, wanted)
+            seq = delta
+        return doc, seq if complete else None, replayed
+
+    def load(
+        self,
+        session_id: str,
+        fields: list[str] | None = None,
+        tail: int | None = None,
+    ) -> dict[str, Any] | None:
+        wanted = set(fields) if fields is not None else None
+        with self._session_lock(session_id):
+            rebuilt = self._rebuild(session_id, wanted)
+            if rebuilt is None:
+                return None
+            doc, seq, replayed = rebuilt
+            if wanted is None and seq is not None and replayed >= self.compact_segments:
+                self._write_snapshot(session_id, seq, doc)
+        if tail is not None:
+            doc = {key: value[-tail:] if isinstance(value, list) else value for key, value in doc.items()}
+        return doc
+
+    def compact(self, session_id: str) -> None:
+        with self._session_lock(session_id):
+            rebuilt = self._rebuild(session_id, None)
+            if rebuilt is not None and rebuilt[1]:
+                self._write_snapshot(session_id, rebuilt[1], rebuilt[0])
+
+
+def _replay(doc: dict[str, Any], op: dict[str, Any], wanted: set[str] | None) -> None:
+    if wanted is None or op["path"][0] in wanted:
+        apply_op(doc, op)
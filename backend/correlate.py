@@ -0,0 +1,110 @@
+from __future__ import annotations
+
+import json
+import re
+from dataclasses import dataclass
+from pathlib import Path
+from typing import Any, Sequence
+
+from .code_search import SEARCH_TIMEOUT_SECONDS, search_literals
+from .repo_cache import RepoCache
+
+_SOURCE = re.compile(r"\[([\w.-]+\.(?:go|rs|py|java|cc|cpp|c|h|hpp|ts|js)):(\d+)\]")
+_QUOTED_MESSAGE = re.compile(r'\["((?:[^"\\]|\\.)+)"\]')
+_BRACKET_PREFIX = re.compile(r"^(?:\s*\[[^\]]*\])+\s*")
+_VARIABLE = re.compile(
+    r"0x[0-9a-fA-F]+"
+    r"|\b[0-9a-fA-F]{8,}\b"
+    r"|\d+(?:[.:/-]\d+)*"
+    r"|\"[^\"]*\"|'[^']*'"
+    r"|\S+=\S*"
+    r"|\[[^\]]*\]|\{[^}]*\}"
+)
+MIN_TEMPLATE_CHARS = 6
+
+
+@dataclass(frozen=True)
+class LogTemplate:
+    literal: str | None
+    source_file: str | None
+    source_line: int | None
+
+
+def _message(line: str) -> str:
+    stripped = line.strip()
+    if stripped.startswith("{"):
+        try:
+            data = json.loads(stripped)
+        except ValueError:
+            data = None
+        if isinstance(data, dict):
+            for key in ("msg", "message", "MESSAGE"):
+                if isinstance(data.get(key), str):
+                    return data[key]
+    quoted = _QUOTED_MESSAGE.search(stripped)
+    if quoted:
+        return quoted.group(1).replace('\\"', '"')
+    return _BRACKET_PREFIX.sub("", stripped)
+
+
+def extract_template(line: str) -> LogTemplate:
+    source = _SOURCE.search(line)
+    message = _message(line)
+    # The longest constant run between variable parts is the fragment most
+    # likely to appear verbatim in the format string at the call site.
+    fragments = [fragment.strip(" \t:,;=()") for fragment in _VARIABLE.split(message)]
+    literal = max(fragments, key=len, default="")
+    return LogTemplate(
+        literal=literal if len(literal) >= MIN_TEMPLATE_CHARS else None,
+        source_file=source.group(1) if source else None,
+        source_line=int(source.group(2)) if source else None,
+    )
+
+
+def correlate_lines(
+    path: str | Path,
+    lines: list[str],
+    max_hits_per_line: int,
+    cache_root: Path | None = None,
+    exclude_globs: Sequence[str] | None = None,
+    timeout_seconds: float = SEARCH_TIMEOUT_SECONDS,
+    repos: RepoCache | None = None,
+    wait_seconds: float | None = 0,
+) -> list[dict[str, Any]]:
+    templates = [extract_template(line) for line in lines]
+    literals = sorted({template.literal for template in templates if template.literal})
+    found = (
+        search_literals(
+            path,
+            literals,
+            max_hits_per_line * 4,
+            cache_root=cache_root,
+            exclude_globs=exclude_globs,
+            timeout_seconds=timeout_seconds,
+            repos=repos,
+            wait_seconds=wait_seconds,
+        )
+        if literals
+        else {}
+    )
+
+    results: list[dict[str, Any]] = []
+    for idx, template in enumerate(templates):
+        hits = list(found.get(template.literal or "", []))
+        if template.source_file:
+            # Prefer hits in the file the log line itself names.
+            hits.sort(
+                key=lambda hit: (
+                    Path(str(hit["file"])).name != template.source_file,
+                    hit["line"] != template.source_line,
+                )
+            )
+        results.append(
+            {
+                "index": idx,
+                "template": template.literal,
+                "source": f"{template.source_file}:{template.source_line}" if template.source_file else None,
+                "hits": hits[:max_hits_per_line],
+            }
+        )
+    return results
@@ -0,0 +1,78 @@
+from __future__ import annotations
+
+import importlib.util
+from threading import Lock
+from typing import Any
+from urllib.parse import urlparse
+
+import httpx
+
+
+def _http2_available() -> bool:
+    return importlib.util.find_spec("h2") is not None
+
+
+def _origin(url: str) -> str:
+    parsed = urlparse(url)
+    return f"{parsed.scheme}://{parsed.netloc}".lower()
+
+
+def _bypass_proxy(url: str, no_proxy: list[str]) -> bool:
+    host = (urlparse(url).hostname or "").lower()
+    for entry in no_proxy:
+        entry = entry.strip().lower()
+        if not entry:
+            continue
+        if entry == "*" or host == entry.lstrip("."):
+            return True
+        if entry.startswith(".") and host.endswith(entry):
+            return True
+    return False
+
+
+def proxy_for(url: str, cluster_config: dict[str, Any], section: str = "loki") -> str | None:
+    network = cluster_config.get("network", {})
+    if network.get("mode") == "direct":
+        return None
+    proxy = cluster_config.get(section, {}).get("proxy") or network.get("proxy")
+    if not proxy or _bypass_proxy(url, network.get("no_proxy", [])):
+        return None
+    return proxy
+
+
+class HttpClientPool:
+    def __init__(
+        self,
+        max_connections: int = 10,
+        max_keepalive_connections: int = 5,
+        keepalive_expiry: float = 30.0,
+        http2: bool | None = None,
+    ) -> None:
+        self.limits = httpx.Limits(
+            max_connections=max_connections,
+            max_keepalive_connections=max_keepalive_connections,
+            keepalive_expiry=keepalive_expiry,
+        )
+        self.http2 = _http2_available() if http2 is None else http2
+        self._lock = Lock()
+        self._clients: dict[tuple[str, str | None], httpx.Client] = {}
+
+    def get(self, url: str, proxy: str | None = None) -> httpx.Client:
+        key = (_origin(url), proxy)
+        with self._lock:
+            client = self._clients.get(key)
+            if client is None or client.is_closed:
+                client = httpx.Client(
+                    proxy=proxy,
+                    limits=self.limits,
+                    http2=self.http2,
+                )
+                self._clients[key] = client
+            return client
+
+    def close(self) -> None:
+        with self._lock:
+            clients = list(self._clients.values())
+            self._clients.clear()
+        for client in clients:
+            client.close()
@@ -0,0 +1,25 @@
+from __future__ import annotations
+
+import secrets
+import time
+from datetime import datetime, timezone
+from threading import Lock
+
+_lock = Lock()
+_last_ns = 0
+
+
+def unique_suffix() -> str:
+    global _last_ns
+    with _lock:
+        # Bump by a microsecond on collisions so suffixes stay strictly
+        # increasing within the process; the random tail separates processes.
+        now = max(time.time_ns(), _last_ns + 1_000)
+        _last_ns = now
+    seconds, micros = divmod(now // 1_000, 1_000_000)
+    stamp = datetime.fromtimestamp(seconds, tz=timezone.utc).strftime("%Y%m%d%H%M%S")
+    return f"{stamp}{micros:06d}-{secrets.token_hex(3)}"
+
+
+def new_id(prefix: str) -> str:
+    return f"{prefix}-{unique_suffix()}"
@@ -0,0 +1,93 @@
+from __future__ import annotations
+
+import re
+from dataclasses import dataclass
+from typing import Iterable
+
+from .loki_adapter import LogLine
+
+WILDCARD = "<*>"
+
+# Applied in order, so the more specific shapes win over plain numbers.
+_MASKS = [
+    (re.compile(r"\b[0-9a-fA-F]{8}-[0-9a-fA-F]{4}-[0-9a-fA-F]{4}-[0-9a-fA-F]{4}-[0-9a-fA-F]{12}\b"), "<UUID>"),
+    (re.compile(r"\b(?:\d{1,3}\.){3}\d{1,3}(?::\d+)?\b"), "<IP>"),
+    (re.compile(r"\b0x[0-9a-fA-F]+\b"), "<HEX>"),
+    (re.compile(r"\b(?=[0-9a-fA-F]*\d)[0-9a-fA-F]{16,}\b"), "<HEX>"),
+    (re.compile(r"(?<![\w.])[-+]?\d+(?:\.\d+)?(?:[a-zA-Zµ]{1,3})?(?![\w.])"), "<NUM>"),
+]
+_HAS_DIGIT = re.compile(r"\d")
+
+
+def mask(line: str) -> str:
+    for pattern, token in _MASKS:
+        line = pattern.sub(token, line)
+    return line
+
+
+@dataclass
+class TemplateCluster:
+    tokens: list[str]
+    count: int
+    first: LogLine
+    last: LogLine
+    sample: LogLine
+
+    @property
+    def template(self) -> str:
+        return " ".join(self.tokens)
+
+
+# Drain-style: lines are grouped by token count and leading tokens, then join
+# the most similar cluster in their group (differing tokens become `<*>`).
+class TemplateMiner:
+
+    def __init__(self, depth: int = 2, similarity: float = 0.5) -> None:
+        self.depth = depth
+        self.similarity = similarity
+        self.clusters: list[TemplateCluster] = []
+        self._groups: dict[tuple[str, ...], list[TemplateCluster]] = {}
+
+    def _group_key(self, tokens: list[str]) -> tuple[str, ...]:
+        prefix = [WILDCARD if _HAS_DIGIT.search(token) else token for token in tokens[: self.depth]]
+        return (str(len(tokens)), *prefix)
+
+    @staticmethod
+    def _score(template: list[str], tokens: list[str]) -> tuple[float, int]:
+        same = wildcards = 0
+        for left, right in zip(template, tokens):
+            if left == WILDCARD:
+                wildcards += 1
+            elif left == right:
+                same += 1
+        return same / len(tokens), wildcards
+
+    def add(self, item: LogLine) -> TemplateCluster:
+        tokens = mask(item.line).split() or [""]
+        group = self._groups.setdefault(self._group_key(tokens), [])
+        best: TemplateCluster | None = None
+        best_score = (-1.0, -1)
+        for cluster in group:
+            score = self._score(cluster.tokens, tokens)
+            if score > best_score:
+                best, best_score = cluster, score
+        if best is None or best_score[0] < self.similarity:
+            cluster = TemplateCluster(tokens=tokens, count=1, first=item, last=item, sample=item)
+            group.append(cluster)
+            self.clusters.append(cluster)
+            return cluster
+
+        best.tokens = [left if left == right else WILDCARD for left, right in zip(best.tokens, tokens)]
+        best.count += 1
+        if item.nanos < best.first.nanos:
+            best.first = item
+        if item.nanos > best.last.nanos:
+            best.last = item
+        return best
+
+
+def mine_templates(lines: Iterable[LogLine], depth: int = 2, similarity: float = 0.5) -> list[TemplateCluster]:
+    miner = TemplateMiner(depth=depth, similarity=similarity)
+    for item in lines:
+        miner.add(item)
+    return miner.clusters
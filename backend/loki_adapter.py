@@ -1,32 +1,122 @@
 from __future__ import annotations
 
-from dataclasses import dataclass
+import heapq
+import re
+from dataclasses import dataclass, field
 from datetime import datetime, timezone, timedelta
-from typing import Any
+from typing import Any, Iterable, Iterator
 
 import httpx
 
+from .chunk_cache import ChunkCache
+
 
 @dataclass
 class LogLine:
     ts: str
     line: str
     labels: dict[str, str]
+    nanos: int = field(init=False, repr=False, compare=False)
+
+    def __post_init__(self) -> None:
+        # Parsed once so merges and cursors compare ints, not strings.
+        try:
+            self.nanos = int(self.ts)
+        except ValueError:
+            self.nanos = 0
+
+
+def merge_lines(sources: Iterable[Iterable[LogLine]], direction: str = "backward") -> Iterator[LogLine]:
+    """Lazily k-way merge inputs that are each already in `direction` order."""
+    return heapq.merge(*sources, key=_nanos, reverse=direction == "backward")
+
+
+def _nanos(line: LogLine) -> int:
+    return line.nanos
 
 
 def _escape_keyword(value: str) -> str:
     return value.replace("\\", "\\\\").replace('"', '\\"')
 
 
-def build_logql(labels: dict[str, str], keywords: list[str]) -> str:
-    selector = ",".join(f'{k}="{v}"' for k, v in labels.items())
+def _matcher(label: str, value: str | list[str]) -> str:
+    if isinstance(value, str):
+        return f'{label}="{value}"'
+    if len(value) == 1:
+        return f'{label}="{value[0]}"'
+    pattern = "|".join(re.escape(item) for item in value)
+    return f'{label}=~"{_escape_keyword(pattern)}"'
+
+
+_LABEL_NAME = re.compile(r"^[a-zA-Z_][a-zA-Z0-9_]*$")
+
+
+def _level_pattern(levels: list[str]) -> str:
+    return "(?i)(?:" + "|".join(re.escape(level) for level in levels) + ")"
+
+
+def build_logql(
+    labels: dict[str, str | list[str]],
+    keywords: list[str],
+    exclude: list[str] | None = None,
+    regex: list[str] | None = None,
+    levels: list[str] | None = None,
+    parser: str | None = None,
+    label_filters: dict[str, str] | None = None,
+    line_format: str | None = None,
+) -> str:
+    if parser not in {None, "json", "logfmt"}:
+        raise ValueError(f"unsupported parser: {parser}")
+    # Stages run left to right, so order them cheapest first: indexed stream
+    # labels, substring filters, regex filters, then parsing and what
+    # depends on parsed fields.
+    selector = ",".join(_matcher(k, v) for k, v in labels.items() if isinstance(v, str) or v)
     query = f"{{{selector}}}"
     for kw in keywords:
         if kw:
             query += f' |= "{_escape_keyword(kw)}"'
+    for kw in exclude or []:
+        if kw:
+            query += f' != "{_escape_keyword(kw)}"'
+    for pattern in regex or []:
+        if pattern:
+            query += f' |~ "{_escape_keyword(pattern)}"'
+    levels = [level for level in levels or [] if level]
+    if levels and parser is None:
+        # Unified TiDB/TiKV/PD text logs carry the level as `[WARN]`.
+        pattern = r"\[" + _level_pattern(levels) + r"\]"
+        query += f' |~ "{_escape_keyword(pattern)}"'
+    if parser is not None:
+        query += f" | {parser}"
+        if levels:
+            query += f' | level=~"{_escape_keyword(_level_pattern(levels))}"'
+    for name, value in (label_filters or {}).items():
+        if not _LABEL_NAME.match(name):
+            raise ValueError(f"invalid label name: {name}")
+        query += f' | {name}="{_escape_keyword(value)}"'
+    if line_format:
+        query += f' | line_format "{_escape_keyword(line_format)}"'
     return query
 
 
+def build_metric_logql(logql: str, step_seconds: int, by: list[str] | None = None) -> str:
+    # The range equals the step, so each bucket counts its own lines once.
+    grouping = f" by ({', '.join(by)})" if by else ""
+    return f"sum{grouping} (count_over_time({logql} [{step_seconds}s]))"
+
+
+_STEPS = [1, 5, 10, 15, 30, 60, 120, 300, 600, 900, 1800, 3600, 7200, 10800, 21600, 43200, 86400]
+
+
+def metric_step(start: datetime, end: datetime, buckets: int = 120) -> int:
+    """Smallest round step that covers [start, end] in at most `buckets` points."""
+    wanted = max(1, -(-int((end - start).total_seconds()) // buckets))
+    for step in _STEPS:
+        if step >= wanted:
+            return step
+    return -(-wanted // 86400) * 86400
+
+
 def _to_nanos(ts: datetime) -> int:
     if ts.tzinfo is None:
         ts = ts.replace(tzinfo=timezone.utc)
@@ -42,6 +132,8 @@ class LokiAdapter:
         headers: dict[str, str] | None = None,
         timeout_seconds: int = 10,
         direction: str = "backward",
+        client: httpx.Client | None = None,
+        cache: ChunkCache | None = None,
     ) -> None:
         self.base_url = base_url.rstrip("/")
         self.tenant_header = tenant_header
@@ -49,6 +141,8 @@ class LokiAdapter:
         self.headers = headers or {}
         self.timeout_seconds = timeout_seconds
         self.direction = direction
+        self.client = client
+        self.cache = cache
 
     def _headers(self) -> dict[str, str]:
         headers = dict(self.headers)
@@ -56,6 +150,15 @@ class LokiAdapter:
             headers[self.tenant_header] = self.tenant
         return headers
 
+    def _get(self, path: str, params: dict[str, Any]) -> dict[str, Any]:
+        url = f"{self.base_url}{path}"
+        if self.client is not None:
+            resp = self.client.get(url, params=params, headers=self._headers(), timeout=self.timeout_seconds)
+        else:
+            resp = httpx.get(url, params=params, headers=self._headers(), timeout=self.timeout_seconds)
+        resp.raise_for_status()
+        return resp.json()
+
     def query_range(
         self,
         logql: str,
@@ -70,19 +173,86 @@ class LokiAdapter:
             "limit": limit,
             "direction": self.direction,
         }
-        url = f"{self.base_url}/loki/api/v1/query_range"
-        resp = httpx.get(url, params=params, headers=self._headers(), timeout=self.timeout_seconds)
-        resp.raise_for_status()
-        payload = resp.json()
+        cache_key = None
+        if self.cache is not None and self.cache.is_closed(params["end"]):
+            cache_key = self.cache.key(
+                self.base_url, self.tenant, logql, params["start"], params["end"], self.direction
+            )
+            cached = self.cache.get(cache_key, limit, self.direction)
+            if cached is not None:
+                return [LogLine(ts=ts, line=line, labels=labels) for ts, line, labels in cached]
+
+        payload = self._get("/loki/api/v1/query_range", params)
         result = payload.get("data", {}).get("result", [])
 
-        lines: list[LogLine] = []
+        streams: list[list[LogLine]] = []
         for stream in result:
             labels = stream.get("stream", {})
-            for ts, line in stream.get("values", []):
-                lines.append(LogLine(ts=ts, line=line, labels=labels))
+            values = [LogLine(ts=ts, line=line, labels=labels) for ts, line in stream.get("values", [])]
+            # Loki already orders each stream by direction, so this is a linear pass.
+            values.sort(key=_nanos, reverse=self.direction == "backward")
+            streams.append(values)
+        lines = list(merge_lines(streams, self.direction))
+        if cache_key is not None:
+            self.cache.put(cache_key, limit, [[item.ts, item.line, item.labels] for item in lines])
         return lines
 
+    def query_series(
+        self,
+        logql: str,
+        start: datetime,
+        end: datetime,
+        step_seconds: int,
+    ) -> list[dict[str, Any]]:
+        params = {
+            "query": logql,
+            "start": _to_nanos(start),
+            "end": _to_nanos(end),
+            "step": f"{step_seconds}s",
+        }
+        payload = self._get("/loki/api/v1/query_range", params)
+        series: list[dict[str, Any]] = []
+        for item in payload.get("data", {}).get("result", []):
+            points = [(int(float(ts)), int(float(value))) for ts, value in item.get("values", [])]
+            series.append({"labels": item.get("metric", {}), "points": points})
+        return series
+
+    def count_lines(self, logql: str, start: datetime, end: datetime) -> int:
+        seconds = max(1, int((end - start).total_seconds()))
+        params = {
+            "query": f"sum(count_over_time({logql}[{seconds}s]))",
+            "time": _to_nanos(end),
+        }
+        payload = self._get("/loki/api/v1/query", params)
+        total = 0
+        for sample in payload.get("data", {}).get("result", []):
+            total += int(float(sample.get("value", [0, "0"])[1]))
+        return total
+
+    def slice_windows(
+        self,
+        start: datetime,
+        end: datetime,
+        window_seconds: int = 300,
+    ) -> list[tuple[datetime, datetime]]:
+        # Cut on multiples of window_seconds since the epoch so overlapping
+        # queries produce identical inner windows that the chunk cache can reuse.
+        windows: list[tuple[datetime, datetime]] = []
+        if end <= start:
+            return windows
+        step = timedelta(seconds=window_seconds)
+        epoch = datetime(1970, 1, 1, tzinfo=timezone.utc if start.tzinfo else None)
+        boundary = epoch + ((start - epoch) // step + 1) * step
+        edges = [start]
+        while boundary < end:
+            edges.append(boundary)
+            boundary += step
+        edges.append(end)
+        windows = list(zip(edges, edges[1:]))
+        if self.direction == "backward":
+            windows.reverse()
+        return windows
+
     def query_with_slicing(
         self,
         logql: str,
@@ -90,20 +260,65 @@ class LokiAdapter:
         end: datetime,
         limit: int,
         window_seconds: int = 300,
+        adaptive: bool = False,
+        probe: bool = False,
+        min_window_seconds: int = 10,
+        max_window_seconds: int = 6 * 3600,
     ) -> list[LogLine]:
+        if adaptive:
+            return self._query_adaptive(
+                logql, start, end, limit, window_seconds, probe, min_window_seconds, max_window_seconds
+            )
+
         results: list[LogLine] = []
-        if self.direction == "backward":
-            cursor = end
-            while cursor > start and len(results) < limit:
-                window_start = max(start, cursor - timedelta(seconds=window_seconds))
-                batch = self.query_range(logql, window_start, cursor, limit - len(results))
-                results.extend(batch)
+        for window_start, window_end in self.slice_windows(start, end, window_seconds):
+            if len(results) >= limit:
+                break
+            batch = self.query_range(logql, window_start, window_end, limit - len(results))
+            results.extend(batch)
+        return results[:limit]
+
+    def _query_adaptive(
+        self,
+        logql: str,
+        start: datetime,
+        end: datetime,
+        limit: int,
+        window_seconds: int,
+        probe: bool,
+        min_window_seconds: int,
+        max_window_seconds: int,
+    ) -> list[LogLine]:
+        window = float(window_seconds)
+        if probe:
+            total = self.count_lines(logql, start, end)
+            if total == 0:
+                return []
+            # Seed with the span expected to hold `limit` lines at the average density.
+            window = (end - start).total_seconds() * min(1.0, limit / total)
+
+        results: list[LogLine] = []
+        backward = self.direction == "backward"
+        cursor = end if backward else start
+        while len(results) < limit and (start < cursor if backward else cursor < end):
+            span = timedelta(seconds=min(max(window, min_window_seconds), max_window_seconds))
+            if backward:
+                window_start, window_end = max(start, cursor - span), cursor
                 cursor = window_start
-        else:
-            cursor = start
-            while cursor < end and len(results) < limit:
-                window_end = min(end, cursor + timedelta(seconds=window_seconds))
-                batch = self.query_range(logql, cursor, window_end, limit - len(results))
-                results.extend(batch)
+            else:
+                window_start, window_end = cursor, min(end, cursor + span)
                 cursor = window_end
+
+            remaining = limit - len(results)
+            batch = self.query_range(logql, window_start, window_end, remaining)
+            results.extend(batch)
+
+            # Empty slices double the window; otherwise project the span the
+            # observed density needs for the remaining lines, which shrinks
+            # the window for dense streams and grows it for sparse ones.
+            elapsed = (window_end - window_start).total_seconds()
+            if not batch:
+                window = elapsed * 2
+            elif len(batch) < remaining:
+                window = elapsed * (remaining - len(batch)) / len(batch)
         return results[:limit]
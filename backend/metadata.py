@@ -1,20 +1,48 @@
 from __future__ import annotations
 
+import copy
+import time
+from collections import OrderedDict
+from concurrent.futures import Future
+from dataclasses import dataclass
+from threading import Lock, Thread
 from typing import Any
 
 import httpx
 
+from .http_client import HttpClientPool, proxy_for
+from .secret_cache import SecretCache
 from .storage import LocalStore
 
 
+@dataclass
+class CacheEntry:
+    value: dict[str, Any]
+    fetched_at: float
+
+
 class MetadataResolver:
-    def __init__(self, store: LocalStore | None = None) -> None:
+    def __init__(
+        self,
+        store: LocalStore | None = None,
+        clients: HttpClientPool | None = None,
+        max_entries: int = 128,
+        stale_ratio: float = 1.0,
+        secrets: SecretCache | None = None,
+    ) -> None:
         self.store = store
+        self.secrets = secrets or (SecretCache(store) if store is not None else None)
+        self.clients = clients
+        self.max_entries = max_entries
+        self.stale_ratio = stale_ratio
+        self._lock = Lock()
+        self._cache: OrderedDict[tuple[str, str | None], CacheEntry] = OrderedDict()
+        self._inflight: dict[tuple[str, str | None], Future[dict[str, Any]]] = {}
 
     def _auth_headers(self, auth_ref: str | None) -> dict[str, str]:
-        if not auth_ref or not self.store:
+        if not auth_ref or not self.secrets:
             return {}
-        payload = self.store.load_json("auth", auth_ref, decrypt=True)
+        payload = self.secrets.get(auth_ref)
         if not payload:
             return {}
         header = payload.get("header", "Authorization")
@@ -24,6 +52,65 @@ class MetadataResolver:
             return {}
         return {header: f"{scheme} {token}"}
 
+    def _fetch_http(self, cluster_config: dict[str, Any]) -> dict[str, Any]:
+        metadata = cluster_config.get("metadata", {})
+        endpoint = metadata["endpoint"]
+        headers = self._auth_headers(metadata.get("auth_ref"))
+        timeout = metadata.get("timeout_ms", 2000) / 1000
+        if self.clients is not None:
+            client = self.clients.get(endpoint, proxy_for(endpoint, cluster_config, "metadata"))
+            resp = client.get(endpoint, headers=headers, timeout=timeout)
+        else:
+            resp = httpx.get(endpoint, headers=headers, timeout=timeout)
+        resp.raise_for_status()
+        return resp.json()
+
+    def _fetch_once(self, key: tuple[str, str | None], cluster_config: dict[str, Any]) -> dict[str, Any]:
+        with self._lock:
+            future = self._inflight.get(key)
+            owner = future is None
+            if owner:
+                future = Future()
+                self._inflight[key] = future
+        if not owner:
+            return future.result()
+
+        try:
+            value = self._fetch_http(cluster_config)
+        except BaseException as exc:
+            with self._lock:
+                self._inflight.pop(key, None)
+            future.set_exception(exc)
+            raise
+
+        with self._lock:
+            self._cache[key] = CacheEntry(value=value, fetched_at=time.monotonic())
+            self._cache.move_to_end(key)
+            while len(self._cache) > self.max_entries:
+                self._cache.popitem(last=False)
+            self._inflight.pop(key, None)
+        future.set_result(value)
+        return value
+
+    def _revalidate(self, key: tuple[str, str | None], cluster_config: dict[str, Any]) -> None:
+        with self._lock:
+            if key in self._inflight:
+                return
+
+        def refresh() -> None:
+            try:
+                self._fetch_once(key, cluster_config)
+            except Exception:
+                # The stale entry keeps serving until a refresh succeeds or it
+                # ages out of the stale window.
+                pass
+
+        Thread(target=refresh, name="metadata-revalidate", daemon=True).start()
+
+    def invalidate(self) -> None:
+        with self._lock:
+            self._cache.clear()
+
     def resolve(self, cluster_config: dict[str, Any]) -> dict[str, Any]:
         metadata = cluster_config.get("metadata", {})
         provider = metadata.get("provider", "static")
@@ -35,9 +122,22 @@ class MetadataResolver:
             endpoint = metadata.get("endpoint")
             if not endpoint:
                 raise ValueError("metadata.endpoint is required for http provider")
-            headers = self._auth_headers(metadata.get("auth_ref"))
-            resp = httpx.get(endpoint, headers=headers, timeout=metadata.get("timeout_ms", 2000) / 1000)
-            resp.raise_for_status()
-            return resp.json()
+            ttl = metadata.get("cache_ttl_s", 0)
+            if ttl <= 0:
+                return self._fetch_http(cluster_config)
+
+            key = (endpoint, metadata.get("auth_ref"))
+            with self._lock:
+                entry = self._cache.get(key)
+                if entry is not None:
+                    self._cache.move_to_end(key)
+            if entry is not None:
+                age = time.monotonic() - entry.fetched_at
+                if age < ttl:
+                    return copy.deepcopy(entry.value)
+                if age < ttl * (1 + self.stale_ratio):
+                    self._revalidate(key, cluster_config)
+                    return copy.deepcopy(entry.value)
+            return copy.deepcopy(self._fetch_once(key, cluster_config))
 
         raise ValueError(f"unsupported metadata provider: {provider}")
@@ -1,7 +1,7 @@
 from __future__ import annotations
 
 from datetime import datetime
-from typing import Literal
+from typing import Any, Literal
 
 from pydantic import BaseModel, Field
 
@@ -11,14 +11,28 @@ class TimeRange(BaseModel):
     end: datetime
 
 
-class QueryRequest(BaseModel):
+class LogSelection(BaseModel):
     cluster_id: str
     cluster_config_path: str | None = None
     components: list[str] = Field(default_factory=list)
+    pods: list[str] = Field(default_factory=list)
     keywords: list[str] = Field(default_factory=list)
+    exclude_keywords: list[str] = Field(default_factory=list)
+    regex: list[str] = Field(default_factory=list)
+    levels: list[str] = Field(default_factory=list)
+    parser: Literal["json", "logfmt"] | None = None
+    label_filters: dict[str, str] = Field(default_factory=dict)
     time_range: TimeRange
+
+
+class QueryRequest(LogSelection):
+    line_format: str | None = None
     max_lines: int = Field(default=100, ge=1, le=100)
     window_seconds: int = Field(default=300, ge=10, le=3600)
+    adaptive_windows: bool = False
+    adaptive_probe: bool = False
+    dedup: bool = False
+    cursor: str | None = None
 
 
 class LogLineModel(BaseModel):
@@ -27,9 +41,37 @@ class LogLineModel(BaseModel):
     labels: dict[str, str]
 
 
+class LogTemplateModel(BaseModel):
+    template: str
+    count: int
+    first_ts: str
+    last_ts: str
+    sample: LogLineModel
+
+
 class QueryResponse(BaseModel):
     lines: list[LogLineModel]
     truncated: bool
+    templates: list[LogTemplateModel] = Field(default_factory=list)
+    next_cursor: str | None = None
+
+
+class AggregateRequest(LogSelection):
+    step_seconds: int | None = Field(default=None, ge=1, le=86400)
+    group_by: list[Literal["component", "pod", "namespace", "instance", "container"]] = Field(
+        default_factory=lambda: ["component"]
+    )
+
+
+class AggregateSeries(BaseModel):
+    labels: dict[str, str]
+    points: list[tuple[int, int]]
+    total: int
+
+
+class AggregateResponse(BaseModel):
+    step_seconds: int
+    series: list[AggregateSeries]
 
 
 class ExportRequest(BaseModel):
@@ -40,6 +82,17 @@ class ExportRequest(BaseModel):
 class ExportResponse(BaseModel):
     path: str
 
+
+class ContextOp(BaseModel):
+    op: Literal["set", "append", "extend", "remove"]
+    path: list[str | int] = Field(min_length=1)
+    value: Any = None
+
+
+class ContextPatchRequest(BaseModel):
+    ops: list[ContextOp] = Field(min_length=1)
+
+
 class SkillCreateRequest(BaseModel):
     name: str
     triggers: list[str] = Field(default_factory=list)
@@ -52,6 +105,11 @@ class SkillExtractRequest(BaseModel):
     analysis_notes: str
 
 
+class SkillMatchRequest(BaseModel):
+    keywords: list[str] = Field(default_factory=list)
+    limit: int = Field(default=10, ge=1, le=100)
+
+
 class SkillModel(BaseModel):
     id: str
     name: str
@@ -79,3 +137,30 @@ class CodeSearchHit(BaseModel):
 
 class CodeSearchResponse(BaseModel):
     hits: list[CodeSearchHit]
+
+
+class CodeIndexRequest(BaseModel):
+    path: str
+
+
+class CodeIndexResponse(BaseModel):
+    files: int
+    indexed: int
+    removed: int
+
+
+class CorrelateRequest(BaseModel):
+    path: str
+    lines: list[LogLineModel]
+    max_hits_per_line: int = Field(default=5, ge=1, le=50)
+
+
+class CorrelatedLine(BaseModel):
+    index: int
+    template: str | None
+    source: str | None
+    hits: list[CodeSearchHit]
+
+
+class CorrelateResponse(BaseModel):
+    results: list[CorrelatedLine]
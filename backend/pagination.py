@@ -0,0 +1,95 @@
+from __future__ import annotations
+
+import base64
+import hashlib
+import json
+from dataclasses import dataclass, field
+from datetime import datetime, timedelta, timezone
+
+from .loki_adapter import LogLine
+
+CURSOR_VERSION = 1
+
+
+def _digest(value: str) -> str:
+    return hashlib.sha1(value.encode("utf-8")).hexdigest()[:12]
+
+
+def stream_key(labels: dict[str, str]) -> str:
+    return _digest(json.dumps(labels, sort_keys=True, separators=(",", ":")))
+
+
+def query_fingerprint(queries: list[str]) -> str:
+    return _digest("\n".join(queries))
+
+
+def _from_nanos(nanos: int, like: datetime) -> datetime:
+    epoch = datetime(1970, 1, 1, tzinfo=timezone.utc if like.tzinfo else None)
+    moment = epoch + timedelta(microseconds=nanos // 1000)
+    return moment.astimezone(like.tzinfo) if like.tzinfo else moment
+
+
+@dataclass
+class PageCursor:
+    # `seen` holds the lines already returned at the boundary timestamp, per stream.
+    ts: int
+    fingerprint: str
+    seen: dict[str, list[str]] = field(default_factory=dict)
+
+    def encode(self) -> str:
+        payload = {
+            "v": CURSOR_VERSION,
+            "ts": str(self.ts),
+            "q": self.fingerprint,
+            "s": self.seen,
+        }
+        raw = json.dumps(payload, separators=(",", ":")).encode("utf-8")
+        return base64.urlsafe_b64encode(raw).decode("ascii").rstrip("=")
+
+    @classmethod
+    def decode(cls, token: str) -> "PageCursor":
+        try:
+            raw = base64.urlsafe_b64decode(token + "=" * (-len(token) % 4))
+            payload = json.loads(raw)
+            if payload.get("v") != CURSOR_VERSION:
+                raise ValueError("unsupported cursor version")
+            return cls(
+                ts=int(payload["ts"]),
+                fingerprint=str(payload["q"]),
+                seen={str(key): [str(item) for item in value] for key, value in payload.get("s", {}).items()},
+            )
+        except (ValueError, KeyError, TypeError, AttributeError) as exc:
+            raise ValueError("invalid cursor") from exc
+
+    @property
+    def seen_count(self) -> int:
+        return sum(len(lines) for lines in self.seen.values())
+
+    def narrow(self, start: datetime, end: datetime, direction: str) -> tuple[datetime, datetime]:
+        # Keep the boundary timestamp inside the range: other lines may share
+        # it, and `admits` drops the ones already returned.
+        if direction == "backward":
+            return start, min(end, _from_nanos(self.ts, end) + timedelta(microseconds=1))
+        return max(start, _from_nanos(self.ts, start)), end
+
+    def admits(self, line: LogLine, direction: str) -> bool:
+        ts = line.nanos
+        if ts == self.ts:
+            return _digest(line.line) not in self.seen.get(stream_key(line.labels), ())
+        return ts < self.ts if direction == "backward" else ts > self.ts
+
+
+def next_cursor(
+    page: list[LogLine],
+    fingerprint: str,
+    previous: PageCursor | None = None,
+) -> PageCursor:
+    last = page[-1].nanos
+    seen: dict[str, list[str]] = {}
+    if previous is not None and previous.ts == last:
+        # The whole page sat on one timestamp; keep what earlier pages saw.
+        seen = {key: list(lines) for key, lines in previous.seen.items()}
+    for item in page:
+        if item.nanos == last:
+            seen.setdefault(stream_key(item.labels), []).append(_digest(item.line))
+    return PageCursor(ts=last, fingerprint=fingerprint, seen=seen)
@@ -0,0 +1,107 @@
+from __future__ import annotations
+
+from concurrent.futures import Future, ThreadPoolExecutor
+from datetime import datetime
+from itertools import islice
+from typing import Iterator
+
+from .loki_adapter import LogLine, LokiAdapter, merge_lines
+
+
+class QueryEngine:
+    def __init__(
+        self,
+        adapter: LokiAdapter,
+        max_workers: int = 4,
+        adaptive: bool = False,
+        probe: bool = False,
+    ) -> None:
+        self.adapter = adapter
+        self.max_workers = max(1, max_workers)
+        self.adaptive = adaptive
+        # Seeds adaptive slicing with a count_over_time request per query.
+        self.probe = probe
+
+    def _iter_adaptive(
+        self,
+        queries: list[str],
+        start: datetime,
+        end: datetime,
+        limit: int,
+        window_seconds: int,
+    ) -> Iterator[list[LogLine]]:
+        # Adaptive slicing is sequential per query, so only the components fan
+        # out; the merged result is emitted as a single batch.
+        with ThreadPoolExecutor(max_workers=self.max_workers, thread_name_prefix="loki-query") as pool:
+            futures = [
+                pool.submit(
+                    self.adapter.query_with_slicing,
+                    logql,
+                    start,
+                    end,
+                    limit,
+                    window_seconds,
+                    adaptive=True,
+                    probe=self.probe,
+                )
+                for logql in queries
+            ]
+            results = [future.result() for future in futures]
+        batch = list(islice(merge_lines(results, self.adapter.direction), limit))
+        if batch:
+            yield batch
+
+    def iter_windows(
+        self,
+        queries: list[str],
+        start: datetime,
+        end: datetime,
+        limit: int,
+        window_seconds: int = 300,
+    ) -> Iterator[list[LogLine]]:
+        if self.adaptive and queries and limit > 0 and start < end:
+            yield from self._iter_adaptive(queries, start, end, limit, window_seconds)
+            return
+
+        windows = self.adapter.slice_windows(start, end, window_seconds)
+        if not queries or not windows or limit <= 0:
+            return
+
+        # Window-major submission: the pool drains the windows closest to the
+        # query direction's origin first, and windows never overlap, so each
+        # window's merged batch can be emitted as soon as it completes.
+        pool = ThreadPoolExecutor(max_workers=self.max_workers, thread_name_prefix="loki-query")
+        try:
+            pending: list[list[Future[list[LogLine]]]] = [
+                [
+                    pool.submit(self.adapter.query_range, logql, window_start, window_end, limit)
+                    for logql in queries
+                ]
+                for window_start, window_end in windows
+            ]
+            remaining = limit
+            for window_futures in pending:
+                # Each result is time-ordered, so a lazy k-way merge only
+                # touches the lines that make it under the cap.
+                results = [future.result() for future in window_futures]
+                batch = list(islice(merge_lines(results, self.adapter.direction), remaining))
+                remaining -= len(batch)
+                if batch:
+                    yield batch
+                if remaining <= 0:
+                    break
+        finally:
+            pool.shutdown(wait=True, cancel_futures=True)
+
+    def query(
+        self,
+        queries: list[str],
+        start: datetime,
+        end: datetime,
+        limit: int,
+        window_seconds: int = 300,
+    ) -> list[LogLine]:
+        results: list[LogLine] = []
+        for batch in self.iter_windows(queries, start, end, limit, window_seconds):
+            results.extend(batch)
+        return results
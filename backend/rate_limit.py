@@ -1,5 +1,9 @@
+import math
+import sqlite3
+import threading
 import time
 from dataclasses import dataclass
+from pathlib import Path
 from threading import Lock
 
 
@@ -7,30 +11,154 @@ from threading import Lock
 class BucketState:
     tokens: float
     last: float
+    rate_per_sec: float = 0.0
+    burst: int = 1
 
 
+def _refill(state: BucketState, now: float) -> None:
+    elapsed = max(now - state.last, 0.0)
+    state.tokens = min(state.burst, state.tokens + elapsed * state.rate_per_sec)
+    state.last = max(now, state.last)
+
+
+def _take(state: BucketState, max_wait: float) -> tuple[bool, float]:
+    # Debt of up to `max_wait` seconds queues waiters in arrival order.
+    if state.tokens >= 1:
+        state.tokens -= 1
+        return True, 0.0
+    if state.rate_per_sec <= 0:
+        return False, 1.0
+    wait = (1 - state.tokens) / state.rate_per_sec
+    if wait <= max_wait:
+        state.tokens -= 1
+        return True, wait
+    return False, wait
+
+
+def _is_full(state: BucketState, now: float) -> bool:
+    return state.rate_per_sec > 0 and state.tokens + (now - state.last) * state.rate_per_sec >= state.burst
+
+
+# Full buckets are dropped every `sweep_seconds`; a missing bucket starts full.
 class TokenBucketLimiter:
-    def __init__(self, rate_per_sec: float, burst: int) -> None:
+    def __init__(self, rate_per_sec: float, burst: int, sweep_seconds: float = 60.0) -> None:
         self.rate_per_sec = rate_per_sec
         self.burst = burst
+        self.sweep_seconds = sweep_seconds
         self._lock = Lock()
         self._buckets: dict[str, BucketState] = {}
+        self._last_sweep = self._now()
 
-    def allow(self, key: str) -> tuple[bool, float]:
-        now = time.monotonic()
+    def _now(self) -> float:
+        return time.monotonic()
+
+    def allow(self, key: str, rate_per_sec: float | None = None, burst: int | None = None) -> tuple[bool, float]:
+        return self._acquire(key, 0.0, rate_per_sec, burst)
+
+    def reserve(
+        self,
+        key: str,
+        max_wait: float | None = None,
+        rate_per_sec: float | None = None,
+        burst: int | None = None,
+    ) -> float | None:
+        # Seconds to sleep before using the token, or None past `max_wait`.
+        allowed, wait = self._acquire(key, math.inf if max_wait is None else max_wait, rate_per_sec, burst)
+        return wait if allowed else None
+
+    def _acquire(
+        self, key: str, max_wait: float, rate_per_sec: float | None, burst: int | None
+    ) -> tuple[bool, float]:
+        rate = self.rate_per_sec if rate_per_sec is None else rate_per_sec
+        size = max(int(self.burst if burst is None else burst), 1)
+        return self._take(key, self._now(), rate, size, max_wait)
+
+    def size(self) -> int:
+        # Buckets currently tracked; the sweep keeps this bounded.
+        with self._lock:
+            return len(self._buckets)
+
+    def refund(self, key: str) -> None:
+        # Hands back a reserved token that was never used.
         with self._lock:
             state = self._buckets.get(key)
+            if state is not None:
+                state.tokens = min(state.burst, state.tokens + 1)
+
+    def _take(self, key: str, now: float, rate: float, burst: int, max_wait: float) -> tuple[bool, float]:
+        with self._lock:
+            if now - self._last_sweep >= self.sweep_seconds:
+                self._last_sweep = now
+                for name in [name for name, state in self._buckets.items() if _is_full(state, now)]:
+                    del self._buckets[name]
+            state = self._buckets.get(key)
             if state is None:
-                state = BucketState(tokens=float(self.burst), last=now)
+                state = BucketState(tokens=float(burst), last=now)
                 self._buckets[key] = state
+            state.rate_per_sec, state.burst = rate, burst
+            _refill(state, now)
+            return _take(state, max_wait)
+
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS buckets (
+    key TEXT PRIMARY KEY,
+    tokens REAL NOT NULL,
+    last REAL NOT NULL,
+    rate REAL NOT NULL,
+    burst INTEGER NOT NULL
+) WITHOUT ROWID;
+"""
+
+
+# Buckets shared by every worker process; each take is one `BEGIN IMMEDIATE`
+# transaction on wall-clock time, the only clock processes share.
+class SqliteTokenBucketLimiter(TokenBucketLimiter):
+    def __init__(self, path: Path, rate_per_sec: float, burst: int, sweep_seconds: float = 60.0) -> None:
+        super().__init__(rate_per_sec, burst, sweep_seconds)
+        self.path = path
+        self._local = threading.local()
+        path.parent.mkdir(parents=True, exist_ok=True)
+        self._conn().executescript(_SCHEMA)
+
+    def _conn(self) -> sqlite3.Connection:
+        conn = getattr(self._local, "conn", None)
+        if conn is None:
+            conn = sqlite3.connect(self.path, timeout=30, isolation_level=None)
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute("PRAGMA synchronous=NORMAL")
+            self._local.conn = conn
+        return conn
+
+    def _now(self) -> float:
+        return time.time()
 
-            elapsed = now - state.last
-            state.tokens = min(self.burst, state.tokens + elapsed * self.rate_per_sec)
-            state.last = now
+    def size(self) -> int:
+        return self._conn().execute("SELECT COUNT(*) FROM buckets").fetchone()[0]
 
-            if state.tokens >= 1:
-                state.tokens -= 1
-                return True, 0.0
+    def refund(self, key: str) -> None:
+        self._conn().execute("UPDATE buckets SET tokens = MIN(burst, tokens + 1) WHERE key = ?", (key,))
 
-            retry_after = (1 - state.tokens) / self.rate_per_sec if self.rate_per_sec > 0 else 1.0
-            return False, max(retry_after, 0.0)
+    def _take(self, key: str, now: float, rate: float, burst: int, max_wait: float) -> tuple[bool, float]:
+        conn = self._conn()
+        conn.execute("BEGIN IMMEDIATE")
+        try:
+            if now - self._last_sweep >= self.sweep_seconds:
+                self._last_sweep = now
+                conn.execute("DELETE FROM buckets WHERE rate > 0 AND tokens + (? - last) * rate >= burst", (now,))
+            row = conn.execute("SELECT tokens, last FROM buckets WHERE key = ?", (key,)).fetchone()
+            state = BucketState(tokens=float(burst), last=now) if row is None else BucketState(row[0], row[1])
+            state.rate_per_sec, state.burst = rate, burst
+            _refill(state, now)
+            result = _take(state, max_wait)
+            conn.execute(
+                "INSERT INTO buckets (key, tokens, last, rate, burst) VALUES (?, ?, ?, ?, ?) "
+                "ON CONFLICT (key) DO UPDATE SET tokens = excluded.tokens, last = excluded.last, "
+                "rate = excluded.rate, burst = excluded.burst",
+                (key, state.tokens, state.last, rate, burst),
+            )
+            conn.execute("COMMIT")
+        except BaseException:
+            conn.execute("ROLLBACK")
+            raise
+        return result
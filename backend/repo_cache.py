@@ -0,0 +1,348 @@
+from __future__ import annotations
+
+import hashlib
+import json
+import os
+import re
+import shutil
+import subprocess
+import time
+from collections import OrderedDict
+from concurrent.futures import Future, ThreadPoolExecutor
+from concurrent.futures import TimeoutError as FutureTimeout
+from dataclasses import dataclass
+from pathlib import Path
+from threading import Lock
+from typing import Any, Callable
+
+GIT_TIMEOUT_SECONDS = 15 * 60
+
+
+@dataclass(frozen=True)
+class GithubRepoRef:
+    owner: str
+    repo: str
+    branch: str | None
+    subpath: str | None
+
+
+@dataclass
+class RepoEntry:
+    head: str | None = None
+    fetched_at: float = 0.0
+    size: int = 0
+    error: str | None = None
+    checkout: Path | None = None
+
+
+class RepoWarming(RuntimeError):
+    def __init__(self, status: dict[str, Any]) -> None:
+        super().__init__(f"repository {status['repo']} is still being fetched")
+        self.status = status
+
+
+def _git_available() -> bool:
+    return shutil.which("git") is not None
+
+
+def _github_url(ref: GithubRepoRef) -> str:
+    return f"https://github.com/{ref.owner}/{ref.repo}.git"
+
+
+def _safe_name(value: str) -> str:
+    safe = re.sub(r"[^a-zA-Z0-9_.-]", "-", value)
+    if safe != value or safe.startswith("."):
+        # Keep `feature/x` and `feature-x` apart.
+        safe = f"{safe.lstrip('.')}-{hashlib.sha1(value.encode('utf-8')).hexdigest()[:8]}"
+    return safe
+
+
+def _dir_size(path: Path) -> int:
+    total = 0
+    for dirpath, _, filenames in os.walk(path):
+        for filename in filenames:
+            try:
+                total += os.lstat(os.path.join(dirpath, filename)).st_size
+            except OSError:
+                continue
+    return total
+
+
+def _read_json(path: Path) -> dict[str, Any] | None:
+    try:
+        return json.loads(path.read_text(encoding="utf-8"))
+    except (OSError, ValueError):
+        return None
+
+
+def _write_json(path: Path, data: dict[str, Any]) -> None:
+    tmp = path.with_name(f".{path.name}.tmp")
+    tmp.write_text(json.dumps(data), encoding="utf-8")
+    os.replace(tmp, path)
+
+
+def _git(*args: str | Path) -> str:
+    try:
+        result = subprocess.run(
+            ["git", *map(str, args)],
+            capture_output=True,
+            text=True,
+            check=False,
+            timeout=GIT_TIMEOUT_SECONDS,
+        )
+    except subprocess.TimeoutExpired as exc:
+        raise RuntimeError("git command timed out") from exc
+    if result.returncode != 0:
+        raise RuntimeError(result.stderr.strip() or "git command failed")
+    return result.stdout.strip()
+
+
+# Layout: <root>/<owner>_<repo>/bare.git plus worktrees/<branch>/<head>, one
+# checkout per fetched HEAD. `current.json` in the branch directory names the
+# checkout being served; a refresh checks out next to it and swaps the
+# pointer, so a checkout is never edited while it is searched.
+class RepoCache:
+
+    def __init__(
+        self,
+        root: Path,
+        max_bytes: int = 2 * 1024 * 1024 * 1024,
+        refresh_seconds: float = 600,
+        max_workers: int = 2,
+        url_for: Callable[[GithubRepoRef], str] = _github_url,
+    ) -> None:
+        self.root = root
+        self.max_bytes = max_bytes
+        self.refresh_seconds = refresh_seconds
+        self.max_workers = max_workers
+        self.url_for = url_for
+        self._lock = Lock()
+        self._repo_locks: dict[Path, Lock] = {}
+        self._pool: ThreadPoolExecutor | None = None
+        self._entries: OrderedDict[Path, RepoEntry] | None = None
+        self._bare_sizes: dict[Path, int] = {}
+        self._inflight: dict[Path, Future] = {}
+
+    def repo_dir(self, ref: GithubRepoRef) -> Path:
+        return self.root / _safe_name(f"{ref.owner}_{ref.repo}")
+
+    def worktree_dir(self, ref: GithubRepoRef) -> Path:
+        return self.repo_dir(ref) / "worktrees" / _safe_name(ref.branch or "HEAD")
+
+    @staticmethod
+    def _pin_ref(checkout: Path) -> str:
+        # Keeps the checked-out commit reachable in the shared bare repo.
+        name = f"{checkout.parent.name}/{checkout.name}"
+        return f"refs/logservice/{hashlib.sha1(name.encode('utf-8')).hexdigest()[:16]}"
+
+    def _load_index(self) -> OrderedDict[Path, RepoEntry]:
+        if self._entries is None:
+            # Sizes were recorded at checkout time, so loading never walks a tree.
+            found: list[tuple[float, Path, RepoEntry]] = []
+            for tree in self.root.glob("*/worktrees/*"):
+                current = _read_json(tree / "current.json")
+                if current is None:
+                    continue
+                try:
+                    mtime = tree.stat().st_mtime
+                except FileNotFoundError:
+                    continue
+                # Served as-is and refreshed on first use.
+                entry = RepoEntry(head=current["head"], size=current["size"], checkout=tree / current["checkout"])
+                found.append((mtime, tree, entry))
+            found.sort(key=lambda item: item[0])
+            self._entries = OrderedDict((tree, entry) for _, tree, entry in found)
+            for repo in {tree.parent.parent for _, tree, _ in found}:
+                self._bare_sizes[repo] = (_read_json(repo / "bare.json") or {}).get("size", 0)
+        return self._entries
+
+    def _repo_lock(self, repo: Path) -> Lock:
+        with self._lock:
+            lock = self._repo_locks.get(repo)
+            if lock is None:
+                lock = Lock()
+                self._repo_locks[repo] = lock
+            return lock
+
+    def _status(self, ref: GithubRepoRef, state: str, entry: RepoEntry | None = None) -> dict[str, Any]:
+        tree = self.worktree_dir(ref)
+        return {
+            "state": state,
+            "repo": f"{ref.owner}/{ref.repo}",
+            "branch": ref.branch,
+            "path": str(entry.checkout) if state == "ready" and entry and entry.checkout else None,
+            "head": (entry.head or None) if entry else None,
+            "error": entry.error if entry else None,
+        }
+
+    def _submit(self, ref: GithubRepoRef, tree: Path) -> None:
+        if self._pool is None:
+            self._pool = ThreadPoolExecutor(max_workers=self.max_workers, thread_name_prefix="repo-fetch")
+        self._inflight[tree] = self._pool.submit(self._refresh, ref)
+
+    def ensure(self, ref: GithubRepoRef) -> dict[str, Any]:
+        # Never blocks: missing worktrees are "warming", stale ones are served while re-fetched.
+        if not _git_available():
+            raise RuntimeError("git is required for GitHub code search")
+        tree = self.worktree_dir(ref)
+        with self._lock:
+            entries = self._load_index()
+            entry = entries.get(tree)
+            pending = tree in self._inflight
+            if entry is not None and entry.error is not None and not pending:
+                # Report the failure once; the next request retries.
+                del entries[tree]
+                return self._status(ref, "failed", entry)
+            if entry is None or entry.head is None:
+                if not pending:
+                    self._submit(ref, tree)
+                return self._status(ref, "warming")
+            entries.move_to_end(tree)
+            if not pending and time.time() - entry.fetched_at >= self.refresh_seconds:
+                self._submit(ref, tree)
+            status = self._status(ref, "ready", entry)
+        try:
+            os.utime(tree)
+        except FileNotFoundError:
+            pass
+        return status
+
+    def wait(self, ref: GithubRepoRef, timeout: float | None = None) -> dict[str, Any]:
+        status = self.ensure(ref)
+        if status["state"] != "warming":
+            return status
+        with self._lock:
+            pending = self._inflight.get(self.worktree_dir(ref))
+        if pending is not None:
+            try:
+                pending.result(timeout=timeout)
+            except FutureTimeout:
+                return status
+        return self.ensure(ref)
+
+    def _refresh(self, ref: GithubRepoRef) -> None:
+        tree = self.worktree_dir(ref)
+        entry = RepoEntry(head=None, error="fetch did not finish")
+        try:
+            checkout, head = self.materialize(ref)
+            size = (_read_json(tree / "current.json") or {}).get("size", 0)
+            entry = RepoEntry(head=head, fetched_at=time.time(), size=size, checkout=checkout)
+        except Exception as exc:
+            entry = RepoEntry(head=None, error=str(exc) or type(exc).__name__)
+        finally:
+            with self._lock:
+                try:
+                    entries = self._load_index()
+                    previous = entries.get(tree)
+                    if entry.error is not None and previous is not None and previous.head is not None:
+                        # Keep serving the old checkout; retry on the next refresh.
+                        previous.fetched_at = time.time()
+                    else:
+                        entries[tree] = entry
+                        entries.move_to_end(tree)
+                finally:
+                    self._inflight.pop(tree, None)
+        if entry.checkout is not None:
+            # Requests now get the new checkout; the old one can go.
+            self._drop_stale(tree, keep=entry.checkout)
+        self._evict()
+
+    def materialize(self, ref: GithubRepoRef) -> tuple[Path, str]:
+        if not _git_available():
+            raise RuntimeError("git is required for GitHub code search")
+        repo = self.repo_dir(ref)
+        bare = repo / "bare.git"
+        tree = self.worktree_dir(ref)
+        with self._repo_lock(repo):
+            if (repo / ".git").exists():
+                # A full clone from the pre-worktree layout.
+                shutil.rmtree(repo)
+            if (tree / ".git").exists():
+                # A checkout edited in place, from before per-HEAD checkouts.
+                shutil.rmtree(tree)
+                _git("-C", bare, "worktree", "prune")
+            if not (bare / "HEAD").exists():
+                bare.mkdir(parents=True, exist_ok=True)
+                _git("init", "--bare", "-q", bare)
+            _git("-C", bare, "fetch", "-q", "--depth", "1", "--no-tags", self.url_for(ref), ref.branch or "HEAD")
+            head = _git("-C", bare, "rev-parse", "FETCH_HEAD^{commit}")
+            checkout = tree / head[:16]
+            current = _read_json(tree / "current.json")
+            served = tree / current["checkout"] if current else None
+            if served != checkout or not (checkout / ".git").exists():
+                if tree.is_dir():
+                    # Interrupted checkouts and ones a crash kept from being dropped.
+                    for stale in tree.iterdir():
+                        if stale.is_dir() and stale != served:
+                            self._remove_checkout(bare, stale)
+                    _git("-C", bare, "worktree", "prune")
+                tree.mkdir(parents=True, exist_ok=True)
+                _git("-C", bare, "update-ref", self._pin_ref(checkout), head)
+                _git("-C", bare, "worktree", "add", "-q", "--detach", "-f", checkout, head)
+                _write_json(tree / "current.json", {"checkout": checkout.name, "head": head, "size": _dir_size(checkout)})
+            size = _dir_size(bare)
+            _write_json(repo / "bare.json", {"size": size})
+        with self._lock:
+            self._bare_sizes[repo] = size
+        return checkout, head
+
+    def _remove_checkout(self, bare: Path, checkout: Path) -> None:
+        try:
+            _git("-C", bare, "worktree", "remove", "--force", checkout)
+            _git("-C", bare, "update-ref", "-d", self._pin_ref(checkout))
+        except RuntimeError:
+            shutil.rmtree(checkout, ignore_errors=True)
+
+    def _drop_stale(self, tree: Path, keep: Path) -> None:
+        repo = tree.parent.parent
+        with self._repo_lock(repo):
+            for checkout in tree.iterdir():
+                if checkout.is_dir() and checkout != keep:
+                    self._remove_checkout(repo / "bare.git", checkout)
+
+    def _remove(self, tree: Path) -> None:
+        repo = tree.parent.parent
+        bare = repo / "bare.git"
+        with self._repo_lock(repo):
+            if tree.is_dir():
+                for checkout in tree.iterdir():
+                    if checkout.is_dir():
+                        self._remove_checkout(bare, checkout)
+            shutil.rmtree(tree, ignore_errors=True)
+            remaining = [p for p in (repo / "worktrees").glob("*") if p.is_dir()]
+            if not remaining:
+                shutil.rmtree(repo, ignore_errors=True)
+                size = 0
+            else:
+                try:
+                    _git("-C", bare, "gc", "-q", "--prune=now")
+                except RuntimeError:
+                    pass
+                size = _dir_size(bare)
+                _write_json(repo / "bare.json", {"size": size})
+        with self._lock:
+            if size:
+                self._bare_sizes[repo] = size
+            else:
+                self._bare_sizes.pop(repo, None)
+
+    def _evict(self) -> None:
+        while True:
+            with self._lock:
+                entries = self._load_index()
+                total = sum(entry.size for entry in entries.values()) + sum(self._bare_sizes.values())
+                if total <= self.max_bytes or len(entries) <= 1:
+                    return
+                # Never evict the most recently used worktree or one being fetched.
+                victim = next(
+                    (tree for tree in list(entries)[:-1] if tree not in self._inflight),
+                    None,
+                )
+                if victim is None:
+                    return
+                del entries[victim]
+            self._remove(victim)
+
+    def shutdown(self) -> None:
+        if self._pool is not None:
+            self._pool.shutdown(wait=False, cancel_futures=True)
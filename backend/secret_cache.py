@@ -0,0 +1,105 @@
+from __future__ import annotations
+
+import json
+import time
+from collections import OrderedDict
+from dataclasses import dataclass
+from threading import Lock, Timer
+from typing import Any
+
+from .storage import LocalStore, Signature
+
+CATEGORY = "auth"
+
+# (master key id, record signature): rotating the key or rewriting the record
+# both change it.
+SecretVersion = tuple[str, Signature]
+
+
+@dataclass
+class SecretEntry:
+    signature: SecretVersion
+    plaintext: bytearray
+    loaded_at: float
+
+
+def _wipe(entry: SecretEntry) -> None:
+    entry.plaintext[:] = bytes(len(entry.plaintext))
+
+
+# Plaintext is kept in a bytearray that is zeroed when the entry is replaced,
+# is evicted or expires; a timer wipes expired entries even when no request comes.
+class SecretCache:
+    def __init__(self, store: LocalStore, ttl_seconds: float = 300, max_entries: int = 64) -> None:
+        self.store = store
+        self.ttl_seconds = ttl_seconds
+        self.max_entries = max_entries
+        self._lock = Lock()
+        self._entries: OrderedDict[str, SecretEntry] = OrderedDict()
+        self._timer: Timer | None = None
+
+    def signature(self, name: str) -> SecretVersion | None:
+        signature = self.store.stat(CATEGORY, name, encrypted=True)
+        return None if signature is None else (self.store.key_id(), signature)
+
+    def get(self, name: str) -> dict[str, Any] | None:
+        signature = self.signature(name)
+        if signature is None:
+            self.invalidate(name)
+            return None
+        now = time.monotonic()
+        with self._lock:
+            self._purge(now)
+            entry = self._entries.get(name)
+            if entry is not None and entry.signature == signature and now - entry.loaded_at < self.ttl_seconds:
+                self._entries.move_to_end(name)
+                return json.loads(entry.plaintext)
+        plaintext = self.store.load_bytes(CATEGORY, name, decrypt=True)
+        if plaintext is None:
+            self.invalidate(name)
+            return None
+        value = json.loads(plaintext)
+        if self.ttl_seconds > 0:
+            self._put(name, SecretEntry(signature=signature, plaintext=bytearray(plaintext), loaded_at=now))
+        return value
+
+    def _put(self, name: str, entry: SecretEntry) -> None:
+        with self._lock:
+            old = self._entries.pop(name, None)
+            if old is not None:
+                _wipe(old)
+            self._entries[name] = entry
+            self._purge(entry.loaded_at)
+            while len(self._entries) > self.max_entries:
+                _, evicted = self._entries.popitem(last=False)
+                _wipe(evicted)
+            self._arm(entry.loaded_at)
+
+    def _purge(self, now: float) -> None:
+        expired = [key for key, item in self._entries.items() if now - item.loaded_at >= self.ttl_seconds]
+        for key in expired:
+            _wipe(self._entries.pop(key))
+
+    def _arm(self, now: float) -> None:
+        # One timer, due when the oldest entry expires.
+        if self._timer is not None or not self._entries:
+            return
+        oldest = min(item.loaded_at for item in self._entries.values())
+        self._timer = Timer(max(oldest + self.ttl_seconds - now, 0.0), self._expire)
+        self._timer.daemon = True
+        self._timer.start()
+
+    def _expire(self) -> None:
+        now = time.monotonic()
+        with self._lock:
+            self._timer = None
+            self._purge(now)
+            self._arm(now)
+
+    def invalidate(self, name: str | None = None) -> None:
+        with self._lock:
+            names = list(self._entries) if name is None else [name]
+            for key in names:
+                entry = self._entries.pop(key, None)
+                if entry is not None:
+                    _wipe(entry)
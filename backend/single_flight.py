@@ -0,0 +1,87 @@
+from __future__ import annotations
+
+from concurrent.futures import Future
+from threading import Lock, Thread
+from typing import Callable, Generic, Hashable, Iterator, Optional, TypeVar
+
+T = TypeVar("T")
+
+# One link per streamed item; None marks the end of the stream.
+_Link = Optional[tuple[T, "Future[_Link[T]]"]]
+
+
+# One call per key at a time; callers arriving meanwhile share its result or exception.
+class SingleFlight(Generic[T]):
+    def __init__(self) -> None:
+        self._lock = Lock()
+        self._inflight: dict[Hashable, Future[T]] = {}
+        self._streams: dict[Hashable, Future[_Link[T]]] = {}
+
+    def do(self, key: Hashable, fn: Callable[[], T]) -> tuple[T, bool]:
+        # `shared` is True for callers that joined another caller's flight.
+        with self._lock:
+            future = self._inflight.get(key)
+            owner = future is None
+            if owner:
+                future = Future()
+                self._inflight[key] = future
+        if not owner:
+            return future.result(), True
+
+        try:
+            value = fn()
+        except BaseException as exc:
+            with self._lock:
+                self._inflight.pop(key, None)
+            future.set_exception(exc)
+            raise
+        with self._lock:
+            self._inflight.pop(key, None)
+        future.set_result(value)
+        return value, False
+
+    def stream(self, key: Hashable, start: Callable[[], Iterator[T]]) -> tuple[Iterator[T], bool]:
+        # The iterator from `start` is drained once on a background thread;
+        # every caller of the flight replays its items from the beginning.
+        with self._lock:
+            head = self._streams.get(key)
+            owner = head is None
+            if owner:
+                head = Future()
+                self._streams[key] = head
+        if owner:
+            try:
+                source = start()
+            except BaseException as exc:
+                with self._lock:
+                    self._streams.pop(key, None)
+                head.set_exception(exc)
+                raise
+            Thread(target=self._pump, args=(key, source, head), daemon=True).start()
+        return _replay(head), not owner
+
+    def _pump(self, key: Hashable, source: Iterator[T], link: Future[_Link[T]]) -> None:
+        try:
+            for item in source:
+                following: Future[_Link[T]] = Future()
+                link.set_result((item, following))
+                link = following
+            link.set_result(None)
+        except BaseException as exc:
+            link.set_exception(exc)
+        finally:
+            with self._lock:
+                self._streams.pop(key, None)
+
+    def inflight(self) -> int:
+        with self._lock:
+            return len(self._inflight) + len(self._streams)
+
+
+def _replay(link: Future[_Link[T]]) -> Iterator[T]:
+    while True:
+        entry = link.result()
+        if entry is None:
+            return
+        item, link = entry
+        yield item
@@ -0,0 +1,111 @@
+from __future__ import annotations
+
+from collections import deque
+from threading import Lock
+from typing import Iterable
+
+
+class TriggerMatcher:
+    def __init__(self) -> None:
+        self._lock = Lock()
+        self._goto: list[dict[str, int]] = [{}]
+        self._fail: list[int] = [0]
+        self._terminal: list[str | None] = [None]
+        self._out_link: list[int] = [0]
+        self._owners: dict[str, set[str]] = {}
+        self._by_owner: dict[str, set[str]] = {}
+        self._dirty = False
+
+    @staticmethod
+    def _normalize(trigger: str) -> str:
+        return trigger.strip().lower()
+
+    def _insert(self, trigger: str) -> None:
+        node = 0
+        for char in trigger:
+            nxt = self._goto[node].get(char)
+            if nxt is None:
+                nxt = len(self._goto)
+                self._goto[node][char] = nxt
+                self._goto.append({})
+                self._fail.append(0)
+                self._terminal.append(None)
+                self._out_link.append(0)
+            node = nxt
+        self._terminal[node] = trigger
+
+    def _find(self, trigger: str) -> int | None:
+        node = 0
+        for char in trigger:
+            node = self._goto[node].get(char)
+            if node is None:
+                return None
+        return node
+
+    def add(self, owner: str, triggers: Iterable[str]) -> None:
+        with self._lock:
+            for raw in triggers:
+                trigger = self._normalize(raw)
+                if not trigger:
+                    continue
+                owners = self._owners.setdefault(trigger, set())
+                if not owners:
+                    self._insert(trigger)
+                    self._dirty = True
+                owners.add(owner)
+                self._by_owner.setdefault(owner, set()).add(trigger)
+
+    def remove(self, owner: str) -> None:
+        with self._lock:
+            for trigger in self._by_owner.pop(owner, set()):
+                owners = self._owners.get(trigger)
+                if owners is None:
+                    continue
+                owners.discard(owner)
+                if not owners:
+                    del self._owners[trigger]
+                    node = self._find(trigger)
+                    if node is not None:
+                        self._terminal[node] = None
+                    self._dirty = True
+
+    def _build(self) -> None:
+        # Standard Aho-Corasick BFS; `_out_link` points at the nearest proper
+        # suffix state that ends a trigger so matching skips dead states.
+        queue: deque[int] = deque()
+        for child in self._goto[0].values():
+            self._fail[child] = 0
+            self._out_link[child] = 0
+            queue.append(child)
+        while queue:
+            node = queue.popleft()
+            for char, child in self._goto[node].items():
+                fail = self._fail[node]
+                while fail and char not in self._goto[fail]:
+                    fail = self._fail[fail]
+                target = self._goto[fail].get(char, 0)
+                self._fail[child] = target if target != child else 0
+                suffix = self._fail[child]
+                self._out_link[child] = suffix if self._terminal[suffix] is not None else self._out_link[suffix]
+                queue.append(child)
+        self._dirty = False
+
+    def match(self, text: str) -> dict[str, set[str]]:
+        with self._lock:
+            if self._dirty:
+                self._build()
+            found: set[str] = set()
+            node = 0
+            for char in text.lower():
+                while node and char not in self._goto[node]:
+                    node = self._fail[node]
+                node = self._goto[node].get(char, 0)
+                hit = node if self._terminal[node] is not None else self._out_link[node]
+                while hit:
+                    found.add(self._terminal[hit])
+                    hit = self._out_link[hit]
+            matches: dict[str, set[str]] = {}
+            for trigger in found:
+                for owner in self._owners.get(trigger, ()):
+                    matches.setdefault(owner, set()).add(trigger)
+            return matches
@@ -2,9 +2,12 @@ from __future__ import annotations
 
 import re
 from datetime import datetime, timezone
-from pathlib import Path
+from threading import Lock
 from typing import Any
 
+from .catalog import RecordCatalog
+from .ids import unique_suffix
+from .skill_match import TriggerMatcher
 from .storage import LocalStore
 
 
@@ -16,19 +19,53 @@ def _slugify(value: str) -> str:
 class SkillManager:
     def __init__(self, store: LocalStore) -> None:
         self.store = store
+        self.catalog = RecordCatalog(store, "skills", keys=lambda skill: skill.get("triggers", []))
+        self.matcher = TriggerMatcher()
+        self._match_lock = Lock()
+        self._matched_version = -1
+        self._skills: dict[str, dict[str, Any]] = {}
 
-    def list(self) -> list[dict[str, Any]]:
-        skills_dir = self.store.root / "skills"
-        skills: list[dict[str, Any]] = []
-        for path in skills_dir.glob("*.json"):
-            data = self.store.load_json("skills", path.stem, decrypt=False)
-            if data:
-                skills.append(data)
-        return skills
+    def _sync_matcher(self) -> None:
+        if self._matched_version < 0:
+            self.catalog.refresh()
+        if self.catalog.version == self._matched_version:
+            return
+        version, records = self.catalog.records()
+        matcher = TriggerMatcher()
+        for skill_id, skill in records.items():
+            matcher.add(skill_id, skill.get("triggers", []))
+        self.matcher = matcher
+        self._skills = records
+        self._matched_version = version
+
+    def match(self, keywords: list[str], limit: int = 10) -> list[dict[str, Any]]:
+        text = "\n".join(k for k in keywords if k)
+        if not text:
+            return []
+        with self._match_lock:
+            self._sync_matcher()
+            hits = self.matcher.match(text)
+            ranked = [
+                {
+                    "skill": dict(self._skills[skill_id]),
+                    "score": sum(len(trigger) for trigger in triggers),
+                    "matched_triggers": sorted(triggers),
+                }
+                for skill_id, triggers in hits.items()
+                if skill_id in self._skills
+            ]
+        ranked.sort(key=lambda item: (item["score"], item["skill"].get("created_at", "")), reverse=True)
+        return ranked[:limit]
+
+    def list(self, offset: int = 0, limit: int | None = None, trigger: str | None = None) -> list[dict[str, Any]]:
+        return self.catalog.list(offset=offset, limit=limit, key=trigger)
+
+    def get(self, skill_id: str) -> dict[str, Any] | None:
+        return self.catalog.get(skill_id)
 
     def create(self, name: str, triggers: list[str], prompt_template: str) -> dict[str, Any]:
         created_at = datetime.now(timezone.utc).isoformat()
-        skill_id = f"{_slugify(name)}-{int(datetime.now().timestamp())}"
+        skill_id = f"{_slugify(name)}-{unique_suffix()}"
         payload = {
             "id": skill_id,
             "name": name,
@@ -37,7 +74,15 @@ class SkillManager:
             "version": 1,
             "created_at": created_at,
         }
-        self.store.save_json("skills", skill_id, payload, encrypt=False)
+        before = self.catalog.version
+        self.catalog.put(skill_id, payload)
+        with self._match_lock:
+            # Fold the new skill into the live index when nothing else changed
+            # the catalog in between; otherwise the next match rebuilds it.
+            if self._matched_version == before and self.catalog.version == before + 1:
+                self.matcher.add(skill_id, triggers)
+                self._skills[skill_id] = dict(payload)
+                self._matched_version = before + 1
         return payload
 
     def extract(self, name: str, keywords: list[str], analysis_notes: str) -> dict[str, Any]:
@@ -1,58 +1,326 @@
+import fcntl
+import hashlib
 import json
 import os
+import sqlite3
+import threading
+import time
 from pathlib import Path
-from typing import Any
+from typing import Any, Callable
 
 from cryptography.fernet import Fernet, InvalidToken
 
+from .config import load_settings
+
+# (version, size): changes whenever a record is rewritten. The file backend
+# uses the mtime in nanoseconds as the version.
+Signature = tuple[int, int]
+
+RECORD_CATEGORIES = ("auth", "sessions", "skills", "context", "journal")
+
 
 class StorageError(RuntimeError):
     pass
 
 
-class LocalStore:
+# One file per record under <root>/<category>/<name>.<kind>.
+class FileBackend:
+
     def __init__(self, root: Path) -> None:
         self.root = root
-        self._ensure_dirs()
-
-    def _ensure_dirs(self) -> None:
-        for name in ("auth", "sessions", "skills", "context", "cache"):
+        for name in (*RECORD_CATEGORIES, "cache"):
             (self.root / name).mkdir(parents=True, exist_ok=True)
 
+    def _path(self, category: str, name: str, kind: str) -> Path:
+        return self.root / category / f"{name}.{kind}"
+
+    def put(self, category: str, name: str, kind: str, payload: bytes) -> Signature:
+        path = self._path(category, name, kind)
+        path.parent.mkdir(parents=True, exist_ok=True)
+        # Write-then-rename so readers never see a partial record.
+        tmp = path.with_name(f".{path.name}.{os.getpid()}.{threading.get_ident()}.tmp")
+        tmp.write_bytes(payload)
+        # Stat before the rename: another process may delete the record right after.
+        stat = tmp.stat()
+        os.replace(tmp, path)
+        return stat.st_mtime_ns, stat.st_size
+
+    def get(self, category: str, name: str, kind: str) -> bytes | None:
+        try:
+            return self._path(category, name, kind).read_bytes()
+        except FileNotFoundError:
+            return None
+
+    def stat(self, category: str, name: str, kind: str) -> Signature | None:
+        try:
+            stat = self._path(category, name, kind).stat()
+        except FileNotFoundError:
+            return None
+        return stat.st_mtime_ns, stat.st_size
+
+    def delete(self, category: str, name: str, kind: str) -> None:
+        self._path(category, name, kind).unlink(missing_ok=True)
+
+    def put_sequenced(
+        self, category: str, kind: str, counter: str, names: Callable[[int], str], payloads: list[bytes], floor: int
+    ) -> int:
+        path = self.root / "counters" / f"{category}.{counter}"
+        path.parent.mkdir(parents=True, exist_ok=True)
+        with open(path, "a+", encoding="utf-8") as handle:
+            # Holding the lock across the writes keeps every allocated number
+            # written before the next one is handed out.
+            fcntl.flock(handle, fcntl.LOCK_EX)
+            handle.seek(0)
+            current = handle.read().strip()
+            first = max(int(current) if current else 0, floor) + 1
+            for offset, payload in enumerate(payloads):
+                self.put(category, names(first + offset), kind, payload)
+            handle.seek(0)
+            handle.truncate()
+            handle.write(str(first + len(payloads) - 1))
+            handle.flush()
+        return first
+
+    def scan(self, category: str, kind: str, prefix: str = "") -> list[tuple[str, Signature]]:
+        suffix = f".{kind}"
+        found: list[tuple[str, Signature]] = []
+        try:
+            entries = list(os.scandir(self.root / category))
+        except FileNotFoundError:
+            return found
+        for item in entries:
+            if not item.name.endswith(suffix) or not item.name.startswith(prefix) or item.name.startswith("."):
+                continue
+            try:
+                stat = item.stat()
+            except FileNotFoundError:
+                continue
+            found.append((item.name[: -len(suffix)], (stat.st_mtime_ns, stat.st_size)))
+        return found
+
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS meta (key TEXT PRIMARY KEY, value TEXT NOT NULL);
+CREATE TABLE IF NOT EXISTS counters (name TEXT PRIMARY KEY, value INTEGER NOT NULL) WITHOUT ROWID;
+CREATE TABLE IF NOT EXISTS imported_files (
+    category TEXT NOT NULL,
+    kind TEXT NOT NULL,
+    name TEXT NOT NULL,
+    mtime_ns INTEGER NOT NULL,
+    PRIMARY KEY (category, kind, name)
+) WITHOUT ROWID;
+CREATE TABLE IF NOT EXISTS records (
+    category TEXT NOT NULL,
+    kind TEXT NOT NULL,
+    name TEXT NOT NULL,
+    data BLOB NOT NULL,
+    updated_ns INTEGER NOT NULL,
+    PRIMARY KEY (category, kind, name)
+) WITHOUT ROWID;
+"""
+
+
+class SqliteBackend:
+
+    def __init__(self, path: Path) -> None:
+        self.path = path
+        self._local = threading.local()
+        self._clock_lock = threading.Lock()
+        self._last_ns = 0
+        path.parent.mkdir(parents=True, exist_ok=True)
+        self._conn().executescript(_SCHEMA)
+
+    def _conn(self) -> sqlite3.Connection:
+        conn = getattr(self._local, "conn", None)
+        if conn is None:
+            conn = sqlite3.connect(self.path, timeout=30, isolation_level=None)
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute("PRAGMA synchronous=NORMAL")
+            self._local.conn = conn
+        return conn
+
+    def _now_ns(self) -> int:
+        # Strictly increasing, so two quick rewrites never share a signature.
+        with self._clock_lock:
+            self._last_ns = max(time.time_ns(), self._last_ns + 1)
+            return self._last_ns
+
+    def put(self, category: str, name: str, kind: str, payload: bytes) -> Signature:
+        updated_ns = self._now_ns()
+        self._conn().execute(
+            "INSERT INTO records (category, kind, name, data, updated_ns) VALUES (?, ?, ?, ?, ?) "
+            "ON CONFLICT (category, kind, name) DO UPDATE SET data = excluded.data, updated_ns = excluded.updated_ns",
+            (category, kind, name, payload, updated_ns),
+        )
+        return updated_ns, len(payload)
+
+    def get(self, category: str, name: str, kind: str) -> bytes | None:
+        row = self._conn().execute(
+            "SELECT data FROM records WHERE category = ? AND kind = ? AND name = ?", (category, kind, name)
+        ).fetchone()
+        return bytes(row[0]) if row else None
+
+    def stat(self, category: str, name: str, kind: str) -> Signature | None:
+        row = self._conn().execute(
+            "SELECT updated_ns, length(data) FROM records WHERE category = ? AND kind = ? AND name = ?",
+            (category, kind, name),
+        ).fetchone()
+        return (row[0], row[1]) if row else None
+
+    def delete(self, category: str, name: str, kind: str) -> None:
+        self._conn().execute(
+            "DELETE FROM records WHERE category = ? AND kind = ? AND name = ?", (category, kind, name)
+        )
+
+    def put_sequenced(
+        self, category: str, kind: str, counter: str, names: Callable[[int], str], payloads: list[bytes], floor: int
+    ) -> int:
+        key = f"{category}/{counter}"
+        conn = self._conn()
+        conn.execute("BEGIN IMMEDIATE")
+        try:
+            row = conn.execute("SELECT value FROM counters WHERE name = ?", (key,)).fetchone()
+            first = max(row[0] if row else 0, floor) + 1
+            for offset, payload in enumerate(payloads):
+                self.put(category, names(first + offset), kind, payload)
+            conn.execute(
+                "INSERT INTO counters (name, value) VALUES (?, ?) ON CONFLICT (name) DO UPDATE SET value = excluded.value",
+                (key, first + len(payloads) - 1),
+            )
+            conn.execute("COMMIT")
+        except BaseException:
+            conn.execute("ROLLBACK")
+            raise
+        return first
+
+    def scan(self, category: str, kind: str, prefix: str = "") -> list[tuple[str, Signature]]:
+        sql = "SELECT name, updated_ns, length(data) FROM records WHERE category = ? AND kind = ?"
+        params: tuple[Any, ...] = (category, kind)
+        if prefix:
+            # A key range rather than LIKE, so the primary key index is used.
+            sql += " AND name >= ? AND name < ?"
+            params += (prefix, prefix[:-1] + chr(ord(prefix[-1]) + 1))
+        rows = self._conn().execute(sql, params)
+        return [(name, (updated_ns, size)) for name, updated_ns, size in rows]
+
+    def migrate_directory(self, root: Path) -> int:
+        # Imports record files that are new or changed since they were last
+        # imported, so files dropped into the data dir are picked up on the
+        # next start. Rows written after the file still win, and a record
+        # deleted from the database is not brought back by its old file.
+        conn = self._conn()
+        imported = 0
+        conn.execute("BEGIN IMMEDIATE")
+        try:
+            flag = conn.execute("SELECT value FROM meta WHERE key = 'migrated_files'").fetchone()
+            # Databases from before the ledger count every older file as imported.
+            floor = int(flag[0]) if flag else None
+            for category in RECORD_CATEGORIES:
+                directory = root / category
+                if not directory.is_dir():
+                    continue
+                for path in directory.iterdir():
+                    kind = path.suffix[1:]
+                    if kind not in {"json", "bin"} or path.name.startswith(".") or not path.is_file():
+                        continue
+                    mtime_ns = path.stat().st_mtime_ns
+                    row = conn.execute(
+                        "SELECT mtime_ns FROM imported_files WHERE category = ? AND kind = ? AND name = ?",
+                        (category, kind, path.stem),
+                    ).fetchone()
+                    seen = row[0] if row else floor
+                    if seen is not None and mtime_ns <= seen:
+                        continue
+                    cursor = conn.execute(
+                        "INSERT INTO records (category, kind, name, data, updated_ns) VALUES (?, ?, ?, ?, ?) "
+                        "ON CONFLICT (category, kind, name) DO UPDATE SET data = excluded.data, "
+                        "updated_ns = excluded.updated_ns WHERE excluded.updated_ns > records.updated_ns",
+                        (category, kind, path.stem, path.read_bytes(), mtime_ns),
+                    )
+                    imported += cursor.rowcount
+                    conn.execute(
+                        "INSERT INTO imported_files (category, kind, name, mtime_ns) VALUES (?, ?, ?, ?) "
+                        "ON CONFLICT (category, kind, name) DO UPDATE SET mtime_ns = excluded.mtime_ns",
+                        (category, kind, path.stem, mtime_ns),
+                    )
+            conn.execute("COMMIT")
+        except BaseException:
+            conn.execute("ROLLBACK")
+            raise
+        return imported
+
+
+class LocalStore:
+    def __init__(self, root: Path, backend: str | None = None) -> None:
+        self.root = root
+        self._cipher: tuple[str, Fernet] | None = None
+        # Default to the backend the server reads, so tools write where it looks.
+        backend = backend or load_settings().storage_backend
+        if backend == "files":
+            self.backend: FileBackend | SqliteBackend = FileBackend(root)
+        elif backend == "sqlite":
+            self.backend = SqliteBackend(root / "store.sqlite")
+            self.backend.migrate_directory(root)
+        else:
+            raise StorageError(f"unknown storage backend: {backend}")
+
     def _fernet(self) -> Fernet:
         key = os.getenv("LOGSERVICE_MASTER_KEY")
         if not key:
             raise StorageError("LOGSERVICE_MASTER_KEY is required for encrypted storage")
-        return Fernet(key.encode("utf-8"))
+        # Reuse the cipher while the key is unchanged.
+        cached = self._cipher
+        if cached is None or cached[0] != key:
+            cached = (key, Fernet(key.encode("utf-8")))
+            self._cipher = cached
+        return cached[1]
 
-    def save_json(self, category: str, name: str, data: dict[str, Any], *, encrypt: bool) -> Path:
-        category_dir = self.root / category
-        category_dir.mkdir(parents=True, exist_ok=True)
-        payload = json.dumps(data, ensure_ascii=False, indent=2).encode("utf-8")
+    def key_id(self) -> str:
+        # Identifies the master key without revealing it; empty when unset.
+        key = os.getenv("LOGSERVICE_MASTER_KEY")
+        return hashlib.sha256(key.encode("utf-8")).hexdigest()[:16] if key else ""
 
+    def save_json(self, category: str, name: str, data: dict[str, Any], *, encrypt: bool) -> Signature:
+        payload = json.dumps(data, ensure_ascii=False, separators=(",", ":")).encode("utf-8")
         if encrypt:
-            token = self._fernet().encrypt(payload)
-            path = category_dir / f"{name}.bin"
-            path.write_bytes(token)
-            return path
+            return self.backend.put(category, name, "bin", self._fernet().encrypt(payload))
+        return self.backend.put(category, name, "json", payload)
 
-        path = category_dir / f"{name}.json"
-        path.write_bytes(payload)
-        return path
+    def load_bytes(self, category: str, name: str, *, decrypt: bool) -> bytes | None:
+        if not decrypt:
+            return self.backend.get(category, name, "json")
+        token = self.backend.get(category, name, "bin")
+        if token is None:
+            return None
+        try:
+            return self._fernet().decrypt(token)
+        except InvalidToken as exc:
+            raise StorageError("Encrypted payload cannot be decrypted") from exc
 
     def load_json(self, category: str, name: str, *, decrypt: bool) -> dict[str, Any] | None:
-        category_dir = self.root / category
-        if decrypt:
-            path = category_dir / f"{name}.bin"
-            if not path.exists():
-                return None
-            try:
-                data = self._fernet().decrypt(path.read_bytes())
-            except InvalidToken as exc:
-                raise StorageError("Encrypted payload cannot be decrypted") from exc
-            return json.loads(data.decode("utf-8"))
-
-        path = category_dir / f"{name}.json"
-        if not path.exists():
+        payload = self.load_bytes(category, name, decrypt=decrypt)
+        if payload is None:
             return None
-        return json.loads(path.read_text(encoding="utf-8"))
+        return json.loads(payload.decode("utf-8"))
+
+    def stat(self, category: str, name: str, *, encrypted: bool = False) -> Signature | None:
+        return self.backend.stat(category, name, "bin" if encrypted else "json")
+
+    def delete(self, category: str, name: str, *, encrypted: bool = False) -> None:
+        self.backend.delete(category, name, "bin" if encrypted else "json")
+
+    def save_sequenced(
+        self,
+        category: str,
+        counter: str,
+        names: Callable[[int], str],
+        records: list[dict[str, Any]],
+        floor: int = 0,
+    ) -> int:
+        # Numbers the records above max(last used, floor) and writes them as
+        # one step, so no other writer ever sees a number before its record.
+        payloads = [json.dumps(data, ensure_ascii=False, separators=(",", ":")).encode("utf-8") for data in records]
+        return self.backend.put_sequenced(category, "json", counter, names, payloads, floor)
+
+    def scan(self, category: str, prefix: str = "", *, encrypted: bool = False) -> list[tuple[str, Signature]]:
+        return self.backend.scan(category, "bin" if encrypted else "json", prefix)
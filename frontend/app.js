@@ -88,7 +88,7 @@ async function runQuery() {
   setStatus("running");
 
   try {
-    const res = await fetch("/api/query", {
+    const res = await fetch("/api/query/stream", {
       method: "POST",
       headers: { "Content-Type": "application/json" },
       body: JSON.stringify(payload),
@@ -99,11 +99,37 @@ async function runQuery() {
       throw new Error(text);
     }
 
-    const data = await res.json();
-    const lines = data.lines
-      .map((line) => `${line.ts} ${line.line}`)
-      .join("\n");
-    appendMessage("system", "Results", lines || "(no lines)");
+    appendMessage("system", "Results", "(waiting for lines)");
+    const output = Array.from(document.querySelectorAll(".message.system pre")).pop();
+    const rendered = [];
+    const reader = res.body.getReader();
+    const decoder = new TextDecoder();
+    let buffer = "";
+
+    const handleFrame = (frame) => {
+      if (frame.type === "lines") {
+        rendered.push(...frame.lines.map((line) => `${line.ts} ${line.line}`));
+        output.textContent = rendered.join("\n");
+      } else if (frame.type === "templates") {
+        rendered.push(...frame.templates.map((item) => `${item.last_ts} (x${item.count}) ${item.template}`));
+        output.textContent = rendered.join("\n");
+      } else if (frame.type === "summary") {
+        output.textContent = rendered.join("\n") || "(no lines)";
+      } else if (frame.type === "error") {
+        throw new Error(frame.detail);
+      }
+    };
+
+    while (true) {
+      const { done, value } = await reader.read();
+      buffer += decoder.decode(value || new Uint8Array(), { stream: !done });
+      const parts = buffer.split("\n");
+      buffer = parts.pop();
+      parts.filter(Boolean).forEach((part) => handleFrame(JSON.parse(part)));
+      if (done) {
+        break;
+      }
+    }
   } catch (err) {
     appendMessage("system", "Error", err.message || "request failed");
   } finally {
@@ -0,0 +1,137 @@
+import threading
+import time
+from pathlib import Path
+
+from backend.agent import AgentRunner
+from backend.rate_limit import TokenBucketLimiter
+from backend.storage import LocalStore
+
+
+def _wait_for(runner: AgentRunner, job_id: str, statuses: set[str]) -> dict:
+    for _ in range(200):
+        job = runner.get(job_id)
+        if job and job["status"] in statuses:
+            return job
+        time.sleep(0.01)
+    raise AssertionError(f"job {job_id} did not reach {statuses}")
+
+
+def test_agent_runs_steps_and_persists_progress(tmp_path: Path):
+    store = LocalStore(tmp_path)
+    handlers = {
+        "query": lambda step, ctx: {"lines": [{"ts": "1", "line": "leader ready", "labels": {}}]},
+        "filter": lambda step, ctx: {"count": len(ctx["results"][-1]["lines"])},
+    }
+    limiter = TokenBucketLimiter(rate_per_sec=50.0, burst=1)
+    runner = AgentRunner(store, handlers, limiter=limiter, rate_limited_steps={"query"})
+    job = {"id": "job-1", "steps": [{"type": "query"}, {"type": "query"}, {"type": "filter"}], "payload": {}}
+    runner.submit(job)
+
+    done = _wait_for(runner, "job-1", {"succeeded", "failed"})
+    assert done["status"] == "succeeded"
+    assert [step["status"] for step in done["steps_status"]] == ["succeeded"] * 3
+    assert done["steps_status"][2]["result"] == {"count": 1}
+    assert store.load_json("context", "job-1", decrypt=False)["status"] == "succeeded"
+    runner.shutdown()
+
+
+def test_agent_cancels_running_job(tmp_path: Path):
+    started = threading.Event()
+    release = threading.Event()
+
+    def slow(step, ctx):
+        started.set()
+        release.wait(2)
+        return {}
+
+    runner = AgentRunner(LocalStore(tmp_path), {"slow": slow}, per_cluster=1)
+    runner.submit({"id": "job-a", "steps": [{"type": "slow"}, {"type": "slow"}], "payload": {"cluster_id": "c"}})
+    runner.submit({"id": "job-b", "steps": [{"type": "slow"}], "payload": {"cluster_id": "c"}})
+    assert started.wait(2)
+
+    assert runner.get("job-b")["status"] == "queued"
+    runner.cancel("job-a")
+    runner.cancel("job-b")
+    release.set()
+
+    job_a = _wait_for(runner, "job-a", {"cancelled"})
+    assert [step["status"] for step in job_a["steps_status"]] == ["succeeded", "cancelled"]
+    assert _wait_for(runner, "job-b", {"cancelled"})["steps_status"][0]["status"] == "cancelled"
+    runner.shutdown()
+
+
+def test_agent_reports_failed_step(tmp_path: Path):
+    def boom(step, ctx):
+        raise RuntimeError("loki unavailable")
+
+    runner = AgentRunner(LocalStore(tmp_path), {"query": boom})
+    runner.submit({"id": "job-f", "steps": [{"type": "query"}, {"type": "unknown"}], "payload": {}})
+    job = _wait_for(runner, "job-f", {"failed"})
+    assert job["error"] == "loki unavailable"
+    assert [step["status"] for step in job["steps_status"]] == ["failed", "pending"]
+    runner.shutdown()
+
+
+def test_agent_returns_reserved_token_on_cancel(tmp_path: Path):
+    reserved = threading.Event()
+    limiter = TokenBucketLimiter(rate_per_sec=0.1, burst=1)
+    reserve = limiter.reserve
+
+    def recording_reserve(*args, **kwargs):
+        delay = reserve(*args, **kwargs)
+        if delay:
+            reserved.set()
+        return delay
+
+    limiter.reserve = recording_reserve
+    runner = AgentRunner(
+        LocalStore(tmp_path), {"query": lambda step, ctx: {}}, limiter=limiter, rate_limited_steps={"query"}
+    )
+    runner.submit({"id": "job-1", "steps": [{"type": "query"}, {"type": "query"}], "payload": {"cluster_id": "c"}})
+    # The first step takes the only token; the second queues ten seconds out.
+    assert reserved.wait(2)
+    runner.cancel("job-1")
+
+    assert _wait_for(runner, "job-1", {"cancelled"})["steps_status"][0]["status"] == "succeeded"
+    assert 9 < reserve("c") <= 10
+    runner.shutdown()
+
+
+def test_busy_cluster_does_not_hold_pool_workers(tmp_path: Path):
+    release = threading.Event()
+
+    def slow(step, ctx):
+        release.wait(5)
+        return {}
+
+    runner = AgentRunner(LocalStore(tmp_path), {"slow": slow, "fast": lambda step, ctx: {}}, max_workers=2)
+    for name in ("a1", "a2", "a3"):
+        runner.submit({"id": f"job-{name}", "steps": [{"type": "slow"}], "payload": {"cluster_id": "a"}})
+    runner.submit({"id": "job-b1", "steps": [{"type": "fast"}], "payload": {"cluster_id": "b"}})
+
+    # Jobs queued behind cluster a wait outside the pool, so b still runs.
+    assert _wait_for(runner, "job-b1", {"succeeded"})["status"] == "succeeded"
+    assert runner.get("job-a2")["status"] == "queued"
+    runner.cancel("job-a3")
+    release.set()
+    assert _wait_for(runner, "job-a2", {"succeeded"})["status"] == "succeeded"
+    assert runner.get("job-a3")["status"] == "cancelled"
+    runner.shutdown()
+
+
+def test_agent_fails_jobs_orphaned_by_a_restart(tmp_path: Path):
+    store = LocalStore(tmp_path)
+    steps_status = [
+        {"index": 0, "type": "query", "status": "running"},
+        {"index": 1, "type": "query", "status": "pending"},
+    ]
+    job = {"id": "job-1", "status": "running", "steps_status": steps_status}
+    store.save_json("context", "job-1", job, encrypt=False)
+    store.save_json("context", "job-2", {"id": "job-2", "status": "succeeded", "steps_status": []}, encrypt=False)
+
+    runner = AgentRunner(store, {})
+    job = runner.get("job-1")
+    assert job["status"] == "failed"
+    assert [step["status"] for step in job["steps_status"]] == ["failed", "pending"]
+    assert runner.get("job-2")["status"] == "succeeded"
+    runner.shutdown()
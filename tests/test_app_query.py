@@ -0,0 +1,148 @@
+import importlib
+import json
+import sys
+import threading
+from concurrent.futures import Future
+from pathlib import Path
+
+import pytest
+from fastapi.testclient import TestClient
+
+from backend import single_flight
+from backend.loki_adapter import LokiAdapter
+
+EXAMPLE = Path(__file__).resolve().parents[1] / "config/examples/cluster.example.json"
+BASE = 1770019200 * 10**9
+
+
+@pytest.fixture
+def app_module(tmp_path: Path, monkeypatch):
+    config = json.loads(EXAMPLE.read_text(encoding="utf-8"))
+    config["metadata"] = {"provider": "static"}
+    config["loki"].pop("auth")
+    config["network"] = {"mode": "direct"}
+    config["rate_limit"] = {"min_interval_seconds": 1, "burst": 100}
+    (tmp_path / "cluster.json").write_text(json.dumps(config), encoding="utf-8")
+    monkeypatch.setenv("LOGSERVICE_CONFIG", str(tmp_path / "cluster.json"))
+    monkeypatch.setenv("LOGSERVICE_DATA_DIR", str(tmp_path / "data"))
+    monkeypatch.setenv("LOGSERVICE_CACHE_MAX_BYTES", "0")
+    monkeypatch.setenv("LOGSERVICE_REDACT", "false")
+    sys.modules.pop("backend.app", None)
+    module = importlib.import_module("backend.app")
+    yield module
+    sys.modules.pop("backend.app", None)
+
+
+def _fake_loki(calls: list[dict]):
+    def fake_get(self, path, params):
+        calls.append(params)
+        component = params["query"].split('component="')[1].split('"')[0]
+        values = [[str(BASE + i * 10**9), f"{component} line {i}"] for i in range(5)]
+        values = [value for value in values if params["start"] <= int(value[0]) < params["end"]]
+        values.sort(reverse=params["direction"] == "backward")
+        return {"data": {"result": [{"stream": {"component": component}, "values": values[: params["limit"]]}]}}
+
+    return fake_get
+
+
+def _body(**extra):
+    return {
+        "cluster_id": "c1",
+        "components": ["pd", "tikv"],
+        "time_range": {"start": "2026-02-02T08:00:00Z", "end": "2026-02-02T08:15:00Z"},
+        **extra,
+    }
+
+
+def test_cursor_rejects_changed_components(app_module, monkeypatch):
+    monkeypatch.setattr(LokiAdapter, "_get", _fake_loki([]))
+    client = TestClient(app_module.app)
+
+    first = client.post("/api/query", json=_body(max_lines=3)).json()
+    assert first["next_cursor"]
+    same = client.post("/api/query", json=_body(max_lines=3, cursor=first["next_cursor"]))
+    assert same.status_code == 200
+    changed = client.post("/api/query", json=_body(max_lines=3, components=["pd"], cursor=first["next_cursor"]))
+    assert changed.status_code == 400
+
+
+@pytest.fixture
+def gated_loki(app_module, monkeypatch):
+    calls: list[dict] = []
+    fake_get = _fake_loki(calls)
+    release = threading.Event()
+    joined = threading.Semaphore(0)
+
+    def gated_get(self, path, params):
+        assert release.wait(5)
+        return fake_get(self, path, params)
+
+    # Released each time a request starts waiting on a shared flight.
+    class SignallingFuture(Future):
+        def result(self, timeout=None):
+            joined.release()
+            return super().result(timeout)
+
+    allows = []
+    allow = app_module.limiter.allow
+
+    def counting_allow(*args):
+        allows.append(args)
+        return allow(*args)
+
+    monkeypatch.setattr(LokiAdapter, "_get", gated_get)
+    monkeypatch.setattr(single_flight, "Future", SignallingFuture)
+    monkeypatch.setattr(app_module.limiter, "allow", counting_allow)
+    return calls, allows, release, joined
+
+
+def _post_concurrently(
+    client: TestClient,
+    path: str,
+    body: dict,
+    count: int,
+    release: threading.Event,
+    joined: threading.Semaphore,
+    waiters: int,
+) -> list:
+    responses = []
+    threads = [threading.Thread(target=lambda: responses.append(client.post(path, json=body))) for _ in range(count)]
+    for thread in threads:
+        thread.start()
+    # Release the upstream call only once every request has joined the flight.
+    for _ in range(waiters):
+        assert joined.acquire(timeout=5)
+    release.set()
+    for thread in threads:
+        thread.join()
+    return responses
+
+
+def test_concurrent_identical_queries_share_one_upstream_call(app_module, gated_loki):
+    calls, allows, release, joined = gated_loki
+    body = _body(components=["pd"], window_seconds=900)
+    # The leader runs the fetch itself; the other three wait on its result.
+    responses = _post_concurrently(TestClient(app_module.app), "/api/query", body, 4, release, joined, 3)
+
+    assert len(calls) == 1
+    assert len(allows) == 1
+    assert [response.status_code for response in responses] == [200] * 4
+    assert all(response.json() == responses[0].json() for response in responses)
+
+
+def test_concurrent_identical_streams_share_one_upstream_call(app_module, gated_loki):
+    calls, allows, release, joined = gated_loki
+    client = TestClient(app_module.app)
+    bad = client.post("/api/query/stream", json=_body(cursor="not-a-cursor"))
+    assert bad.status_code == 400
+    assert allows == []
+
+    body = _body(components=["pd"], window_seconds=900)
+    # Every stream, the leader's included, replays the shared fetch.
+    responses = _post_concurrently(client, "/api/query/stream", body, 4, release, joined, 4)
+
+    assert len(calls) == 1
+    assert len(allows) == 1
+    assert [response.status_code for response in responses] == [200] * 4
+    assert all(response.text == responses[0].text for response in responses)
+    assert '"summary"' in responses[0].text
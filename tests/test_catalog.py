@@ -0,0 +1,41 @@
+import json
+from pathlib import Path
+
+from backend.catalog import RecordCatalog
+from backend.ids import new_id
+from backend.skills import SkillManager
+from backend.storage import LocalStore
+
+
+def test_new_ids_are_unique_and_ordered():
+    ids = [new_id("job") for _ in range(1000)]
+    assert len(set(ids)) == len(ids)
+    assert ids == sorted(ids)
+
+
+def test_skill_catalog_paging_and_trigger_lookup(tmp_path: Path):
+    manager = SkillManager(LocalStore(tmp_path))
+    created = [manager.create("PD leader", ["leader", f"t{i}"], "prompt") for i in range(5)]
+
+    assert len({skill["id"] for skill in created}) == 5
+    assert len(manager.list()) == 5
+    assert len(manager.list(offset=2, limit=2)) == 2
+    assert [skill["id"] for skill in manager.list(trigger="T3")] == [created[3]["id"]]
+    assert len(manager.list(trigger="leader")) == 5
+
+
+def test_catalog_picks_up_external_changes(tmp_path: Path):
+    store = LocalStore(tmp_path, backend="files")
+    catalog = RecordCatalog(store, "context", prefix="job-", keys=lambda job: [job["status"]])
+    catalog.put("job-1", {"id": "job-1", "status": "queued", "created_at": "1"})
+    store.save_json("context", "session-1", {"notes": "not a job"}, encrypt=False)
+    assert [job["id"] for job in catalog.list()] == ["job-1"]
+
+    path = tmp_path / "context" / "job-1.json"
+    path.write_text(json.dumps({"id": "job-1", "status": "succeeded", "created_at": "1"}), encoding="utf-8")
+    assert catalog.list(key="queued") == []
+    assert catalog.get("job-1")["status"] == "succeeded"
+
+    path.unlink()
+    assert catalog.list() == []
+    assert catalog.get("job-1") is None
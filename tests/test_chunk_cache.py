@@ -0,0 +1,64 @@
+from datetime import datetime, timedelta, timezone
+from pathlib import Path
+
+from backend.chunk_cache import ChunkCache
+from backend.loki_adapter import LokiAdapter
+
+
+def test_chunk_cache_reuses_closed_windows(tmp_path: Path, monkeypatch):
+    cache = ChunkCache(tmp_path, max_bytes=1024 * 1024)
+    adapter = LokiAdapter(base_url="http://loki.invalid", cache=cache)
+    fetches = []
+
+    class Response:
+        def raise_for_status(self):
+            return None
+
+        def json(self):
+            return {"data": {"result": [{"stream": {"app": "pd"}, "values": [["1", "hello"]]}]}}
+
+    def fake_get(url, **kwargs):
+        fetches.append(kwargs["params"])
+        return Response()
+
+    monkeypatch.setattr("backend.loki_adapter.httpx.get", fake_get)
+    end = datetime(2026, 2, 2, 8, 0, tzinfo=timezone.utc)
+    adapter.query_with_slicing('{app="pd"}', end - timedelta(minutes=10), end, limit=100)
+    adapter.query_with_slicing('{app="pd"}', end - timedelta(minutes=15), end, limit=100)
+
+    assert len(fetches) == 3
+    assert cache.stats()["hits"] == 2
+    assert cache.stats()["misses"] == 3
+
+
+def test_chunk_cache_evicts_least_recently_used(tmp_path: Path):
+    cache = ChunkCache(tmp_path, max_bytes=200)
+    line = [["1", "x" * 40, {}]]
+    cache.put("a", 10, line)
+    cache.put("b", 10, line)
+    assert cache.get("a", 10) == line
+    cache.put("c", 10, line)
+
+    assert cache.get("b", 10) is None
+    assert cache.get("a", 10) == line
+    assert not (tmp_path / "b.json").exists()
+
+
+def test_chunk_cache_limit_mismatch(tmp_path: Path):
+    cache = ChunkCache(tmp_path)
+    cache.put("full", 2, [["1", "a", {}], ["2", "b", {}]])
+    cache.put("partial", 5, [["1", "a", {}], ["3", "c", {}], ["2", "b", {}]])
+    assert cache.get("full", 5) is None
+    # A full chunk fetched with a larger limit is not what Loki returns for a smaller one.
+    assert cache.get("full", 1) is None
+    assert cache.get("full", 2) == [["1", "a", {}], ["2", "b", {}]]
+    assert cache.get("partial", 50) == [["1", "a", {}], ["3", "c", {}], ["2", "b", {}]]
+    assert cache.get("partial", 2) == [["3", "c", {}], ["2", "b", {}]]
+    assert cache.get("partial", 2, "forward") == [["1", "a", {}], ["2", "b", {}]]
+
+
+def test_chunk_cache_ignores_older_formats(tmp_path: Path):
+    cache = ChunkCache(tmp_path)
+    cache.put("old", 2, [["1", "a", {}]])
+    (tmp_path / "old.json").write_text('{"limit": 2, "lines": [["1", "a", {}]]}')
+    assert cache.get("old", 2) is None
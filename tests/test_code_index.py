@@ -0,0 +1,96 @@
+import os
+import threading
+from pathlib import Path
+
+from backend.code_index import CodeIndex
+from backend.code_search import search_code
+
+
+def _write(path: Path, text: str) -> None:
+    path.parent.mkdir(parents=True, exist_ok=True)
+    path.write_text(text, encoding="utf-8")
+
+
+def test_code_index_incremental_update(tmp_path: Path):
+    repo = tmp_path / "repo"
+    _write(repo / "server/leader.go", 'log.Info("leader is ready")\nreturn nil\n')
+    _write(repo / "server/region.go", 'log.Warn("region split slow")\n')
+    (repo / "blob.bin").write_bytes(b"\0leader is ready")
+    _write(repo / "target/debug/leader.txt", "leader is ready")
+
+    index = CodeIndex.for_path(repo, tmp_path / "cache")
+    assert index.update() == {"files": 3, "indexed": 3, "removed": 0}
+    assert index.update()["indexed"] == 0
+
+    hits = index.search(["leader is"], max_hits=10)
+    assert [(Path(hit["file"]).name, hit["line"]) for hit in hits] == [("leader.go", 1)]
+    assert index.search(["Leader is"], max_hits=10) == []
+
+    _write(repo / "server/region.go", 'log.Warn("leader is gone")\n')
+    os.utime(repo / "server/region.go", ns=(1, 1))
+    (repo / "server/leader.go").unlink()
+    assert index.update() == {"files": 2, "indexed": 1, "removed": 1}
+    assert [Path(hit["file"]).name for hit in index.search(["leader is"], max_hits=10)] == ["region.go"]
+
+
+def test_search_code_uses_existing_index(tmp_path: Path, monkeypatch):
+    repo = tmp_path / "repo"
+    _write(repo / "a.rs", "fn main() { info!(\"store heartbeat\"); }\n")
+    cache_root = tmp_path / "cache"
+    assert not CodeIndex.for_path(repo, cache_root).exists()
+    CodeIndex.for_path(repo, cache_root).update()
+
+    release = threading.Event()
+    refreshed = threading.Event()
+    update = CodeIndex.update
+
+    def gated_update(self, git_head=None):
+        assert release.wait(5)
+        try:
+            return update(self, git_head=git_head)
+        finally:
+            refreshed.set()
+
+    monkeypatch.setattr(CodeIndex, "update", gated_update)
+    _write(repo / "b.rs", "// store heartbeat late\n")
+    # The request only probes the index; the refresh it starts runs off the request path.
+    hits = search_code(repo, ["heartbeat"], 10, cache_root=cache_root)
+    assert [Path(hit["file"]).name for hit in hits] == ["a.rs"]
+    release.set()
+    assert refreshed.wait(5)
+    hits = search_code(repo, ["heartbeat"], 10, cache_root=cache_root)
+    assert sorted(Path(hit["file"]).name for hit in hits) == ["a.rs", "b.rs"]
+
+
+def test_code_index_uses_the_search_exclusions(tmp_path: Path):
+    repo = tmp_path / "repo"
+    _write(repo / "main.go", "store heartbeat\n")
+    _write(repo / "vendor/lib/dep.go", "store heartbeat\n")
+    _write(repo / "web/app.min.js", "store heartbeat\n")
+    _write(repo / "gen/api.pb.go", "store heartbeat\n")
+    cache_root = tmp_path / "cache"
+
+    index = CodeIndex.for_path(repo, cache_root)
+    index.update()
+    assert sorted(Path(hit["file"]).name for hit in index.search(["heartbeat"], 10)) == ["api.pb.go", "main.go"]
+
+    # The same exclusions the walk and rg paths get from LOGSERVICE_CODE_EXCLUDE.
+    index = CodeIndex.for_path(repo, cache_root, ["vendor", "*.min.js", "gen"])
+    assert index.update()["removed"] == 1
+    assert [Path(hit["file"]).name for hit in index.search(["heartbeat"], 10)] == ["main.go"]
+
+
+def test_code_index_follows_a_moved_checkout(tmp_path: Path):
+    key = tmp_path / "worktrees" / "main"
+    old = key / "aaaa"
+    _write(old / "pd/leader.go", "leader is ready\n")
+    cache_root = tmp_path / "cache"
+    CodeIndex.for_path(old, cache_root, key=key).update(git_head="aaaa")
+
+    new = key / "bbbb"
+    old.rename(new)
+    index = CodeIndex.for_path(new, cache_root, key=key)
+    assert index.exists()
+    # Paths are stored relative to the root, so the old index still answers.
+    assert [hit["file"] for hit in index.search(["leader"], 10)] == [str(new / "pd/leader.go")]
+    assert index.update(git_head="bbbb")["files"] == 1
@@ -1,4 +1,6 @@
-from backend.code_search import _is_github_url, _parse_github_url
+from pathlib import Path
+
+from backend.code_search import _is_github_url, _parse_github_url, _search_local
 
 
 def test_parse_github_url_basic():
@@ -16,3 +18,18 @@ def test_parse_github_url_tree_path():
     ref = _parse_github_url(url)
     assert ref.branch == "main"
     assert ref.subpath == "src"
+
+
+def test_search_local_skips_excluded_and_binary(tmp_path, monkeypatch):
+    monkeypatch.setattr("backend.code_search._rg_available", lambda: False)
+    (tmp_path / "src").mkdir()
+    (tmp_path / "src" / "main.go").write_text("a\nneedle here\nneedle again\n", encoding="utf-8")
+    (tmp_path / "node_modules" / "pkg").mkdir(parents=True)
+    (tmp_path / "node_modules" / "pkg" / "index.js").write_text("needle\n", encoding="utf-8")
+    (tmp_path / "blob.bin").write_bytes(b"\0needle\n")
+
+    hits = _search_local(tmp_path, ["needle"], max_hits=10)
+    assert [(Path(h["file"]).name, h["line"]) for h in hits] == [("main.go", 2), ("main.go", 3)]
+
+    assert len(_search_local(tmp_path, ["needle"], max_hits=1)) == 1
+    assert len(_search_local(tmp_path, ["needle"], max_hits=10, exclude_globs=())) == 3
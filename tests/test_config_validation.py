@@ -1,6 +1,9 @@
+import json
 from pathlib import Path
 
-from backend.cluster_config import load_cluster_config
+import pytest
+
+from backend.cluster_config import ConfigValidationError, load_cluster_config
 
 
 def test_cluster_config_example_valid():
@@ -9,3 +12,20 @@ def test_cluster_config_example_valid():
     schema_path = root / "config/schema/cluster_config.schema.json"
     data = load_cluster_config(config_path, schema_path)
     assert data["cluster_id"]
+
+
+def test_cluster_config_cache_invalidated_on_change(tmp_path: Path):
+    root = Path(__file__).resolve().parents[1]
+    schema_path = root / "config/schema/cluster_config.schema.json"
+    config_path = tmp_path / "cluster.json"
+    example = json.loads((root / "config/examples/cluster.example.json").read_text(encoding="utf-8"))
+    config_path.write_text(json.dumps(example), encoding="utf-8")
+
+    first = load_cluster_config(config_path, schema_path)
+    first["cluster_id"] = "mutated"
+    assert load_cluster_config(config_path, schema_path)["cluster_id"] == example["cluster_id"]
+
+    example["components"] = ["not-a-component"]
+    config_path.write_text(json.dumps(example, indent=2), encoding="utf-8")
+    with pytest.raises(ConfigValidationError):
+        load_cluster_config(config_path, schema_path)
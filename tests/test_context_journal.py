@@ -0,0 +1,68 @@
+from concurrent.futures import ProcessPoolExecutor
+from multiprocessing import get_context
+from pathlib import Path
+
+from backend.context_journal import ContextJournal
+from backend.storage import LocalStore
+
+
+def _names(store: LocalStore, session_id: str) -> list[str]:
+    return sorted(name.split("~", 1)[1] for name, _ in store.scan("journal", f"{session_id}~"))
+
+
+def test_journal_replays_deltas_segments_and_snapshot(tmp_path: Path):
+    store = LocalStore(tmp_path, backend="sqlite")
+    journal = ContextJournal(store, segment_size=4, compact_segments=2)
+    assert journal.load("s1") is None
+
+    journal.replace("s1", {"notes": "", "queries": []})
+    for i in range(10):
+        journal.append("s1", [
+            {"op": "append", "path": ["queries"], "value": {"q": i}},
+            {"op": "extend", "path": ["samples", str(i)], "value": [f"line {i}"]},
+        ])
+    journal.append("s1", [{"op": "set", "path": ["notes"], "value": "leader flap"}])
+    assert [name for name in _names(store, "s1") if name.startswith("seg-")]
+
+    doc = journal.load("s1", fields=["queries", "notes"], tail=3)
+    assert doc == {"notes": "leader flap", "queries": [{"q": 7}, {"q": 8}, {"q": 9}]}
+
+    full = journal.load("s1")
+    assert len(full["queries"]) == 10
+    assert full["samples"]["9"] == ["line 9"]
+    # The full load folded the segments into a snapshot.
+    assert not [name for name in _names(store, "s1") if name.startswith("seg-")]
+
+    journal.append("s1", [{"op": "remove", "path": ["samples"]}, {"op": "set", "path": ["queries", 0], "value": None}])
+    # A fresh instance (e.g. after a restart) continues the same sequence.
+    reopened = ContextJournal(store, segment_size=4)
+    assert reopened.load("s1") == {"notes": "leader flap", "queries": [None, *full["queries"][1:]]}
+    assert reopened.append("s1", [{"op": "set", "path": ["notes"], "value": "x"}]) == 25
+
+
+def test_journal_reads_legacy_context_records(tmp_path: Path):
+    store = LocalStore(tmp_path)
+    store.save_json("context", "old", {"queries": [1, 2]}, encrypt=False)
+    journal = ContextJournal(store)
+    journal.append("old", [{"op": "append", "path": ["queries"], "value": 3}])
+    assert journal.load("old") == {"queries": [1, 2, 3]}
+
+
+def _append_many(args: tuple[str, str, int]) -> None:
+    root, backend, worker = args
+    journal = ContextJournal(LocalStore(Path(root), backend=backend), segment_size=8, compact_segments=2)
+    for i in range(60):
+        journal.append("shared", [{"op": "append", "path": ["queries"], "value": f"{worker}-{i}"}])
+        if i % 20 == 19:
+            journal.load("shared")
+
+
+def test_journal_appends_from_several_workers(tmp_path: Path):
+    for backend in ("sqlite", "files"):
+        root = tmp_path / backend
+        LocalStore(root, backend=backend)
+        # Separate processes stand in for uvicorn workers sharing one data dir.
+        with ProcessPoolExecutor(max_workers=3, mp_context=get_context("spawn")) as pool:
+            list(pool.map(_append_many, [(str(root), backend, worker) for worker in range(3)]))
+        doc = ContextJournal(LocalStore(root, backend=backend)).load("shared")
+        assert sorted(doc["queries"]) == sorted(f"{worker}-{i}" for worker in range(3) for i in range(60))
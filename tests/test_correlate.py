@@ -0,0 +1,48 @@
+from pathlib import Path
+
+from backend import code_search
+from backend.code_index import CodeIndex
+from backend.correlate import correlate_lines, extract_template
+
+
+def test_extract_template_from_tidb_log_line():
+    line = '[2026/02/02 08:00:00.123 +00:00] [WARN] [raft.rs:88] ["failed to send 42 messages to store 7"]'
+    template = extract_template(line)
+    assert template.literal == "messages to store"
+    assert (template.source_file, template.source_line) == ("raft.rs", 88)
+
+
+def _repo(tmp_path: Path) -> Path:
+    repo = tmp_path / "repo"
+    (repo / "server").mkdir(parents=True)
+    (repo / "server/server.go").write_text('log.Info("leader is ready")\n', encoding="utf-8")
+    (repo / "server/other.go").write_text('// leader is ready\nlog.Warn("store heartbeat timeout")\n', encoding="utf-8")
+    return repo
+
+
+LINES = [
+    '[2026/02/02 08:00:00.123 +00:00] [INFO] [server.go:1] ["leader is ready"] [region_id=2]',
+    '[2026/02/02 08:00:01.123 +00:00] [INFO] [server.go:1] ["leader is ready"] [region_id=3]',
+    '{"level":"warn","msg":"store heartbeat timeout"}',
+    "ok",
+]
+
+
+def test_correlate_lines_single_pass(tmp_path: Path, monkeypatch):
+    repo = _repo(tmp_path)
+    monkeypatch.setattr(code_search, "_rg_available", lambda: False)
+    results = correlate_lines(repo, LINES, max_hits_per_line=5)
+
+    assert [Path(hit["file"]).name for hit in results[0]["hits"]] == ["server.go", "other.go"]
+    assert results[1]["hits"] == results[0]["hits"]
+    assert [(Path(hit["file"]).name, hit["line"]) for hit in results[2]["hits"]] == [("other.go", 2)]
+    assert results[3] == {"index": 3, "template": None, "source": None, "hits": []}
+
+
+def test_correlate_lines_with_index(tmp_path: Path):
+    repo = _repo(tmp_path)
+    cache_root = tmp_path / "cache"
+    CodeIndex.for_path(repo, cache_root).update()
+    results = correlate_lines(repo, LINES, max_hits_per_line=1, cache_root=cache_root)
+    assert [Path(hit["file"]).name for hit in results[0]["hits"]] == ["server.go"]
+    assert results[2]["hits"][0]["text"] == 'log.Warn("store heartbeat timeout")'
@@ -0,0 +1,27 @@
+from backend.http_client import HttpClientPool, proxy_for
+
+
+def test_client_pool_reuses_client_per_origin():
+    pool = HttpClientPool(http2=False)
+    first = pool.get("https://loki.example.com/loki/api/v1/query_range")
+    second = pool.get("https://loki.example.com/other")
+    proxied = pool.get("https://loki.example.com/", proxy="http://proxy.example.com:8080")
+    assert first is second
+    assert proxied is not first
+
+    pool.close()
+    assert first.is_closed
+    assert pool.get("https://loki.example.com/") is not first
+    pool.close()
+
+
+def test_proxy_for_honors_network_settings():
+    config = {
+        "loki": {"proxy": "http://loki-proxy:8080"},
+        "network": {"mode": "proxy", "proxy": "http://proxy:8080", "no_proxy": [".svc", "localhost"]},
+    }
+    assert proxy_for("https://loki.example.com", config) == "http://loki-proxy:8080"
+    assert proxy_for("https://meta.example.com", config, "metadata") == "http://proxy:8080"
+    assert proxy_for("http://loki.monitoring.svc:3100", config) is None
+    assert proxy_for("http://localhost:3100", config) is None
+    assert proxy_for("https://loki.example.com", {**config, "network": {"mode": "direct"}}) is None
@@ -0,0 +1,23 @@
+from backend.log_templates import mask, mine_templates
+from backend.loki_adapter import LogLine
+
+
+def test_mask_variables():
+    line = "conn 0x1f from 10.0.0.7:20160 id=3f2b8c1e-1d2a-4c5b-9e8f-0a1b2c3d4e5f took 12ms"
+    assert mask(line) == "conn <HEX> from <IP> id=<UUID> took <NUM>"
+
+
+def test_mine_templates_collapses_repeats():
+    lines = [
+        LogLine(ts=str(100 - i), line=f'[INFO] [peer.go:{i}] ["send heartbeat"] [region_id={1000 + i}] [state={state}]', labels={})
+        for i, state in enumerate(["up", "down", "pending", "tombstone", "offline"])
+    ]
+    lines.append(LogLine(ts="50", line='[WARN] [pd.go:88] ["leader changed"] [leader=4]', labels={"pod": "pd-0"}))
+
+    clusters = mine_templates(lines)
+    assert [cluster.count for cluster in clusters] == [5, 1]
+    heartbeat = clusters[0]
+    assert heartbeat.template == '[INFO] [peer.go:<NUM>] ["send heartbeat"] [region_id=<NUM>] <*>'
+    assert (heartbeat.first.ts, heartbeat.last.ts) == ("96", "100")
+    assert heartbeat.sample is lines[0]
+    assert clusters[1].sample.labels == {"pod": "pd-0"}
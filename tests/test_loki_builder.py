@@ -1,4 +1,6 @@
-from backend.loki_adapter import build_logql
+from datetime import datetime, timedelta, timezone
+
+from backend.loki_adapter import LogLine, LokiAdapter, build_logql, build_metric_logql, metric_step
 
 
 def test_build_logql_escapes_keywords():
@@ -6,3 +8,87 @@ def test_build_logql_escapes_keywords():
     logql = build_logql(labels, ["leader", 'ready"slow'])
     assert '{cluster="us-east-1-f02",component="pd"}' in logql
     assert '"ready\\"slow"' in logql
+
+
+def test_build_logql_orders_stages_cheapest_first():
+    logql = build_logql(
+        {"cluster": "c1", "component": "pd", "pod": ["pd-0", "pd-1"]},
+        ["leader"],
+        exclude=["heartbeat"],
+        regex=[r"region \d+"],
+        levels=["warn", "error"],
+    )
+    assert logql == (
+        r'{cluster="c1",component="pd",pod=~"pd\\-0|pd\\-1"} |= "leader" != "heartbeat" '
+        r'|~ "region \\d+" |~ "\\[(?i)(?:warn|error)\\]"'
+    )
+
+    parsed = build_logql(
+        {"cluster": "c1", "pod": []},
+        [],
+        levels=["error"],
+        parser="json",
+        label_filters={"caller": "peer.go"},
+        line_format="{{.msg}}",
+    )
+    assert parsed == (
+        '{cluster="c1"} | json | level=~"(?i)(?:error)" | caller="peer.go" | line_format "{{.msg}}"'
+    )
+
+
+def test_build_metric_logql_groups_components():
+    labels = {"cluster": "c1", "component": ["pd", "tikv"]}
+    logql = build_metric_logql(build_logql(labels, ["slow"]), 60, by=["component", "pod"])
+    assert logql == 'sum by (component, pod) (count_over_time({cluster="c1",component=~"pd|tikv"} |= "slow" [60s]))'
+    assert build_logql({"component": ["pd"]}, []) == '{component="pd"}'
+
+
+def test_metric_step_and_series():
+    start = datetime(2026, 2, 2, 8, 0, tzinfo=timezone.utc)
+    assert metric_step(start, start + timedelta(hours=2)) == 60
+    assert metric_step(start, start + timedelta(days=400)) == 4 * 86400
+
+    adapter = LokiAdapter(base_url="http://loki.invalid")
+    adapter._get = lambda path, params: {
+        "data": {"result": [{"metric": {"component": "pd"}, "values": [[1770019500, "3"], [1770019560.0, "1"]]}]}
+    }
+    series = adapter.query_series("sum(x)", start, start + timedelta(hours=2), 60)
+    assert series == [{"labels": {"component": "pd"}, "points": [(1770019500, 3), (1770019560, 1)]}]
+
+
+class ScriptedAdapter(LokiAdapter):
+    def __init__(self, counts: list[int], total: int | None = None) -> None:
+        super().__init__(base_url="http://loki.invalid")
+        self.counts = counts
+        self.total = total
+        self.spans: list[float] = []
+
+    def count_lines(self, logql, start, end):
+        return self.total
+
+    def query_range(self, logql, start, end, limit):
+        self.spans.append((end - start).total_seconds())
+        count = min(self.counts.pop(0) if self.counts else 0, limit)
+        return [LogLine(ts=str(i), line="x", labels={}) for i in range(count)]
+
+
+def test_adaptive_slicing_grows_on_empty_and_shrinks_on_dense():
+    end = datetime(2026, 2, 2, 8, 0, tzinfo=timezone.utc)
+    adapter = ScriptedAdapter([0, 0, 10, 80, 100])
+    lines = adapter.query_with_slicing("{}", end - timedelta(hours=6), end, limit=100, window_seconds=60, adaptive=True)
+
+    assert len(lines) == 100
+    assert adapter.spans[:3] == [60, 120, 240]
+    assert adapter.spans[3] == 240 * 9
+    assert adapter.spans[4] < adapter.spans[3]
+
+
+def test_adaptive_slicing_seeded_by_probe():
+    end = datetime(2026, 2, 2, 8, 0, tzinfo=timezone.utc)
+    empty = ScriptedAdapter([], total=0)
+    assert empty.query_with_slicing("{}", end - timedelta(hours=1), end, limit=100, adaptive=True, probe=True) == []
+    assert empty.spans == []
+
+    sparse = ScriptedAdapter([40], total=40)
+    sparse.query_with_slicing("{}", end - timedelta(hours=1), end, limit=100, adaptive=True, probe=True)
+    assert sparse.spans == [3600]
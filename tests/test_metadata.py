@@ -0,0 +1,57 @@
+import threading
+import time
+
+from backend.metadata import MetadataResolver
+
+
+class CountingResolver(MetadataResolver):
+    def __init__(self, delay: float = 0.0) -> None:
+        super().__init__()
+        self.calls = 0
+        self.delay = delay
+
+    def _fetch_http(self, cluster_config):
+        self.calls += 1
+        time.sleep(self.delay)
+        return {"cluster_id": "c1", "version": self.calls}
+
+
+def _config(ttl: int) -> dict:
+    return {"metadata": {"provider": "http", "endpoint": "https://meta.example.com/c1", "cache_ttl_s": ttl}}
+
+
+def test_metadata_cache_single_flight():
+    resolver = CountingResolver(delay=0.05)
+    results = []
+    threads = [threading.Thread(target=lambda: results.append(resolver.resolve(_config(300)))) for _ in range(8)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+
+    assert resolver.calls == 1
+    assert all(result["version"] == 1 for result in results)
+    assert resolver.resolve(_config(300))["version"] == 1
+    assert resolver.calls == 1
+
+
+def test_metadata_cache_serves_stale_while_revalidating():
+    resolver = CountingResolver()
+    resolver.resolve(_config(300))
+    key = ("https://meta.example.com/c1", None)
+    resolver._cache[key].fetched_at -= 400
+
+    assert resolver.resolve(_config(300))["version"] == 1
+    for _ in range(100):
+        if resolver._cache[key].value["version"] == 2:
+            break
+        time.sleep(0.01)
+    assert resolver.calls == 2
+    assert resolver.resolve(_config(300))["version"] == 2
+
+
+def test_metadata_cache_disabled_without_ttl():
+    resolver = CountingResolver()
+    resolver.resolve(_config(0))
+    resolver.resolve(_config(0))
+    assert resolver.calls == 2
@@ -0,0 +1,45 @@
+from datetime import datetime, timezone
+
+import pytest
+
+from backend.loki_adapter import LogLine
+from backend.pagination import PageCursor, next_cursor, query_fingerprint
+
+
+def _line(ts: int, text: str, pod: str = "a") -> LogLine:
+    return LogLine(ts=str(ts), line=text, labels={"pod": pod})
+
+
+def test_cursor_round_trip_and_boundary_dedup():
+    ts = 1770019200_000_001_500
+    page = [_line(ts + 10, "newer"), _line(ts, "x", "a"), _line(ts, "x", "b")]
+    cursor = next_cursor(page, query_fingerprint(["q1", "q2"]))
+    decoded = PageCursor.decode(cursor.encode())
+
+    assert decoded == cursor
+    assert decoded.seen_count == 2
+    assert not decoded.admits(_line(ts, "x", "a"), "backward")
+    assert decoded.admits(_line(ts, "y", "a"), "backward")
+    assert decoded.admits(_line(ts - 1, "x", "a"), "backward")
+    assert not decoded.admits(_line(ts + 1, "z"), "backward")
+    assert decoded.admits(_line(ts + 1, "z"), "forward")
+
+    start = datetime(2026, 2, 2, 8, 0, tzinfo=timezone.utc)
+    end = datetime(2026, 2, 2, 9, 0, tzinfo=timezone.utc)
+    narrowed_start, narrowed_end = decoded.narrow(start, end, "backward")
+    assert narrowed_start == start
+    assert narrowed_end == datetime(2026, 2, 2, 8, 0, 0, 2, tzinfo=timezone.utc)
+    assert decoded.narrow(start, end, "forward")[0] == datetime(2026, 2, 2, 8, 0, 0, 1, tzinfo=timezone.utc)
+
+
+def test_cursor_keeps_seen_lines_when_page_shares_timestamp():
+    ts = 1770019200_000_000_000
+    first = next_cursor([_line(ts, "a"), _line(ts, "b")], "f")
+    second = next_cursor([_line(ts, "c")], "f", previous=first)
+    assert second.seen_count == 3
+    assert next_cursor([_line(ts - 5, "d")], "f", previous=first).seen_count == 1
+
+
+def test_cursor_rejects_garbage():
+    with pytest.raises(ValueError):
+        PageCursor.decode("not-a-cursor")
@@ -0,0 +1,71 @@
+from datetime import datetime, timedelta, timezone
+
+from backend.loki_adapter import LogLine, LokiAdapter
+from backend.query_engine import QueryEngine
+
+
+class FakeAdapter(LokiAdapter):
+    def __init__(self) -> None:
+        super().__init__(base_url="http://loki.invalid")
+        self.calls: list[tuple[str, datetime, datetime]] = []
+
+    def query_range(self, logql, start, end, limit):
+        self.calls.append((logql, start, end))
+        ts = int(end.timestamp() * 1_000_000_000)
+        return [LogLine(ts=str(ts - i), line=f"{logql} {i}", labels={}) for i in range(min(limit, 3))]
+
+
+def test_query_engine_merges_components_by_timestamp():
+    adapter = FakeAdapter()
+    engine = QueryEngine(adapter, max_workers=4)
+    end = datetime(2026, 2, 2, 8, 15, tzinfo=timezone.utc)
+    lines = engine.query(["a", "b"], end - timedelta(minutes=15), end, limit=4, window_seconds=300)
+
+    assert len(lines) == 4
+    assert [int(line.ts) for line in lines] == sorted((int(line.ts) for line in lines), reverse=True)
+    assert {line.line.split()[0] for line in lines} == {"a", "b"}
+    end_ns = int(end.timestamp() * 1_000_000_000)
+    assert {int(line.ts) for line in lines} == {end_ns, end_ns - 1}
+
+
+def test_query_engine_yields_windows_in_direction_order():
+    adapter = FakeAdapter()
+    engine = QueryEngine(adapter, max_workers=2)
+    end = datetime(2026, 2, 2, 8, 15, tzinfo=timezone.utc)
+    batches = list(engine.iter_windows(["a"], end - timedelta(minutes=15), end, limit=7, window_seconds=300))
+
+    assert [len(batch) for batch in batches] == [3, 3, 1]
+    assert int(batches[0][-1].ts) > int(batches[1][0].ts) > int(batches[2][0].ts)
+
+
+def test_query_range_merges_streams_in_direction_order():
+    adapter = LokiAdapter(base_url="http://loki.invalid")
+    adapter._get = lambda path, params: {
+        "data": {
+            "result": [
+                {"stream": {"pod": "a"}, "values": [["30", "a3"], ["10", "a1"]]},
+                {"stream": {"pod": "b"}, "values": [["40", "b4"], ["20", "b2"], ["5", "b0"]]},
+            ]
+        }
+    }
+    end = datetime(2026, 2, 2, 8, 15, tzinfo=timezone.utc)
+    lines = adapter.query_range("{}", end - timedelta(minutes=5), end, limit=10)
+    assert [line.line for line in lines] == ["b4", "a3", "b2", "a1", "b0"]
+    assert [line.nanos for line in lines] == [40, 30, 20, 10, 5]
+
+    adapter.direction = "forward"
+    lines = adapter.query_range("{}", end - timedelta(minutes=5), end, limit=10)
+    assert [line.line for line in lines] == ["b0", "a1", "b2", "a3", "b4"]
+
+
+def test_adaptive_probe_is_opt_in():
+    end = datetime(2026, 2, 2, 8, 15, tzinfo=timezone.utc)
+    for probe, expected in ((False, []), (True, ["a", "b"])):
+        adapter = FakeAdapter()
+        probes: list[str] = []
+        adapter.count_lines = lambda logql, start, end, probes=probes: probes.append(logql) or 3
+        engine = QueryEngine(adapter, max_workers=2, adaptive=True, probe=probe)
+        lines = engine.query(["a", "b"], end - timedelta(minutes=15), end, limit=4, window_seconds=300)
+
+        assert len(lines) == 4
+        assert sorted(probes) == expected
@@ -1,4 +1,7 @@
-from backend.rate_limit import TokenBucketLimiter
+import time
+from pathlib import Path
+
+from backend.rate_limit import SqliteTokenBucketLimiter, TokenBucketLimiter
 
 
 def test_rate_limit_basic():
@@ -9,3 +12,55 @@ def test_rate_limit_basic():
     allowed, retry_after = limiter.allow("cluster-a")
     assert allowed is False
     assert retry_after >= 0
+
+
+def test_sqlite_limiter_is_shared_and_queues_reservations(tmp_path: Path):
+    path = tmp_path / "ratelimit.sqlite"
+    # Two instances stand in for two worker processes.
+    first = SqliteTokenBucketLimiter(path, rate_per_sec=0.1, burst=1)
+    second = SqliteTokenBucketLimiter(path, rate_per_sec=0.1, burst=1)
+
+    assert first.allow("cluster-a", rate_per_sec=0.5, burst=2)[0] is True
+    assert second.allow("cluster-a", rate_per_sec=0.5, burst=2)[0] is True
+    allowed, retry_after = first.allow("cluster-a", rate_per_sec=0.5, burst=2)
+    assert allowed is False
+    assert 0 < retry_after <= 2
+
+    # Waiters are queued: each reservation lands one interval after the last.
+    waits = [second.reserve("cluster-b", rate_per_sec=1.0, burst=1) for _ in range(3)]
+    assert waits[0] == 0.0
+    assert 0.9 < waits[1] <= 1.0 and 1.9 < waits[2] <= 2.0
+    assert first.reserve("cluster-b", max_wait=0.5, rate_per_sec=1.0, burst=1) is None
+
+
+def test_limiter_drops_refilled_buckets(tmp_path: Path):
+    for limiter in (
+        TokenBucketLimiter(rate_per_sec=1000.0, burst=1, sweep_seconds=0),
+        SqliteTokenBucketLimiter(tmp_path / "rl.sqlite", rate_per_sec=1000.0, burst=1, sweep_seconds=0),
+    ):
+        for i in range(5):
+            limiter.allow(f"cluster-{i}")
+        time.sleep(0.01)
+        assert limiter.size() == 5
+        # The sweep runs on this take and keeps only the bucket it just drained.
+        assert limiter.allow("cluster-0", rate_per_sec=0.0)[0] is True
+        assert limiter.size() == 1
+        assert limiter.allow("cluster-0", rate_per_sec=0.0)[0] is False
+
+
+def test_refund_returns_reserved_token(tmp_path: Path):
+    for limiter in (
+        TokenBucketLimiter(rate_per_sec=1.0, burst=1),
+        SqliteTokenBucketLimiter(tmp_path / "rl.sqlite", rate_per_sec=1.0, burst=1),
+    ):
+        assert limiter.reserve("cluster-a") == 0.0
+        assert 0.9 < limiter.reserve("cluster-a") <= 1.0
+        limiter.refund("cluster-a")
+        assert 0.9 < limiter.reserve("cluster-a") <= 1.0
+
+
+def test_local_limiter_ignores_wall_clock_jumps(monkeypatch):
+    limiter = TokenBucketLimiter(rate_per_sec=0.001, burst=1)
+    assert limiter.allow("cluster-a")[0] is True
+    monkeypatch.setattr(time, "time", lambda: 10.0**12)
+    assert limiter.allow("cluster-a")[0] is False
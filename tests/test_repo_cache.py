@@ -0,0 +1,128 @@
+import subprocess
+import time
+from pathlib import Path
+
+from backend import repo_cache
+from backend.repo_cache import GithubRepoRef, RepoCache
+
+
+def _git(*args: str) -> str:
+    cmd = ["git", "-c", "user.name=test", "-c", "user.email=test@example.com", *args]
+    return subprocess.run(cmd, capture_output=True, text=True, check=True).stdout.strip()
+
+
+def _commit(work: Path, name: str, text: str, branch: str = "main") -> None:
+    _git("-C", str(work), "checkout", "-q", "-B", branch)
+    (work / name).write_text(text, encoding="utf-8")
+    _git("-C", str(work), "add", name)
+    _git("-C", str(work), "commit", "-q", "-m", name)
+    _git("-C", str(work), "push", "-q", "origin", branch)
+
+
+def _remote(tmp_path: Path) -> tuple[Path, Path]:
+    remote = tmp_path / "remote.git"
+    work = tmp_path / "work"
+    _git("init", "-q", "--bare", "-b", "main", str(remote))
+    _git("clone", "-q", str(remote), str(work))
+    return remote, work
+
+
+def test_repo_cache_warms_per_branch_and_refreshes(tmp_path: Path):
+    remote, work = _remote(tmp_path)
+    _commit(work, "main.go", "v1")
+    _commit(work, "feature.go", "feature", branch="feature/x")
+
+    cache = RepoCache(tmp_path / "repos", refresh_seconds=3600, url_for=lambda ref: remote.as_uri())
+    main = GithubRepoRef(owner="org", repo="repo", branch="main", subpath=None)
+    feature = GithubRepoRef(owner="org", repo="repo", branch="feature/x", subpath=None)
+    try:
+        assert cache.ensure(main)["state"] == "warming"
+        # A second request while the first fetch runs does not start another.
+        assert cache.ensure(main)["state"] in {"warming", "ready"}
+        status = cache.wait(main, timeout=60)
+        assert status["state"] == "ready"
+        assert (Path(status["path"]) / "main.go").read_text() == "v1"
+        assert not (Path(status["path"]) / "feature.go").exists()
+
+        branch = cache.wait(feature, timeout=60)
+        assert branch["path"] != status["path"]
+        assert (Path(branch["path"]) / "feature.go").exists()
+
+        _commit(work, "main.go", "v2")
+        assert cache.ensure(main)["head"] == status["head"]
+        cache.refresh_seconds = 0
+        assert cache.ensure(main)["state"] == "ready"  # stale: served while re-fetched
+        cache.refresh_seconds = 3600
+        deadline = time.time() + 60
+        refreshed = cache.ensure(main)
+        while refreshed["head"] == status["head"] and time.time() < deadline:
+            time.sleep(0.05)
+            refreshed = cache.ensure(main)
+        assert refreshed["head"] != status["head"]
+        assert (Path(refreshed["path"]) / "main.go").read_text() == "v2"
+        # The refresh checked out next to the served tree instead of into it.
+        assert refreshed["path"] != status["path"]
+        assert not Path(status["path"]).exists()
+    finally:
+        cache.shutdown()
+
+
+def test_repo_cache_reloads_without_walking_trees(tmp_path: Path, monkeypatch):
+    remote, work = _remote(tmp_path)
+    _commit(work, "main.go", "v1")
+    ref = GithubRepoRef(owner="org", repo="repo", branch="main", subpath=None)
+    cache = RepoCache(tmp_path / "repos", url_for=lambda ref: remote.as_uri())
+    try:
+        status = cache.wait(ref, timeout=60)
+    finally:
+        cache.shutdown()
+
+    def no_walk(path):
+        raise AssertionError(f"walked {path}")
+
+    monkeypatch.setattr(repo_cache, "_dir_size", no_walk)
+    restarted = RepoCache(tmp_path / "repos", refresh_seconds=3600, url_for=lambda ref: remote.as_uri())
+    try:
+        assert restarted.ensure(ref) == {**status, "state": "ready"}
+    finally:
+        restarted.shutdown()
+
+
+def test_repo_cache_evicts_least_recently_used(tmp_path: Path):
+    remote, work = _remote(tmp_path)
+    _commit(work, "a.go", "a")
+    _commit(work, "b.go", "b", branch="b")
+
+    cache = RepoCache(tmp_path / "repos", max_bytes=1, url_for=lambda ref: remote.as_uri())
+    first = GithubRepoRef(owner="org", repo="repo", branch="main", subpath=None)
+    second = GithubRepoRef(owner="org", repo="repo", branch="b", subpath=None)
+    try:
+        assert cache.wait(first, timeout=60)["state"] == "ready"
+        assert cache.wait(second, timeout=60)["state"] == "ready"
+        assert not cache.worktree_dir(first).exists()
+        assert cache.worktree_dir(second).exists()
+
+        failing = RepoCache(tmp_path / "other", url_for=lambda ref: str(tmp_path / "missing.git"))
+        failed = failing.wait(first, timeout=60)
+        assert failed["state"] == "failed"
+        assert failed["error"]
+        failing.shutdown()
+    finally:
+        cache.shutdown()
+
+
+def test_repo_cache_reports_os_errors_as_failed(tmp_path: Path, monkeypatch):
+    cache = RepoCache(tmp_path / "repos")
+    ref = GithubRepoRef(owner="org", repo="repo", branch="main", subpath=None)
+
+    def disk_full(ref):
+        raise OSError(28, "No space left on device")
+
+    monkeypatch.setattr(cache, "materialize", disk_full)
+    try:
+        failed = cache.wait(ref, timeout=60)
+        assert failed["state"] == "failed"
+        assert "No space left" in failed["error"]
+        assert cache.ensure(ref)["state"] == "warming"  # the next request retries
+    finally:
+        cache.shutdown()
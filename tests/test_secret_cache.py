@@ -0,0 +1,84 @@
+import threading
+from pathlib import Path
+
+import pytest
+from cryptography.fernet import Fernet
+
+from backend import secret_cache
+from backend.secret_cache import SecretCache
+from backend.storage import LocalStore, StorageError
+
+
+def _store(tmp_path: Path, monkeypatch: pytest.MonkeyPatch) -> tuple[LocalStore, list[str]]:
+    monkeypatch.setenv("LOGSERVICE_MASTER_KEY", Fernet.generate_key().decode("utf-8"))
+    store = LocalStore(tmp_path, backend="sqlite")
+    decrypted: list[str] = []
+    load_bytes = store.load_bytes
+
+    def counting_load(category: str, name: str, *, decrypt: bool) -> bytes | None:
+        decrypted.append(name)
+        return load_bytes(category, name, decrypt=decrypt)
+
+    monkeypatch.setattr(store, "load_bytes", counting_load)
+    return store, decrypted
+
+
+def test_secret_cache_picks_up_rewrites(tmp_path: Path, monkeypatch: pytest.MonkeyPatch):
+    store, decrypted = _store(tmp_path, monkeypatch)
+    secrets = SecretCache(store, ttl_seconds=60)
+    store.save_json("auth", "a", {"token": "one"}, encrypt=True)
+
+    assert secrets.get("a") == {"token": "one"}
+    assert secrets.get("a") == {"token": "one"}
+    assert decrypted == ["a"]
+
+    store.save_json("auth", "a", {"token": "uno"}, encrypt=True)
+    assert secrets.get("a") == {"token": "uno"}
+    assert decrypted == ["a", "a"]
+    assert secrets.get("missing") is None
+
+
+def test_secret_cache_evicts_least_recently_used(tmp_path: Path, monkeypatch: pytest.MonkeyPatch):
+    store, decrypted = _store(tmp_path, monkeypatch)
+    secrets = SecretCache(store, ttl_seconds=60, max_entries=1)
+    store.save_json("auth", "a", {"token": "one"}, encrypt=True)
+    store.save_json("auth", "b", {"token": "two"}, encrypt=True)
+
+    assert secrets.get("a") == {"token": "one"}
+    assert secrets.get("b") == {"token": "two"}
+    assert secrets.get("a") == {"token": "one"}
+    assert decrypted == ["a", "b", "a"]
+
+
+def test_secret_cache_drops_entries_on_key_rotation(tmp_path: Path, monkeypatch: pytest.MonkeyPatch):
+    store, _ = _store(tmp_path, monkeypatch)
+    secrets = SecretCache(store, ttl_seconds=60)
+    store.save_json("auth", "a", {"token": "one"}, encrypt=True)
+    assert secrets.get("a") == {"token": "one"}
+    before = secrets.signature("a")
+
+    monkeypatch.setenv("LOGSERVICE_MASTER_KEY", Fernet.generate_key().decode("utf-8"))
+    assert secrets.signature("a") != before
+    # The record is still sealed with the old key, so it must not be served.
+    with pytest.raises(StorageError):
+        secrets.get("a")
+
+    store.save_json("auth", "a", {"token": "uno"}, encrypt=True)
+    assert secrets.get("a") == {"token": "uno"}
+
+
+def test_secret_cache_wipes_expired_entries_unprompted(tmp_path: Path, monkeypatch: pytest.MonkeyPatch):
+    store, _ = _store(tmp_path, monkeypatch)
+    wiped = threading.Event()
+    wipe = secret_cache._wipe
+
+    def recording_wipe(entry):
+        wipe(entry)
+        wiped.set()
+
+    monkeypatch.setattr(secret_cache, "_wipe", recording_wipe)
+    secrets = SecretCache(store, ttl_seconds=0.05)
+    store.save_json("auth", "a", {"token": "one"}, encrypt=True)
+    assert secrets.get("a") == {"token": "one"}
+    # Nothing else touches the cache; the expiry timer alone wipes the token.
+    assert wiped.wait(2)
@@ -0,0 +1,98 @@
+import threading
+from concurrent.futures import Future
+
+import pytest
+
+from backend import single_flight
+from backend.single_flight import SingleFlight
+
+
+@pytest.fixture
+def joined(monkeypatch):
+    # Released each time a caller starts waiting on a flight's result.
+    waiting = threading.Semaphore(0)
+
+    class SignallingFuture(Future):
+        def result(self, timeout=None):
+            waiting.release()
+            return super().result(timeout)
+
+    monkeypatch.setattr(single_flight, "Future", SignallingFuture)
+    return waiting
+
+
+def _await(waiting: threading.Semaphore, count: int) -> None:
+    for _ in range(count):
+        assert waiting.acquire(timeout=2)
+
+
+def test_single_flight_shares_one_call_per_key(joined):
+    flights = SingleFlight()
+    started = threading.Event()
+    release = threading.Event()
+    calls = []
+    results = []
+
+    def gated():
+        calls.append("a")
+        started.set()
+        release.wait(2)
+        return {"key": "a"}
+
+    leader = threading.Thread(target=lambda: results.append(flights.do("a", gated)))
+    leader.start()
+    assert started.wait(2)
+    followers = [threading.Thread(target=lambda: results.append(flights.do("a", gated))) for _ in range(5)]
+    for thread in followers:
+        thread.start()
+    # Release the leader only once every follower has joined its flight.
+    _await(joined, 5)
+    assert flights.do("b", lambda: {"key": "b"}) == ({"key": "b"}, False)
+    release.set()
+    for thread in [leader, *followers]:
+        thread.join()
+
+    assert calls == ["a"]
+    assert sorted(shared for _, shared in results) == [False] + [True] * 5
+    assert all(value == {"key": "a"} for value, _ in results)
+    assert flights.inflight() == 0
+
+    def boom():
+        raise RuntimeError("loki down")
+
+    with pytest.raises(RuntimeError):
+        flights.do("a", boom)
+    assert flights.do("a", lambda: 1) == (1, False)
+
+
+def test_single_flight_replays_one_stream_to_every_caller(joined):
+    flights = SingleFlight()
+    release = threading.Event()
+    starts = []
+
+    def source():
+        starts.append(1)
+        release.wait(2)
+        yield from [1, 2, 3]
+
+    streams = [flights.stream("a", source) for _ in range(3)]
+    assert [shared for _, shared in streams] == [False, True, True]
+    results = []
+    readers = [threading.Thread(target=lambda it=it: results.append(list(it))) for it, _ in streams]
+    for thread in readers:
+        thread.start()
+    _await(joined, 3)
+    release.set()
+    for thread in readers:
+        thread.join()
+
+    assert starts == [1]
+    assert results == [[1, 2, 3]] * 3
+
+    def broken():
+        yield 1
+        raise RuntimeError("loki down")
+
+    stream, _ = flights.stream("a", broken)
+    with pytest.raises(RuntimeError):
+        list(stream)
@@ -0,0 +1,33 @@
+from pathlib import Path
+
+from backend.skill_match import TriggerMatcher
+from backend.skills import SkillManager
+from backend.storage import LocalStore
+
+
+def test_trigger_matcher_overlapping_triggers():
+    matcher = TriggerMatcher()
+    matcher.add("a", ["he", "she"])
+    matcher.add("b", ["hers", "His"])
+    matcher.add("c", ["xyz"])
+
+    assert matcher.match("USHERS") == {"a": {"he", "she"}, "b": {"hers"}}
+    assert matcher.match("this") == {"b": {"his"}}
+
+    matcher.remove("b")
+    assert matcher.match("ushers") == {"a": {"he", "she"}}
+
+
+def test_skill_match_ranks_and_updates_incrementally(tmp_path: Path):
+    store = LocalStore(tmp_path)
+    SkillManager(store).create("existing", ["region"], "prompt")
+
+    manager = SkillManager(store)
+    assert [hit["skill"]["name"] for hit in manager.match(["region miss"])] == ["existing"]
+
+    manager.create("pd leader", ["leader", "ready"], "prompt")
+    manager.extract("leader only", ["leader"], "notes")
+    hits = manager.match(["pd leader", "ready slow"])
+    assert [hit["skill"]["name"] for hit in hits] == ["pd leader", "leader only"]
+    assert hits[0]["matched_triggers"] == ["leader", "ready"]
+    assert manager.match([]) == []
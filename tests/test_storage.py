@@ -1,4 +1,6 @@
 import os
+from concurrent.futures import ProcessPoolExecutor
+from multiprocessing import get_context
 from pathlib import Path
 
 from cryptography.fernet import Fernet
@@ -14,3 +16,62 @@ def test_storage_encrypt_roundtrip(tmp_path: Path):
     store.save_json("auth", "token1", {"token": "abc"}, encrypt=True)
     loaded = store.load_json("auth", "token1", decrypt=True)
     assert loaded["token"] == "abc"
+
+
+def test_sqlite_store_migrates_and_versions_records(tmp_path: Path):
+    os.environ["LOGSERVICE_MASTER_KEY"] = Fernet.generate_key().decode("utf-8")
+    legacy = LocalStore(tmp_path, backend="files")
+    legacy.save_json("context", "session-1", {"step": 1}, encrypt=False)
+    legacy.save_json("auth", "token1", {"token": "abc"}, encrypt=True)
+
+    store = LocalStore(tmp_path, backend="sqlite")
+    assert store.load_json("context", "session-1", decrypt=False) == {"step": 1}
+    assert store.load_json("auth", "token1", decrypt=True) == {"token": "abc"}
+
+    first = store.save_json("context", "session-1", {"step": 2}, encrypt=False)
+    second = store.save_json("context", "session-1", {"step": 2}, encrypt=False)
+    assert first != second
+    assert store.stat("context", "session-1") == second
+    store.save_json("context", "job-1", {"id": "job-1"}, encrypt=False)
+    assert [name for name, _ in store.scan("context", "session-")] == ["session-1"]
+    assert store.stat("context", "missing") is None
+
+    # Files are not imported again unless they change; newer rows always win.
+    reopened = LocalStore(tmp_path, backend="sqlite")
+    assert reopened.load_json("context", "session-1", decrypt=False) == {"step": 2}
+
+
+def test_sqlite_store_imports_files_added_after_first_start(tmp_path: Path):
+    os.environ["LOGSERVICE_MASTER_KEY"] = Fernet.generate_key().decode("utf-8")
+    files = LocalStore(tmp_path, backend="files")
+    files.save_json("context", "old", {"step": 1}, encrypt=False)
+    store = LocalStore(tmp_path, backend="sqlite")
+    store.delete("context", "old")
+
+    files.save_json("auth", "token1", {"token": "abc"}, encrypt=True)
+    reopened = LocalStore(tmp_path, backend="sqlite")
+    assert reopened.load_json("auth", "token1", decrypt=True) == {"token": "abc"}
+    assert reopened.load_json("context", "old", decrypt=False) is None
+
+
+def test_store_defaults_to_the_configured_backend(tmp_path: Path, monkeypatch):
+    monkeypatch.setenv("LOGSERVICE_STORAGE", "sqlite")
+    LocalStore(tmp_path).save_json("sessions", "s1", {"id": "s1"}, encrypt=False)
+    assert (tmp_path / "store.sqlite").exists()
+    assert not (tmp_path / "sessions").exists()
+
+
+def _open_sqlite_store(root: str) -> int:
+    store = LocalStore(Path(root), backend="sqlite")
+    return len(store.scan("context"))
+
+
+def test_sqlite_store_survives_concurrent_first_start(tmp_path: Path):
+    legacy = LocalStore(tmp_path, backend="files")
+    for i in range(50):
+        legacy.save_json("context", f"session-{i}", {"step": i}, encrypt=False)
+
+    # Separate processes stand in for uvicorn workers starting together.
+    with ProcessPoolExecutor(max_workers=4, mp_context=get_context("spawn")) as pool:
+        counts = list(pool.map(_open_sqlite_store, [str(tmp_path)] * 8))
+    assert counts == [50] * 8